@@ -0,0 +1,51 @@
+"""
+Sign and verify throughput of every supported signing algorithm.
+
+Creates tokens with RS256 (RSA 2048), ES256 (P-256) and EdDSA (Ed25519) keys
+and validates them, single threaded.
+
+    python benchmarks/algorithms.py --tokens 2000
+"""
+from datetime import datetime, timedelta
+import argparse
+import json
+import time
+
+from nc_tokens.rsa_token_lib import InMemoryKeyLoader
+from nc_tokens.token_manager import JWTDecoder, JWTEncoder, TokenManager
+
+ALGORITHMS = ('RS256', 'ES256', 'EdDSA')
+
+
+def _per_second(function, items):
+    start = time.perf_counter()
+    results = [function(item) for item in items]
+    return round(len(items) / (time.perf_counter() - start), 1), results
+
+
+def main(number_of_tokens: int):
+    exp = int((datetime.utcnow() + timedelta(hours=1)).timestamp() * 1000)
+    payloads = [{"sub": f"user_{index}", "exp": exp, "token_type": "user"}
+                for index in range(number_of_tokens)]
+    results = {}
+    for algorithm in ALGORITHMS:
+        token_manager = TokenManager(
+            InMemoryKeyLoader.generate(algorithm=algorithm),
+            JWTEncoder(), JWTDecoder()
+        )
+        sign_rate, tokens = _per_second(token_manager.create_user_token,
+                                        payloads)
+        verify_rate, _ = _per_second(token_manager.validate_token, tokens)
+        results[algorithm] = {
+            'sign_per_second': sign_rate,
+            'verify_per_second': verify_rate,
+            'token_length': len(tokens[0]),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tokens', type=int, default=2000)
+    arguments = parser.parse_args()
+    main(arguments.tokens)
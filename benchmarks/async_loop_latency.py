@@ -0,0 +1,91 @@
+"""
+Event loop latency while validating tokens from coroutines.
+
+Compares calling the synchronous TokenManager inside coroutines against
+AsyncTokenManager, which offloads RSA work to an executor. A ticker task
+sleeps 1 ms in a loop and records how late it wakes up.
+
+    python benchmarks/async_loop_latency.py --tokens 2000 --concurrency 50
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from nc_tokens.rsa_token_lib import InMemoryKeyLoader
+from nc_tokens.token_manager import (
+    AsyncTokenManager, JWTDecoder, JWTEncoder, TokenManager
+)
+
+
+def _percentile(values, percentile):
+    values = sorted(values)
+    index = min(len(values) - 1, int(len(values) * percentile / 100))
+    return values[index]
+
+
+async def _ticker(lags, stop):
+    interval = 0.001
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append((time.perf_counter() - start - interval) * 1000)
+
+
+async def _measure(validate, tokens, concurrency):
+    lags = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_ticker(lags, stop))
+    queue = iter(tokens)
+
+    async def worker():
+        for token in queue:
+            await validate(token)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticker
+    return {
+        'tokens_per_second': round(len(tokens) / elapsed, 1),
+        'loop_lag_ms_p50': round(statistics.median(lags), 3),
+        'loop_lag_ms_p99': round(_percentile(lags, 99), 3),
+        'loop_lag_ms_max': round(max(lags), 3),
+    }
+
+
+async def main(number_of_tokens: int, concurrency: int, workers: int):
+    key_loader = InMemoryKeyLoader.generate()
+    token_manager = TokenManager(key_loader, JWTEncoder(), JWTDecoder())
+    exp = int((datetime.utcnow() + timedelta(hours=1)).timestamp() * 1000)
+    tokens = token_manager.create_user_tokens(
+        [{"sub": f"user_{index}", "exp": exp, "token_type": "user"}
+         for index in range(number_of_tokens)]
+    )
+
+    async def validate_blocking(token):
+        return token_manager.validate_token(token)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        async_manager = AsyncTokenManager(token_manager, executor=executor)
+        results = {
+            'blocking': await _measure(validate_blocking, tokens,
+                                       concurrency),
+            'async': await _measure(async_manager.validate_token, tokens,
+                                    concurrency),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tokens', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=4)
+    arguments = parser.parse_args()
+    asyncio.run(main(arguments.tokens, arguments.concurrency,
+                     arguments.workers))
@@ -0,0 +1,79 @@
+"""
+Tokens per second of the non-RSA part of JWTDecoder.decode by input type.
+
+Signature verification is replaced by a no-op, leaving splitting, base64,
+JSON and expiration work. The previous decoder (str split, f-string signing
+input, padded str base64) is kept here as the baseline, fed with the
+Authorization header bytes decoded to str as an ASGI middleware had to.
+
+    python benchmarks/decode_overhead.py --iterations 200000
+"""
+from datetime import datetime, timedelta
+import argparse
+import base64
+import json
+import time
+
+from nc_tokens.rsa_token_lib import InMemoryKeyLoader
+from nc_tokens.token_manager import JWTDecoder, JWTEncoder
+
+
+def _legacy_decode(token, verify):
+    def b64(data):
+        return base64.urlsafe_b64decode(data + '=' * (4 - len(data) % 4))
+
+    parts = token.split('.')
+    if len(parts) != 3:
+        raise ValueError("Invalid token format")
+    header_b64, payload_b64, signature_b64 = parts
+    json.loads(b64(header_b64))
+    verify(f"{header_b64}.{payload_b64}".encode(), b64(signature_b64))
+    payload = json.loads(b64(payload_b64))
+    if int(datetime.utcnow().timestamp() * 1000) >= payload['exp']:
+        raise ValueError("Token has expired")
+    return payload
+
+
+def _tokens_per_second(function, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return iterations / (time.perf_counter() - start)
+
+
+def main(iterations: int):
+    key_loader = InMemoryKeyLoader.generate()
+    exp = int((datetime.utcnow() + timedelta(hours=1)).timestamp() * 1000)
+    token = JWTEncoder().encode(
+        {"sub": "user_42", "aud": "api", "exp": exp, "token_type": "user"},
+        key_loader.private_key, token_type="user"
+    )
+    authorization = b"Bearer " + token.encode()
+    decoder = JWTDecoder()
+    decoder._verify_signature = lambda *args: True
+    public_key = key_loader.public_key
+
+    results = {
+        'legacy_str': _tokens_per_second(
+            lambda: _legacy_decode(authorization[7:].decode(),
+                                   lambda *args: None),
+            iterations
+        ),
+        'str': _tokens_per_second(
+            lambda: decoder.decode(authorization[7:].decode(), public_key),
+            iterations
+        ),
+        'memoryview': _tokens_per_second(
+            lambda: decoder.decode(memoryview(authorization)[7:],
+                                   public_key),
+            iterations
+        ),
+    }
+    print(json.dumps({name: round(value)
+                      for name, value in results.items()}, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=200000)
+    main(parser.parse_args().iterations)
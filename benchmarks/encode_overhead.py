@@ -0,0 +1,78 @@
+"""
+Tokens per second of the non-RSA part of JWTEncoder.encode.
+
+The key is given as a Signer whose sign() returns a fixed signature,
+leaving only header, JSON, base64 and concatenation work. The previous encoder
+(header rebuilt per call, f-strings, str round trips) is kept here as the
+baseline.
+
+    python benchmarks/encode_overhead.py --iterations 200000
+"""
+import argparse
+import base64
+import json
+import time
+
+from nc_tokens.rsa_token_lib import InMemoryKeyLoader
+from nc_tokens.token_manager import JWTEncoder, Signer
+
+
+class _FixedSignatureSigner(Signer):
+    """RS256 Signer whose signature costs nothing."""
+    __slots__ = ('_signature',)
+
+    def __init__(self, private_key):
+        super().__init__(private_key)
+        self._signature = bytes(private_key.key_size // 8)
+
+    def sign(self, data: bytes) -> bytes:
+        return self._signature
+
+
+def _legacy_encode(payload, sign, kid):
+    def b64(data):
+        return base64.urlsafe_b64encode(data).rstrip(b'=').decode('utf-8')
+
+    header = {"alg": "RS256", "typ": "JWT", "kid": kid}
+    encoded_header = b64(json.dumps(header).encode())
+    encoded_payload = b64(json.dumps(payload).encode())
+    signature_input = f"{encoded_header}.{encoded_payload}".encode()
+    signature = b64(sign(signature_input))
+    return f"{encoded_header}.{encoded_payload}.{signature}"
+
+
+def _tokens_per_second(function, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return iterations / (time.perf_counter() - start)
+
+
+def main(iterations: int):
+    key_loader = InMemoryKeyLoader.generate()
+    signer = _FixedSignatureSigner(key_loader.private_key)
+    encoder = JWTEncoder()
+    payload = {
+        "iss": "nc_tokens", "sub": "user_42", "aud": "api",
+        "exp": 1924377087629, "iat": 1724377087629, "nbf": 1724377087629,
+        "token_type": "user",
+    }
+
+    legacy = _tokens_per_second(
+        lambda: _legacy_encode(payload, signer.sign, signer.kid), iterations
+    )
+    current = _tokens_per_second(
+        lambda: encoder.encode(payload, signer, token_type="user"),
+        iterations
+    )
+    print(json.dumps({
+        'legacy_tokens_per_second': round(legacy),
+        'encoder_tokens_per_second': round(current),
+        'speedup': round(current / legacy, 2),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=200000)
+    main(parser.parse_args().iterations)
@@ -0,0 +1,87 @@
+"""
+Sign, verify and key load cost of RSA keys by size.
+
+For 2048, 3072 and 4096-bit keys reports the p50 and p99 latency of one
+RS256 signature and one verification through the Signer and Verifier used
+by TokenManager, and the time to load the private key from PEM and DER,
+which includes the RSA key validation done by cryptography. ES256 and
+EdDSA are listed for comparison.
+
+    python benchmarks/key_sizes.py --iterations 200
+"""
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+import argparse
+import json
+import statistics
+import time
+
+from nc_tokens.token_manager.algorithms import Signer, Verifier
+
+SIGNING_INPUT = b'eyJhbGciOiJSUzI1NiJ9.' + b'x' * 200
+
+
+def _latencies(function, iterations: int):
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        'p50_us': round(statistics.median(latencies) * 1e6, 1),
+        'p99_us': round(latencies[int(len(latencies) * 0.99)] * 1e6, 1),
+    }
+
+
+def _load_ms(load, data, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        load(data, password=None)
+    return round((time.perf_counter() - start) / iterations * 1000, 2)
+
+
+def _measure(private_key, iterations: int):
+    signer = Signer(private_key)
+    verifier = Verifier(private_key.public_key())
+    signature = signer.sign(SIGNING_INPUT)
+    load_iterations = max(1, iterations // 20)
+    return {
+        'sign': _latencies(lambda: signer.sign(SIGNING_INPUT), iterations),
+        'verify': _latencies(
+            lambda: verifier.verify(signature, SIGNING_INPUT), iterations
+        ),
+        'load_pem_ms': _load_ms(
+            serialization.load_pem_private_key,
+            private_key.private_bytes(serialization.Encoding.PEM,
+                                      serialization.PrivateFormat.PKCS8,
+                                      serialization.NoEncryption()),
+            load_iterations
+        ),
+        'load_der_ms': _load_ms(
+            serialization.load_der_private_key,
+            private_key.private_bytes(serialization.Encoding.DER,
+                                      serialization.PrivateFormat.PKCS8,
+                                      serialization.NoEncryption()),
+            load_iterations
+        ),
+    }
+
+
+def main(iterations: int):
+    keys = {
+        f'RS256-{key_size}': rsa.generate_private_key(
+            public_exponent=65537, key_size=key_size
+        )
+        for key_size in (2048, 3072, 4096)
+    }
+    keys['ES256'] = ec.generate_private_key(ec.SECP256R1())
+    keys['EdDSA'] = ed25519.Ed25519PrivateKey.generate()
+    print(json.dumps({name: _measure(key, iterations)
+                      for name, key in keys.items()}, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=200)
+    main(parser.parse_args().iterations)
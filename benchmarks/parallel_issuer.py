@@ -0,0 +1,61 @@
+"""
+Token issuance throughput of ParallelTokenIssuer by number of workers.
+
+Compares TokenManager.create_user_token in a loop with a ParallelTokenIssuer
+of 1, 2, 4, ... workers up to the number of cores. Worker start up, and the
+private key load in every worker, is excluded by a warm up batch.
+
+    python benchmarks/parallel_issuer.py --tokens 20000 --key-size 2048
+"""
+from datetime import datetime, timedelta
+import argparse
+import json
+import os
+import time
+
+from nc_tokens.rsa_token_lib import InMemoryKeyLoader
+from nc_tokens.token_manager import (
+    JWTDecoder, JWTEncoder, ParallelTokenIssuer, TokenManager
+)
+
+
+def _worker_counts(maximum):
+    count = 1
+    while count < maximum:
+        yield count
+        count *= 2
+    yield maximum
+
+
+def main(number_of_tokens: int, key_size: int, chunk_size: int):
+    key_loader = InMemoryKeyLoader.generate(key_size=key_size)
+    exp = int((datetime.utcnow() + timedelta(hours=1)).timestamp() * 1000)
+    payloads = [{"sub": f"user_{index}", "exp": exp, "token_type": "user"}
+                for index in range(number_of_tokens)]
+
+    token_manager = TokenManager(key_loader, JWTEncoder(), JWTDecoder())
+    start = time.perf_counter()
+    for payload in payloads:
+        token_manager.create_user_token(payload)
+    results = {'single_process': round(
+        number_of_tokens / (time.perf_counter() - start), 1
+    )}
+
+    for workers in _worker_counts(os.cpu_count() or 1):
+        with ParallelTokenIssuer(key_loader, max_workers=workers,
+                                 chunk_size=chunk_size) as issuer:
+            issuer.create_user_tokens(payloads[:workers * chunk_size])
+            start = time.perf_counter()
+            issuer.create_user_tokens(payloads)
+            elapsed = time.perf_counter() - start
+        results[f'workers_{workers}'] = round(number_of_tokens / elapsed, 1)
+    print(json.dumps({'tokens_per_second': results}, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tokens', type=int, default=20000)
+    parser.add_argument('--key-size', type=int, default=2048)
+    parser.add_argument('--chunk-size', type=int, default=256)
+    arguments = parser.parse_args()
+    main(arguments.tokens, arguments.key_size, arguments.chunk_size)
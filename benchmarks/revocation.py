@@ -0,0 +1,69 @@
+"""
+Cost of the revocation check per validation, and memory of the list.
+
+Fills a RevocationList with revoked jti and times is_revoked for jti that
+were not revoked, answered by the Bloom filter, and for revoked ones,
+which are also searched in the sorted arrays. decode is timed with and
+without the list for comparison.
+
+    python benchmarks/revocation.py --revoked 100000 --iterations 200000
+"""
+from datetime import datetime, timedelta
+import argparse
+import json
+import time
+import uuid
+
+from nc_tokens.rsa_token_lib import InMemoryKeyLoader
+from nc_tokens.token_manager import JWTDecoder, JWTEncoder, RevocationList
+
+
+def _microseconds(function, values, iterations):
+    start = time.perf_counter()
+    for index in range(iterations):
+        function(values[index % len(values)])
+    return round((time.perf_counter() - start) / iterations * 1e6, 3)
+
+
+def main(revoked: int, iterations: int):
+    exp = int((datetime.utcnow() + timedelta(hours=1)).timestamp() * 1000)
+    revoked_jtis = [str(uuid.uuid4()) for _ in range(revoked)]
+    valid_jtis = [str(uuid.uuid4()) for _ in range(1000)]
+    revocations = RevocationList(capacity=revoked)
+    start = time.perf_counter()
+    revocations.update((jti, exp) for jti in revoked_jtis)
+    load_seconds = time.perf_counter() - start
+
+    private_key, public_key = InMemoryKeyLoader.generate().load_keys()
+    token = JWTEncoder().encode({"jti": valid_jtis[0], "exp": exp},
+                                private_key, token_type="service")
+    decoder = JWTDecoder()
+    revoking_decoder = JWTDecoder(revocations=revocations)
+    decode_iterations = max(1, iterations // 100)
+
+    print(json.dumps({
+        'revoked': revoked,
+        'load_seconds': round(load_seconds, 3),
+        'bloom_bytes': revocations.stats()['bloom_bytes'],
+        'index_bytes': revocations.stats()['index_bytes'],
+        'not_revoked_us': _microseconds(revocations.is_revoked, valid_jtis,
+                                        iterations),
+        'revoked_us': _microseconds(revocations.is_revoked, revoked_jtis,
+                                    iterations),
+        'decode_us': _microseconds(
+            lambda value: decoder.decode(value, public_key), [token],
+            decode_iterations
+        ),
+        'decode_with_revocations_us': _microseconds(
+            lambda value: revoking_decoder.decode(value, public_key),
+            [token], decode_iterations
+        ),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--revoked', type=int, default=100000)
+    parser.add_argument('--iterations', type=int, default=200000)
+    arguments = parser.parse_args()
+    main(arguments.revoked, arguments.iterations)
@@ -0,0 +1,64 @@
+"""
+Service tokens per second with and without ServiceTokenProvider.
+
+Threads ask for tokens of a few identities, as services do before every
+outbound call, either signing a new token each time with
+create_service_token or reusing them through a ServiceTokenProvider.
+Reports the throughput and the number of RSA signatures.
+
+    python benchmarks/service_tokens.py --threads 8 --calls 2000
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import argparse
+import json
+import time
+
+from nc_tokens.rsa_token_lib import InMemoryKeyLoader
+from nc_tokens.token_manager import (
+    JWTDecoder, JWTEncoder, ServiceTokenProvider, TokenManager
+)
+
+
+def _run(function, threads: int, calls: int, identities: int) -> float:
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        start = time.perf_counter()
+        list(executor.map(
+            lambda index: function(f"service-{index % identities}"),
+            range(calls)
+        ))
+        return time.perf_counter() - start
+
+
+def main(threads: int, calls: int, identities: int):
+    token_manager = TokenManager(InMemoryKeyLoader.generate(), JWTEncoder(),
+                                 JWTDecoder())
+    exp = int((datetime.utcnow() + timedelta(minutes=5)).timestamp() * 1000)
+
+    def sign(service_name):
+        return token_manager.create_service_token({
+            "service_name": service_name, "exp": exp, "token_type": "service"
+        })
+
+    sign_seconds = _run(sign, threads, calls, identities)
+    with ServiceTokenProvider(token_manager) as provider:
+        provider_seconds = _run(provider.get_token, threads, calls,
+                                identities)
+        signs = provider.stats()['signs']
+    print(json.dumps({
+        'threads': threads,
+        'identities': identities,
+        'create_service_token_per_second': round(calls / sign_seconds),
+        'create_service_token_signs': calls,
+        'provider_per_second': round(calls / provider_seconds),
+        'provider_signs': signs,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--identities', type=int, default=4)
+    arguments = parser.parse_args()
+    main(arguments.threads, arguments.calls, arguments.identities)
@@ -0,0 +1,60 @@
+"""
+Peak memory of validate_stream by input size.
+
+Streams N tokens from a generator through validate_stream into a discarding
+writer and reports the tracemalloc peak, which stays flat as N grows.
+
+    python benchmarks/streaming_memory.py --sizes 1000 10000 100000
+"""
+from datetime import datetime, timedelta
+import argparse
+import io
+import itertools
+import json
+import time
+import tracemalloc
+
+from nc_tokens.rsa_token_lib import InMemoryKeyLoader
+from nc_tokens.token_manager import JWTEncoder, TokenValidator
+from nc_tokens.token_manager.streaming import (
+    read_tokens, validate_stream, write_jsonl
+)
+
+
+class _NullWriter(io.TextIOBase):
+    def write(self, data):
+        return len(data)
+
+
+def main(sizes, workers):
+    key_loader = InMemoryKeyLoader.generate()
+    exp = int((datetime.utcnow() + timedelta(hours=1)).timestamp() * 1000)
+    token = JWTEncoder().encode(
+        {"sub": "user", "exp": exp, "token_type": "user"},
+        key_loader.private_key, token_type="user"
+    )
+    validator = TokenValidator(key_loader.public_key)
+    results = {}
+    for size in sizes:
+        lines = itertools.repeat(token + '\n', size)
+        tracemalloc.start()
+        start = time.perf_counter()
+        write_jsonl(validate_stream(read_tokens(lines), validator,
+                                    max_workers=workers), _NullWriter())
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[str(size)] = {
+            'peak_kib': round(peak / 1024, 1),
+            'tokens_per_second': round(size / elapsed, 1),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 10000, 100000])
+    parser.add_argument('--workers', type=int, default=4)
+    arguments = parser.parse_args()
+    main(arguments.sizes, arguments.workers)
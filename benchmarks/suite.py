@@ -0,0 +1,233 @@
+"""
+Offline benchmark suite for the encode, decode, validate and key loading
+paths, written as JSON so results can be compared across versions.
+
+Keys are generated locally and the Spaces bucket is replaced by moto's
+in-process S3, so no network or credentials are needed. Without moto the
+cold start section is skipped.
+
+    python benchmarks/suite.py --output results.json
+    python benchmarks/suite.py --quick
+"""
+from datetime import datetime, timedelta, timezone
+import argparse
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import cryptography
+from cryptography.hazmat.primitives import serialization
+
+from nc_tokens.rsa_token_lib import InMemoryKeyLoader
+from nc_tokens.token_creator.execute import TokenCreatorManager
+from nc_tokens.token_manager import (
+    JWTDecoder, JWTEncoder, TokenManager, get_serializer
+)
+
+try:
+    import boto3
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+ENDPOINT_URL = "https://s3.us-east-1.amazonaws.com"
+BUCKET = "benchmark-keys"
+PAYLOAD_SIZES = (0, 256, 1024, 4096, 16384)
+
+
+def _percentile(values, percentile):
+    values = sorted(values)
+    index = min(len(values) - 1, int(len(values) * percentile / 100))
+    return values[index]
+
+
+def _latency(function, iterations):
+    """
+    Latency of function in microseconds.
+    :param function: function without arguments
+    :param iterations: number of calls
+    :return: dictionary with p50, p99 and mean
+    """
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        function()
+        timings.append((time.perf_counter_ns() - start) / 1000)
+    return {
+        'p50_us': round(statistics.median(timings), 1),
+        'p99_us': round(_percentile(timings, 99), 1),
+        'mean_us': round(statistics.fmean(timings), 1),
+    }
+
+
+def _per_second(function, count):
+    start = time.perf_counter()
+    function()
+    return round(count / (time.perf_counter() - start), 1)
+
+
+def _payload(index=0, padding=0):
+    exp = int((datetime.utcnow() + timedelta(hours=1)).timestamp() * 1000)
+    payload = {"sub": f"user_{index}", "exp": exp, "token_type": "user"}
+    if padding:
+        payload["data"] = "x" * padding
+    return payload
+
+
+def single_token_latency(key_loader, iterations):
+    token_manager = TokenManager(key_loader, JWTEncoder(), JWTDecoder())
+    private_key, public_key = key_loader.load_keys()
+    encoder, decoder = JWTEncoder(), JWTDecoder()
+    payload = _payload()
+    token = encoder.encode(payload, private_key, token_type="user")
+    return {
+        'encode': _latency(
+            lambda: encoder.encode(payload, private_key, token_type="user"),
+            iterations
+        ),
+        'decode': _latency(lambda: decoder.decode(token, public_key),
+                           iterations),
+        'validate_token': _latency(
+            lambda: token_manager.validate_token(token), iterations
+        ),
+    }
+
+
+def batch_throughput(key_loader, count):
+    token_manager = TokenManager(key_loader, JWTEncoder(), JWTDecoder())
+    payloads = [_payload(index) for index in range(count)]
+    tokens = token_manager.create_user_tokens(payloads)
+    return {
+        'create_tokens_per_second': _per_second(
+            lambda: token_manager.create_user_tokens(payloads), count
+        ),
+        'validate_tokens_per_second': _per_second(
+            lambda: token_manager.validate_tokens(tokens), count
+        ),
+    }
+
+
+def payload_size_scaling(key_loader, iterations):
+    private_key, public_key = key_loader.load_keys()
+    encoder, decoder = JWTEncoder(), JWTDecoder()
+    results = {}
+    for size in PAYLOAD_SIZES:
+        payload = _payload(padding=size)
+        token = encoder.encode(payload, private_key, token_type="user")
+        results[str(size)] = {
+            'token_length': len(token),
+            'encode_p50_us': _latency(
+                lambda: encoder.encode(payload, private_key,
+                                       token_type="user"),
+                iterations
+            )['p50_us'],
+            'decode_p50_us': _latency(
+                lambda: decoder.decode(token, public_key), iterations
+            )['p50_us'],
+        }
+    return results
+
+
+def cold_start(key_loader, runs):
+    if mock_aws is None:
+        return {'skipped': 'moto is not installed'}
+    private_key, public_key = key_loader.load_keys()
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1",
+                          endpoint_url=ENDPOINT_URL)
+        s3.create_bucket(Bucket=BUCKET)
+        s3.put_object(Bucket=BUCKET, Key="private_key.pem",
+                      Body=private_key.private_bytes(
+                          encoding=serialization.Encoding.PEM,
+                          format=serialization.PrivateFormat.PKCS8,
+                          encryption_algorithm=serialization.NoEncryption()
+                      ))
+        s3.put_object(Bucket=BUCKET, Key="public_key.pem",
+                      Body=public_key.public_bytes(
+                          encoding=serialization.Encoding.PEM,
+                          format=serialization.PublicFormat
+                          .SubjectPublicKeyInfo
+                      ))
+        results = {}
+        for lazy in (False, True):
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                manager = TokenCreatorManager(
+                    spaces_bucket=BUCKET,
+                    spaces_region="us-east-1",
+                    access_key_id="benchmark",
+                    secret_access_key="benchmark",
+                    endpoint_url=ENDPOINT_URL,
+                    lazy=lazy
+                )
+                manager.validate_token(manager.create_user_token(_payload()))
+                timings.append((time.perf_counter() - start) * 1000)
+            results['lazy' if lazy else 'eager'] = {
+                'p50_ms': round(statistics.median(timings), 2),
+                'max_ms': round(max(timings), 2),
+            }
+    return results
+
+
+def memory_per_manager(key_loader, count):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    managers = [TokenManager(key_loader, JWTEncoder(), JWTDecoder())
+                for _ in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff
+                    for stat in after.compare_to(before, 'filename'))
+    del managers
+    return {'bytes_per_manager': round(allocated / count)}
+
+
+def main(arguments):
+    key_loader = InMemoryKeyLoader.generate(key_size=arguments.key_size)
+    results = {
+        'metadata': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cryptography': cryptography.__version__,
+            'serializer': get_serializer().name,
+            'key_size': arguments.key_size,
+        },
+        'single_token_latency': single_token_latency(key_loader,
+                                                     arguments.iterations),
+        'batch_throughput': batch_throughput(key_loader, arguments.batch),
+        'payload_size_scaling': payload_size_scaling(
+            key_loader, max(1, arguments.iterations // 5)
+        ),
+        'cold_start': cold_start(key_loader, arguments.cold_start_runs),
+        'memory': memory_per_manager(key_loader, arguments.managers),
+    }
+    output = json.dumps(results, indent=2)
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--output', help='JSON file, stdout by default')
+    parser.add_argument('--key-size', type=int, default=2048)
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=5000)
+    parser.add_argument('--cold-start-runs', type=int, default=10)
+    parser.add_argument('--managers', type=int, default=100)
+    parser.add_argument('--quick', action='store_true',
+                        help='few iterations, for a smoke run')
+    arguments = parser.parse_args()
+    if arguments.quick:
+        arguments.iterations, arguments.batch = 200, 500
+        arguments.cold_start_runs, arguments.managers = 3, 20
+    main(arguments)
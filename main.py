@@ -15,7 +15,7 @@ if __name__ == '__main__':
         "aud": "jti",
         "exp": 1724377087629,
         "iat": 128937218974,
-        "nbf": "bf",
+        "nbf": 128937218974,
         "token_type": "user"
     }
 
@@ -31,7 +31,7 @@ if __name__ == '__main__':
         "aud": "jti",
         "exp": 2724377087629,
         "iat": 1724377087629,
-        "nbf": "bf",
+        "nbf": 1724377087629,
         "service_name": "service_name",
         "token_type": "service"
     }
@@ -1,4 +1,16 @@
 from .interfaces import KeyLoader
 from .key_generators import SpacesKeyLoader, SpacesConfig
+from .local_key_loaders import FileKeyLoader, InMemoryKeyLoader
+from .key_cache import LocalKeyCache
+from .key_formats import parse_private_key, parse_public_key
+from .jwk import (
+    key_id, load_jwks, public_key_from_jwk, public_key_to_jwk,
+    public_keys_to_jwks
+)
+from .jwks_loader import JwksKeyLoader, JwksKeySet
 
-__all__ = ['SpacesKeyLoader', 'SpacesConfig', 'KeyLoader']
+__all__ = ['SpacesKeyLoader', 'SpacesConfig', 'KeyLoader', 'LocalKeyCache',
+           'FileKeyLoader', 'InMemoryKeyLoader', 'parse_private_key',
+           'parse_public_key', 'key_id', 'load_jwks', 'public_key_from_jwk',
+           'public_key_to_jwk', 'public_keys_to_jwks', 'JwksKeyLoader',
+           'JwksKeySet']
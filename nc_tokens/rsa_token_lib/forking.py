@@ -0,0 +1,38 @@
+"""
+Reinitialization of library objects in forked children.
+
+A child created with os.fork, as gunicorn and uWSGI do in preload mode,
+inherits the parsed keys, which stay shared copy-on-write, but also boto3
+clients whose connections are shared with the parent, locks that may have
+been held by a parent thread and background threads that don't exist in
+the child. Objects holding such state register here and their _after_fork
+method is called in the child, before it runs any other code.
+"""
+import logging
+import os
+import weakref
+
+logger = logging.getLogger(__name__)
+
+_registered: 'weakref.WeakSet' = weakref.WeakSet()
+
+
+def register_after_fork(obj):
+    """
+    Call obj._after_fork() in every child forked while obj is alive.
+    :param obj: object with an _after_fork method, held by weak reference
+    """
+    _registered.add(obj)
+
+
+def _after_fork_in_child():
+    for obj in list(_registered):
+        try:
+            obj._after_fork()
+        except Exception:
+            logger.exception("Failed to reinitialize %s after fork",
+                             type(obj).__name__)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -8,3 +8,11 @@ class KeyLoader(ABC):
     def load_keys(self) -> Tuple[Any, Any]:
         """Loads RSAPrivateKey and RSAPublicKey"""
         raise NotImplementedError
+
+    def load_private_key(self) -> Any:
+        """Loads only the RSAPrivateKey"""
+        return self.load_keys()[0]
+
+    def load_public_key(self) -> Any:
+        """Loads only the RSAPublicKey"""
+        return self.load_keys()[1]
@@ -0,0 +1,179 @@
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from typing import Any, Dict, List, Mapping, Optional, Union
+import base64
+import hashlib
+import json
+
+# JWS algorithm of each JWK key type
+_ALGORITHMS = {"RSA": "RS256", "EC": "ES256", "OKP": "EdDSA"}
+
+
+def _base64url(data: bytes) -> str:
+    """
+    Base64url encode bytes without padding.
+    :param data: bytes
+    :return: base64url string
+    """
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('utf-8')
+
+
+def _base64url_to_bytes(data: str) -> bytes:
+    """
+    Decode base64url with or without padding.
+    :param data: base64url string
+    :return: bytes
+    """
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _base64url_uint(value: int) -> str:
+    """
+    Base64url encode an unsigned integer as in RFC 7518.
+    :param value: integer
+    :return: base64url string without padding
+    """
+    data = value.to_bytes(max(1, (value.bit_length() + 7) // 8), 'big')
+    return _base64url(data)
+
+
+def _base64url_to_uint(data: str) -> int:
+    """
+    Decode a base64url unsigned integer as in RFC 7518.
+    :param data: base64url string with or without padding
+    :return: integer
+    """
+    return int.from_bytes(_base64url_to_bytes(data), 'big')
+
+
+def _required_members(public_key) -> Dict[str, str]:
+    """
+    Required JWK members of a public key, as used by the thumbprint.
+    :param public_key: public key
+    :return: dictionary with the JWK members
+    """
+    if isinstance(public_key, rsa.RSAPublicKey):
+        numbers = public_key.public_numbers()
+        return {
+            "e": _base64url_uint(numbers.e),
+            "kty": "RSA",
+            "n": _base64url_uint(numbers.n),
+        }
+    if (isinstance(public_key, ec.EllipticCurvePublicKey)
+            and isinstance(public_key.curve, ec.SECP256R1)):
+        numbers = public_key.public_numbers()
+        return {
+            "crv": "P-256",
+            "kty": "EC",
+            "x": _base64url(numbers.x.to_bytes(32, 'big')),
+            "y": _base64url(numbers.y.to_bytes(32, 'big')),
+        }
+    if isinstance(public_key, ed25519.Ed25519PublicKey):
+        raw = public_key.public_bytes(serialization.Encoding.Raw,
+                                      serialization.PublicFormat.Raw)
+        return {
+            "crv": "Ed25519",
+            "kty": "OKP",
+            "x": _base64url(raw),
+        }
+    raise ValueError(f"Unsupported key type: {type(public_key).__name__}")
+
+
+def key_id(public_key: rsa.RSAPublicKey) -> str:
+    """
+    Key id of a public key, the RFC 7638 JWK SHA-256 thumbprint.
+    :param public_key: public key
+    :return: base64url thumbprint
+    """
+    members = json.dumps(_required_members(public_key), sort_keys=True,
+                         separators=(',', ':'))
+    digest = hashlib.sha256(members.encode('utf-8')).digest()
+    return _base64url(digest)
+
+
+def public_key_to_jwk(public_key: rsa.RSAPublicKey,
+                      kid: Optional[str] = None) -> Dict[str, str]:
+    """
+    JWK of a public key.
+    :param public_key: public key
+    :param kid: key id, the thumbprint of the key when None
+    :return: JWK dictionary
+    """
+    jwk = dict(_required_members(public_key))
+    jwk["kid"] = kid or key_id(public_key)
+    jwk["use"] = "sig"
+    jwk["alg"] = _ALGORITHMS[jwk["kty"]]
+    return jwk
+
+
+def public_key_from_jwk(jwk: Dict[str, Any]) -> rsa.RSAPublicKey:
+    """
+    Public key of a JWK.
+    :param jwk: JWK dictionary
+    :return: public key
+    """
+    key_type = jwk.get("kty")
+    if key_type == "RSA":
+        try:
+            return rsa.RSAPublicNumbers(
+                _base64url_to_uint(jwk["e"]),
+                _base64url_to_uint(jwk["n"])
+            ).public_key()
+        except (KeyError, TypeError, ValueError) as error:
+            raise ValueError(f"Invalid RSA JWK: {str(error)}")
+    if key_type == "EC" and jwk.get("crv") == "P-256":
+        try:
+            return ec.EllipticCurvePublicNumbers(
+                _base64url_to_uint(jwk["x"]),
+                _base64url_to_uint(jwk["y"]),
+                ec.SECP256R1()
+            ).public_key()
+        except (KeyError, TypeError, ValueError) as error:
+            raise ValueError(f"Invalid EC JWK: {str(error)}")
+    if key_type == "OKP" and jwk.get("crv") == "Ed25519":
+        try:
+            return ed25519.Ed25519PublicKey.from_public_bytes(
+                _base64url_to_bytes(jwk["x"])
+            )
+        except (KeyError, TypeError, ValueError) as error:
+            raise ValueError(f"Invalid OKP JWK: {str(error)}")
+    raise ValueError(f"Unsupported JWK key type: {key_type}")
+
+
+def load_jwks(
+        document: Union[str, bytes, Dict[str, Any]]
+) -> Dict[str, rsa.RSAPublicKey]:
+    """
+    Public keys of a JWKS document indexed by kid. Keys not meant for
+    signatures or of unsupported types are skipped.
+    :param document: JWKS as a JSON string, bytes or dictionary
+    :return: dictionary from kid to public key
+    """
+    if isinstance(document, (str, bytes, bytearray)):
+        document = json.loads(document)
+    keys = {}
+    for jwk in document.get("keys", []):
+        if jwk.get("use", "sig") != "sig":
+            continue
+        try:
+            public_key = public_key_from_jwk(jwk)
+        except ValueError:
+            continue
+        keys[jwk.get("kid") or key_id(public_key)] = public_key
+    return keys
+
+
+def public_keys_to_jwks(
+        public_keys: Mapping[Optional[str], rsa.RSAPublicKey]
+) -> Dict[str, List[Dict[str, str]]]:
+    """
+    JWKS document of public keys.
+    :param public_keys: mapping from kid to public key, keys under None
+    get their thumbprint as kid and the same key is listed once
+    :return: JWKS dictionary
+    """
+    jwks = {}
+    for kid, public_key in public_keys.items():
+        jwk = public_key_to_jwk(public_key, kid)
+        jwks.setdefault(jwk["kid"], jwk)
+    return {"keys": list(jwks.values())}
@@ -0,0 +1,268 @@
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+import logging
+import os
+import threading
+import time
+
+from .forking import register_after_fork
+from .interfaces import KeyLoader
+from .jwk import load_jwks
+
+logger = logging.getLogger(__name__)
+
+
+def _max_age(headers) -> Optional[float]:
+    """
+    Freshness lifetime of an HTTP response from Cache-Control and Age.
+    :param headers: response headers
+    :return: seconds the response stays fresh, None without max-age
+    """
+    cache_control = headers.get('Cache-Control') or ''
+    max_age = None
+    for directive in cache_control.split(','):
+        name, _, value = directive.strip().partition('=')
+        name = name.lower()
+        if name in ('no-cache', 'no-store'):
+            return 0.0
+        if name == 'max-age':
+            try:
+                max_age = float(value.strip('"'))
+            except ValueError:
+                continue
+    if max_age is None:
+        return None
+    try:
+        age = float(headers.get('Age') or 0)
+    except ValueError:
+        age = 0.0
+    return max(0.0, max_age - age)
+
+
+class JwksKeySet(Mapping):
+    """
+    Read-only mapping from kid to public key over a JwksKeyLoader, the
+    form JWTDecoder accepts. Looking up a kid refreshes stale keys and
+    refetches the document for unknown kids, rate limited. The None kid,
+    for tokens without kid, maps to the key of a single-key document.
+    """
+    def __init__(self, loader: 'JwksKeyLoader'):
+        self._loader = loader
+
+    @property
+    def generation(self) -> int:
+        """
+        Number of refreshes that removed a kid, read after refreshing stale
+        keys. KeyRing adds it to its generation so caches of verified
+        tokens drop the tokens of removed keys.
+        """
+        self._loader.keys()
+        return self._loader.generation
+
+    def __getitem__(self, kid: Optional[str]):
+        public_key = self._loader.get_key(kid)
+        if public_key is None:
+            raise KeyError(kid)
+        return public_key
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._loader.keys())
+
+    def __len__(self) -> int:
+        return len(self._loader.keys())
+
+
+class JwksKeyLoader(KeyLoader):
+    """
+    Public keys of a JWKS document, from an http(s) URL or a file, for
+    validate-only services that have no object store credentials.
+
+    The document is kept in memory as a kid map. HTTP responses stay fresh
+    for their Cache-Control max-age (default_max_age without one) and are
+    revalidated with If-None-Match, files are read again when their
+    modification time changes. A token with an unknown kid refetches the
+    document at most once every min_refetch_interval seconds, which is
+    also the shortest freshness lifetime honoured. When a refresh fails
+    the previous keys are kept. generation is incremented by every refresh
+    that removes a kid.
+
+    load_public_key returns a JwksKeySet, there is no private key.
+    """
+    def __init__(
+            self,
+            location: str,
+            default_max_age: float = 300.0,
+            min_refetch_interval: float = 30.0,
+            timeout: float = 5.0,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.location = location
+        self.is_url = location.startswith(('http://', 'https://'))
+        self.default_max_age = default_max_age
+        self.min_refetch_interval = min_refetch_interval
+        self.timeout = timeout
+        self.clock = clock
+        self.fetches = 0
+        self.generation = 0
+        self._keys: Dict[str, Any] = {}
+        self._validator: Any = None
+        self._expires_at = float('-inf')
+        self._fetched_at = float('-inf')
+        self._lock = threading.Lock()
+        self._key_set = JwksKeySet(self)
+        register_after_fork(self)
+
+    def __getstate__(self):
+        # public keys and the lock can't be pickled, the copy fetches again
+        state = self.__dict__.copy()
+        state.update(_keys={}, _validator=None, _lock=None,
+                     _expires_at=float('-inf'), _fetched_at=float('-inf'))
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._key_set = JwksKeySet(self)
+        register_after_fork(self)
+
+    def _after_fork(self):
+        # the keys are kept, a parent thread may have held the lock
+        self._lock = threading.Lock()
+
+    def _fetch_url(self) -> Tuple[Optional[bytes], Any, float]:
+        """
+        Conditional GET of the document.
+        :return: body, None when not modified, ETag and max-age
+        """
+        headers = {'Accept': 'application/json'}
+        if self._validator is not None:
+            headers['If-None-Match'] = self._validator
+        request = Request(self.location, headers=headers)
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                body = response.read()
+                response_headers = response.headers
+        except HTTPError as error:
+            if error.code != 304:
+                raise
+            body, response_headers = None, error.headers
+        max_age = _max_age(response_headers)
+        if max_age is None:
+            max_age = self.default_max_age
+        etag = response_headers.get('ETag') or self._validator
+        return body, etag, max_age
+
+    def _fetch_file(self) -> Tuple[Optional[bytes], Any, float]:
+        """
+        Read the document if its modification time changed.
+        :return: body, None when unchanged, mtime and default_max_age
+        """
+        mtime = os.stat(self.location).st_mtime_ns
+        if mtime == self._validator:
+            return None, mtime, self.default_max_age
+        with open(self.location, 'rb') as file:
+            return file.read(), mtime, self.default_max_age
+
+    def refresh(self):
+        """Fetch the document now, keeping the keys when unchanged."""
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        started = self.clock()
+        self.fetches += 1
+        try:
+            if self.is_url:
+                body, validator, max_age = self._fetch_url()
+            else:
+                body, validator, max_age = self._fetch_file()
+            if body is not None:
+                keys = load_jwks(body)
+                if not keys:
+                    raise ValueError(
+                        "The JWKS document has no signature keys"
+                    )
+                if not set(self._keys) <= set(keys):
+                    self.generation += 1
+                self._keys = keys
+            self._validator = validator
+            self._expires_at = started + max(max_age,
+                                             self.min_refetch_interval)
+        finally:
+            # set when the fetch ends, so lookups of an unknown kid during
+            # a fetch wait for it on the lock instead of giving up
+            self._fetched_at = self.clock()
+
+    def _refresh_quietly(self, blocking: bool,
+                         needed: Callable[[], bool]) -> bool:
+        """
+        Refresh unless another thread is doing it, logging failures once
+        keys were loaded.
+        :param blocking: wait for a refresh in progress
+        :param needed: checked again under the lock, so threads that waited
+        for a refresh don't fetch once more
+        :return: True if this call refreshed
+        """
+        if not self._lock.acquire(blocking=blocking):
+            return False
+        try:
+            if not needed():
+                return False
+            self._refresh()
+        except Exception:
+            if not self._keys:
+                raise
+            logger.warning("Failed to refresh the JWKS from %s, keeping "
+                           "the current keys", self.location, exc_info=True)
+        finally:
+            self._lock.release()
+        return True
+
+    def keys(self) -> Dict[str, Any]:
+        """
+        Current keys, refreshed when stale.
+        :return: dictionary from kid to public key
+        """
+        if self._stale():
+            # the first load waits, later ones let other threads use the
+            # stale keys while a single thread refreshes
+            self._refresh_quietly(not self._keys, self._stale)
+        return self._keys
+
+    def _stale(self) -> bool:
+        return self.clock() >= self._expires_at
+
+    def _may_refetch(self) -> bool:
+        return self.clock() - self._fetched_at >= self.min_refetch_interval
+
+    def get_key(self, kid: Optional[str]):
+        """
+        Public key of a kid, refetching the document for an unknown kid
+        at most once every min_refetch_interval seconds.
+        :param kid: kid of the token header, None for tokens without kid
+        :return: public key, None if unknown
+        """
+        keys = self.keys()
+        if kid is None:
+            return next(iter(keys.values())) if len(keys) == 1 else None
+        public_key = keys.get(kid)
+        if public_key is not None:
+            return public_key
+        if not self._may_refetch():
+            return None
+        self._refresh_quietly(
+            True, lambda: kid not in self._keys and self._may_refetch()
+        )
+        return self._keys.get(kid)
+
+    def load_keys(self) -> Tuple[None, JwksKeySet]:
+        self.keys()
+        return None, self._key_set
+
+    def load_private_key(self):
+        raise ValueError("A JWKS has no private key")
+
+    def load_public_key(self) -> JwksKeySet:
+        return self.load_keys()[1]
@@ -0,0 +1,97 @@
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import quote
+import base64
+import json
+import os
+import tempfile
+import time
+
+
+@dataclass
+class CachedKey:
+    data: bytes
+    etag: Optional[str]
+    fetched_at: float
+
+
+class LocalKeyCache:
+    """
+    On-disk cache of downloaded keys and their ETags.
+
+    Every key is stored in a single JSON file written atomically with 0600
+    permissions, inside a directory created with 0700 permissions. The
+    file names start with the namespace, so caches of different buckets
+    can share a directory.
+    """
+    def __init__(self, directory: str, ttl: Optional[float] = None,
+                 namespace: str = ''):
+        self.directory = directory
+        self.ttl = ttl
+        self.namespace = namespace
+
+    def _path(self, key_name: str) -> str:
+        """
+        Path of the cache file of a key.
+        :param key_name: name of the key in the bucket
+        :return: path of the cache file
+        """
+        name = quote(key_name, safe='')
+        if self.namespace:
+            name = f"{self.namespace}-{name}"
+        return os.path.join(self.directory, f"{name}.json")
+
+    def is_fresh(self, cached_key: CachedKey) -> bool:
+        """
+        Whether the cached key can be used without asking the bucket.
+        :param cached_key: cached key
+        :return: True if the key was fetched less than ttl seconds ago
+        """
+        if self.ttl is None:
+            return False
+        return time.time() - cached_key.fetched_at < self.ttl
+
+    def read(self, key_name: str) -> Optional[CachedKey]:
+        """
+        Read a key from the cache.
+        :param key_name: name of the key in the bucket
+        :return: cached key or None if missing or unreadable
+        """
+        try:
+            with open(self._path(key_name), 'r', encoding='utf-8') as file:
+                content = json.load(file)
+            return CachedKey(
+                data=base64.b64decode(content['data']),
+                etag=content.get('etag'),
+                fetched_at=float(content['fetched_at'])
+            )
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def write(self, key_name: str, data: bytes, etag: Optional[str]):
+        """
+        Write a key to the cache atomically.
+        :param key_name: name of the key in the bucket
+        :param data: key bytes
+        :param etag: ETag returned by the bucket
+        """
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        content = json.dumps({
+            'etag': etag,
+            'fetched_at': time.time(),
+            'data': base64.b64encode(data).decode('ascii'),
+        })
+        file_descriptor, temporary_path = tempfile.mkstemp(
+            dir=self.directory, prefix='.tmp-'
+        )
+        try:
+            with os.fdopen(file_descriptor, 'w', encoding='utf-8') as file:
+                os.fchmod(file.fileno(), 0o600)
+                file.write(content)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary_path, self._path(key_name))
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.unlink(temporary_path)
+            raise
@@ -0,0 +1,40 @@
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from typing import Optional
+
+_PEM_PREFIX = b'-----BEGIN'
+
+
+def _is_pem(data) -> bool:
+    """
+    Whether the key bytes are PEM, otherwise they are treated as DER.
+    :param data: bytes-like key data
+    :return: True for PEM data
+    """
+    return bytes(memoryview(data)[:64]).lstrip().startswith(_PEM_PREFIX)
+
+
+def parse_private_key(
+        data,
+        password: Optional[bytes] = None
+) -> rsa.RSAPrivateKey:
+    """
+    Parse a private key in PEM or DER (PKCS8 or traditional) format.
+    :param data: bytes-like key data
+    :param password: password of an encrypted key
+    :return: private key
+    """
+    if _is_pem(data):
+        return serialization.load_pem_private_key(data, password=password)
+    return serialization.load_der_private_key(data, password=password)
+
+
+def parse_public_key(data) -> rsa.RSAPublicKey:
+    """
+    Parse a public key in PEM or DER (SubjectPublicKeyInfo) format.
+    :param data: bytes-like key data
+    :return: public key
+    """
+    if _is_pem(data):
+        return serialization.load_pem_public_key(data)
+    return serialization.load_der_public_key(data)
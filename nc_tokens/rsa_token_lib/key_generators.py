@@ -1,11 +1,19 @@
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.backends import default_backend
-from typing import Tuple
-from botocore.exceptions import ClientError
+from typing import Any, Callable, Dict, Optional, Tuple
+from .forking import register_after_fork
 from .interfaces import KeyLoader
-import boto3
+from .key_cache import LocalKeyCache
+from .key_formats import parse_private_key, parse_public_key
+import hashlib
+import json
+import threading
+import time
+
+KEY_FORMATS = ('pem', 'der', 'auto')
 
 
 @dataclass
@@ -16,70 +24,291 @@ class SpacesConfig:
     secret_access_key: str
     private_key_name: str = "private_key.pem"
     public_key_name: str = "public_key.pem"
+    endpoint_url: Optional[str] = None
+    cache_dir: Optional[str] = None
+    cache_ttl: Optional[float] = None
+    # 'pem', 'der' or 'auto' to detect the format of every key
+    key_format: str = "pem"
 
 
 class SpacesKeyLoader(KeyLoader):
-    def __init__(self, configuration: SpacesConfig):
+    """
+    Loads the key pair from a Digital Ocean Spaces bucket.
+
+    boto3 is imported when the client is created. With lazy=True the client
+    is created on the first key download, the bucket is not probed and
+    load_keys downloads both keys concurrently.
+
+    With cache_dir set the keys and their ETags are kept on disk. A cached
+    key younger than cache_ttl seconds is used without network, an older
+    one is revalidated with a conditional GET. Cache files are named after
+    the endpoint, region and bucket, so loaders of different buckets can
+    share cache_dir.
+
+    An observer (see nc_tokens.token_manager.TokenObserver) receives the
+    duration of every download as the 'key_fetch' stage.
+
+    Parsed keys are kept with the digest of their bytes, so reloading an
+    unchanged key returns the same object without parsing it again:
+    loading an RSA private key validates it, which takes tens of
+    milliseconds for 2048-bit keys and hundreds for 4096-bit ones.
+
+    The loader can be shared between threads. In a forked child the boto3
+    client and session are dropped and created again on first use, the
+    parsed keys are kept.
+    """
+    def __init__(self, configuration: SpacesConfig, lazy: bool = False,
+                 observer=None):
+        if configuration.key_format not in KEY_FORMATS:
+            raise ValueError(
+                f"Unsupported key format: {configuration.key_format}"
+            )
         self.config = configuration
+        self.lazy = lazy
+        self.observer = observer
+        self.session = None
+        self._client = None
+        self._client_lock = threading.Lock()
+        register_after_fork(self)
+        self._parsed_keys: Dict[str, Tuple[bytes, Any]] = {}
+        self.key_cache = None
+        if configuration.cache_dir is not None:
+            self.key_cache = LocalKeyCache(configuration.cache_dir,
+                                           ttl=configuration.cache_ttl,
+                                           namespace=self._cache_namespace())
+        if not lazy:
+            self._client = self._create_client()
+            self._validate_bucket_exists()
+
+    def __getstate__(self):
+        # the boto3 client, the lock and the parsed keys can't be pickled,
+        # the copy creates its own client on first use
+        state = self.__dict__.copy()
+        state.update(session=None, _client=None, _client_lock=None,
+                     observer=None, _parsed_keys={})
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._client_lock = threading.Lock()
+        register_after_fork(self)
+
+    def _after_fork(self):
+        # boto3 clients share their connection pool with the parent
+        self.session = None
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """boto3 s3 client, created on first use."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._create_client()
+        return self._client
+
+    @property
+    def endpoint_url(self) -> str:
+        """Endpoint of the bucket, the Spaces one of the region by default."""
+        return (self.config.endpoint_url or
+                f'https://{self.config.spaces_region}.digitaloceanspaces.com')
+
+    def _cache_namespace(self) -> str:
+        """
+        Prefix of the cache files, from the endpoint, region and bucket.
+        :return: hexadecimal digest
+        """
+        location = json.dumps([self.endpoint_url, self.config.spaces_region,
+                               self.config.spaces_bucket])
+        return hashlib.sha256(location.encode('utf-8')).hexdigest()[:16]
+
+    def _create_client(self):
+        import boto3
+
         self.session = boto3.session.Session()
-        self.client = self.session.client(
+        return self.session.client(
             's3',
-            region_name=configuration.spaces_region,
-            endpoint_url=f'https://{configuration.spaces_region}'
-                         f'.digitaloceanspaces.com',
-            aws_access_key_id=configuration.access_key_id,
-            aws_secret_access_key=configuration.secret_access_key
+            region_name=self.config.spaces_region,
+            endpoint_url=self.endpoint_url,
+            aws_access_key_id=self.config.access_key_id,
+            aws_secret_access_key=self.config.secret_access_key
         )
-        self._validate_bucket_exists()
 
     def _validate_bucket_exists(self):
+        from botocore.exceptions import ClientError
+
         try:
             self.client.head_bucket(Bucket=self.config.spaces_bucket)
         except ClientError as error:
             error_code = error.response['Error']['Code']
             if error_code == '404':
-                raise ValueError(
-                    f"The bucket '{self.config.spaces_bucket}' does not "
-                    f"exist in Digital Ocean Spaces."
-                )
+                raise self._bucket_not_found_error()
             elif error_code == '403':
-                raise PermissionError(
-                    f"You don't have permission to access the bucket '"
-                    f"{self.config.spaces_bucket}'."
-                )
+                raise self._bucket_permission_error()
             else:
                 raise RuntimeError(
                     f"An error occurred while accessing the bucket '"
                     f"{self.config.spaces_bucket}': {str(error)}"
                 )
 
+    def _bucket_not_found_error(self) -> ValueError:
+        return ValueError(
+            f"The bucket '{self.config.spaces_bucket}' does not "
+            f"exist in Digital Ocean Spaces."
+        )
+
+    def _bucket_permission_error(self) -> PermissionError:
+        return PermissionError(
+            f"You don't have permission to access the bucket '"
+            f"{self.config.spaces_bucket}'."
+        )
+
     def _load_key(self, key_name: str) -> bytes:
+        if self.key_cache is None:
+            return self._download_key(key_name)[0]
+
+        cached_key = self.key_cache.read(key_name)
+        if cached_key is not None and self.key_cache.is_fresh(cached_key):
+            return cached_key.data
+
+        etag = cached_key.etag if cached_key is not None else None
+        response = self._download_key(key_name, etag=etag)
+        if response is None:
+            data, etag = cached_key.data, cached_key.etag
+        else:
+            data, etag = response
+        self.key_cache.write(key_name, data, etag)
+        return data
+
+    def _download_key(
+            self,
+            key_name: str,
+            etag: Optional[str] = None,
+    ) -> Optional[Tuple[bytes, Optional[str]]]:
+        """
+        Download a key from the bucket, timed when there is an observer.
+        :param key_name: name of the key in the bucket
+        :param etag: ETag of the cached copy for a conditional GET
+        :return: key bytes and ETag, or None if the key did not change
+        since etag
+        """
+        if self.observer is None:
+            return self._get_key_object(key_name, etag)
+        start = time.perf_counter()
+        try:
+            return self._get_key_object(key_name, etag)
+        finally:
+            self.observer.on_stage('key_fetch', time.perf_counter() - start)
+
+    def _get_key_object(
+            self,
+            key_name: str,
+            etag: Optional[str],
+    ) -> Optional[Tuple[bytes, Optional[str]]]:
+        """
+        GET a key object, see _download_key.
+        """
+        from botocore.exceptions import ClientError
+
+        arguments = {'Bucket': self.config.spaces_bucket, 'Key': key_name}
+        if etag is not None:
+            arguments['IfNoneMatch'] = etag
         try:
-            response = self.client.get_object(Bucket=self.config.spaces_bucket,
-                                              Key=key_name)
-            return response['Body'].read()
+            response = self.client.get_object(**arguments)
+            return response['Body'].read(), response.get('ETag')
         except ClientError as error:
-            if error.response['Error']['Code'] == 'NoSuchKey':
+            error_code = error.response['Error']['Code']
+            if error_code == '304' and etag is not None:
+                return None
+            elif error_code == 'NoSuchKey':
                 raise FileNotFoundError(
                     f"The key '{key_name}' does not exist in the bucket.")
+            elif error_code == 'NoSuchBucket':
+                raise self._bucket_not_found_error()
+            elif error_code in ('AccessDenied', '403'):
+                raise self._bucket_permission_error()
             else:
                 raise RuntimeError(
                     f"An error occurred while loading the key '{key_name}':"
                     f" {str(error)}"
                 )
 
-    def load_keys(self) -> Tuple[rsa.RSAPrivateKey, rsa.RSAPublicKey]:
-        private_key_bytes = self._load_key(self.config.private_key_name)
-        public_key_bytes = self._load_key(self.config.public_key_name)
+    def _load_key_pair_bytes(self) -> Tuple[bytes, bytes]:
+        """
+        Download the private and public keys, concurrently in lazy mode.
+        :return: private key bytes and public key bytes
+        """
+        if not self.lazy:
+            return (self._load_key(self.config.private_key_name),
+                    self._load_key(self.config.public_key_name))
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            private_key_bytes = executor.submit(
+                self._load_key, self.config.private_key_name
+            )
+            public_key_bytes = executor.submit(
+                self._load_key, self.config.public_key_name
+            )
+            return private_key_bytes.result(), public_key_bytes.result()
 
-        rsa_private_key = serialization.load_pem_private_key(
+    def _parse_private_key(self, private_key_bytes: bytes
+                           ) -> rsa.RSAPrivateKey:
+        if self.config.key_format == 'der':
+            return serialization.load_der_private_key(private_key_bytes,
+                                                      password=None)
+        if self.config.key_format == 'auto':
+            return parse_private_key(private_key_bytes)
+        return serialization.load_pem_private_key(
             private_key_bytes,
             password=None,
             backend=default_backend()
         )
-        rsa_public_key = serialization.load_pem_public_key(
+
+    def _parse_public_key(self, public_key_bytes: bytes) -> rsa.RSAPublicKey:
+        if self.config.key_format == 'der':
+            return serialization.load_der_public_key(public_key_bytes)
+        if self.config.key_format == 'auto':
+            return parse_public_key(public_key_bytes)
+        return serialization.load_pem_public_key(
             public_key_bytes,
             backend=default_backend()
         )
 
+    def _parsed_key(self, key_name: str, data: bytes,
+                    parse: Callable[[bytes], Any]):
+        """
+        Parse a key, or return the key parsed from the same bytes before.
+        :param key_name: name of the key in the bucket
+        :param data: key bytes
+        :param parse: parser of the key bytes
+        :return: key
+        """
+        digest = hashlib.sha256(data).digest()
+        parsed = self._parsed_keys.get(key_name)
+        if parsed is not None and parsed[0] == digest:
+            return parsed[1]
+        key = parse(data)
+        self._parsed_keys[key_name] = (digest, key)
+        return key
+
+    def load_keys(self) -> Tuple[rsa.RSAPrivateKey, rsa.RSAPublicKey]:
+        private_key_bytes, public_key_bytes = self._load_key_pair_bytes()
+
+        rsa_private_key = self._parsed_key(self.config.private_key_name,
+                                           private_key_bytes,
+                                           self._parse_private_key)
+        rsa_public_key = self._parsed_key(self.config.public_key_name,
+                                          public_key_bytes,
+                                          self._parse_public_key)
+
         return rsa_private_key, rsa_public_key
+
+    def load_private_key(self) -> rsa.RSAPrivateKey:
+        key_name = self.config.private_key_name
+        return self._parsed_key(key_name, self._load_key(key_name),
+                                self._parse_private_key)
+
+    def load_public_key(self) -> rsa.RSAPublicKey:
+        key_name = self.config.public_key_name
+        return self._parsed_key(key_name, self._load_key(key_name),
+                                self._parse_public_key)
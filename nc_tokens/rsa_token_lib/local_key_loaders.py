@@ -0,0 +1,139 @@
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from typing import Optional, Tuple, Union
+import mmap
+
+from .interfaces import KeyLoader
+from .key_formats import parse_private_key, parse_public_key
+
+
+class FileKeyLoader(KeyLoader):
+    """
+    Loads the key pair from PEM or DER files, for example mounted secrets.
+
+    The public key path is optional, without it the public key is derived
+    from the private key. With use_mmap=True the files are parsed straight
+    from a read-only memory map instead of being read into a bytes copy.
+    """
+    def __init__(
+            self,
+            private_key_path: Optional[str] = None,
+            public_key_path: Optional[str] = None,
+            password: Optional[bytes] = None,
+            use_mmap: bool = False,
+    ):
+        if private_key_path is None and public_key_path is None:
+            raise ValueError("A private or a public key path is required")
+        self.private_key_path = private_key_path
+        self.public_key_path = public_key_path
+        self.password = password
+        self.use_mmap = use_mmap
+
+    def _parse_file(self, path: str, parse):
+        """
+        Parse a key file.
+        :param path: path of the key file
+        :param parse: function parsing the key bytes
+        :return: parsed key
+        """
+        with open(path, 'rb') as file:
+            if not self.use_mmap:
+                return parse(file.read())
+            try:
+                key_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError(f"The key file '{path}' is empty")
+            with key_map:
+                return parse(key_map)
+
+    def load_private_key(self) -> rsa.RSAPrivateKey:
+        if self.private_key_path is None:
+            raise ValueError("No private key configured")
+        return self._parse_file(
+            self.private_key_path,
+            lambda data: parse_private_key(data, password=self.password)
+        )
+
+    def load_public_key(self) -> rsa.RSAPublicKey:
+        if self.public_key_path is None:
+            return self.load_private_key().public_key()
+        return self._parse_file(self.public_key_path, parse_public_key)
+
+    def load_keys(
+            self
+    ) -> Tuple[Optional[rsa.RSAPrivateKey], rsa.RSAPublicKey]:
+        if self.private_key_path is None:
+            return None, self.load_public_key()
+        private_key = self.load_private_key()
+        if self.public_key_path is None:
+            return private_key, private_key.public_key()
+        return private_key, self.load_public_key()
+
+
+class InMemoryKeyLoader(KeyLoader):
+    """Key loader over keys already in memory, as key objects or bytes."""
+    def __init__(
+            self,
+            private_key: Union[rsa.RSAPrivateKey, bytes, None] = None,
+            public_key: Union[rsa.RSAPublicKey, bytes, None] = None,
+            password: Optional[bytes] = None,
+    ):
+        if isinstance(private_key, (bytes, bytearray, memoryview)):
+            private_key = parse_private_key(private_key, password=password)
+        if isinstance(public_key, (bytes, bytearray, memoryview)):
+            public_key = parse_public_key(public_key)
+        if public_key is None and private_key is not None:
+            public_key = private_key.public_key()
+        if public_key is None:
+            raise ValueError("A private or a public key is required")
+        self.private_key = private_key
+        self.public_key = public_key
+
+    def __getstate__(self):
+        # key objects can't be pickled, process pool workers get DER bytes
+        private_key = None
+        if self.private_key is not None:
+            private_key = self.private_key.private_bytes(
+                encoding=serialization.Encoding.DER,
+                format=serialization.PrivateFormat.PKCS8,
+                encryption_algorithm=serialization.NoEncryption()
+            )
+        public_key = self.public_key.public_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        return {'private_key': private_key, 'public_key': public_key}
+
+    def __setstate__(self, state):
+        self.__init__(state['private_key'], state['public_key'])
+
+    @classmethod
+    def generate(cls, key_size: int = 2048,
+                 algorithm: str = 'RS256') -> 'InMemoryKeyLoader':
+        """
+        Key loader with a freshly generated key pair.
+        :param key_size: size of the RSA key in bits
+        :param algorithm: 'RS256', 'ES256' (P-256) or 'EdDSA' (Ed25519)
+        :return: key loader
+        """
+        if algorithm == 'ES256':
+            return cls(ec.generate_private_key(ec.SECP256R1()))
+        if algorithm == 'EdDSA':
+            return cls(ed25519.Ed25519PrivateKey.generate())
+        if algorithm != 'RS256':
+            raise ValueError(f"Unsupported algorithm: {algorithm}")
+        return cls(rsa.generate_private_key(public_exponent=65537,
+                                            key_size=key_size))
+
+    def load_keys(
+            self
+    ) -> Tuple[Optional[rsa.RSAPrivateKey], rsa.RSAPublicKey]:
+        return self.private_key, self.public_key
+
+    def load_private_key(self) -> rsa.RSAPrivateKey:
+        if self.private_key is None:
+            raise ValueError("No private key configured")
+        return self.private_key
+
+    def load_public_key(self) -> rsa.RSAPublicKey:
+        return self.public_key
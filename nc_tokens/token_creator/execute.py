@@ -1,43 +1,142 @@
-from typing import Optional
-from ..rsa_token_lib import SpacesKeyLoader, SpacesConfig
-from ..token_manager import TokenManager, JWTDecoder, JWTEncoder
+from concurrent.futures import Executor
+from typing import Iterable, List, Optional, Sequence
+from ..rsa_token_lib import KeyLoader, SpacesKeyLoader, SpacesConfig
+from ..token_manager import (
+    TokenManager, JWTDecoder, JWTEncoder, VerifiedTokenCache, TokenPrecheck,
+    TokenObserver, ValidationResult, ClaimsPolicy, RevocationList,
+    ServiceTokenProvider
+)
 from .interfaces import TokenCreator
 import datetime
 
 
 class TokenCreatorManager(TokenCreator):
+    """
+    Creates and validates tokens with keys from Digital Ocean Spaces, or
+    from any KeyLoader given as key_loader.
+    """
     def __init__(
             self,
-            spaces_bucket: str,
-            spaces_region: str,
-            access_key_id: str,
-            secret_access_key: str,
+            spaces_bucket: Optional[str] = None,
+            spaces_region: Optional[str] = None,
+            access_key_id: Optional[str] = None,
+            secret_access_key: Optional[str] = None,
+            key_loader: Optional[KeyLoader] = None,
+            token_cache: Optional[VerifiedTokenCache] = None,
+            lazy: bool = False,
+            key_cache_dir: Optional[str] = None,
+            key_cache_ttl: Optional[float] = None,
+            key_refresh_interval: Optional[float] = None,
+            precheck: Optional[TokenPrecheck] = None,
+            algorithm: Optional[str] = None,
+            allowed_algorithms: Optional[Sequence[str]] = None,
+            endpoint_url: Optional[str] = None,
+            observer: Optional[TokenObserver] = None,
+            claims_policy: Optional[ClaimsPolicy] = None,
+            revocations: Optional[RevocationList] = None,
+            revocation_refresh_interval: Optional[float] = None,
+            key_format: str = "pem",
     ):
-        self.encoder = JWTEncoder()
-        self.decoder = JWTDecoder()
-        self.spaces_config = SpacesConfig(
-            spaces_bucket=spaces_bucket,
-            spaces_region=spaces_region,
-            access_key_id=access_key_id,
-            secret_access_key=secret_access_key
-        )
-        self.key_management = SpacesKeyLoader(
-            configuration=self.spaces_config
-        )
+        self.encoder = JWTEncoder(algorithm=algorithm)
+        self.decoder = JWTDecoder(precheck=precheck,
+                                  allowed_algorithms=allowed_algorithms,
+                                  observer=observer,
+                                  claims=claims_policy)
+        self.token_cache = token_cache
+        self.lazy = lazy
+        self.key_refresh_interval = key_refresh_interval
+        self.revocations = revocations
+        self.revocation_refresh_interval = revocation_refresh_interval
+        self.spaces_config = None
+        if key_loader is not None:
+            self.key_management = key_loader
+        else:
+            if None in (spaces_bucket, spaces_region, access_key_id,
+                        secret_access_key):
+                raise ValueError(
+                    "Spaces bucket, region and credentials are required "
+                    "when no key_loader is given"
+                )
+            self.spaces_config = SpacesConfig(
+                spaces_bucket=spaces_bucket,
+                spaces_region=spaces_region,
+                access_key_id=access_key_id,
+                secret_access_key=secret_access_key,
+                endpoint_url=endpoint_url,
+                cache_dir=key_cache_dir,
+                cache_ttl=key_cache_ttl,
+                key_format=key_format
+            )
+            self.key_management = SpacesKeyLoader(
+                configuration=self.spaces_config,
+                lazy=lazy,
+                observer=observer
+            )
         self.token_manager = self._create_token_manager()
 
     def _create_token_manager(self):
         return TokenManager(
             self.key_management,
             self.encoder,
-            self.decoder
+            self.decoder,
+            token_cache=self.token_cache,
+            lazy=self.lazy,
+            key_refresh_interval=self.key_refresh_interval,
+            revocations=self.revocations,
+            revocation_refresh_interval=self.revocation_refresh_interval
         )
 
+    def export_jwks(self) -> dict:
+        return self.token_manager.export_jwks()
+
     def create_user_token(self, payload: dict) -> Optional[str]:
         return self.token_manager.create_user_token(payload=payload)
 
     def create_service_token(self, payload: dict) -> Optional[str]:
         return self.token_manager.create_service_token(payload=payload)
 
+    def service_token_provider(self, **kwargs) -> ServiceTokenProvider:
+        """
+        Provider reusing the service tokens of this manager, see
+        ServiceTokenProvider for the arguments.
+        """
+        return ServiceTokenProvider(self.token_manager, **kwargs)
+
+    def create_user_tokens(
+            self,
+            payloads: Iterable[dict],
+            max_workers: Optional[int] = None,
+            use_processes: bool = False,
+    ) -> List[str]:
+        return self.token_manager.create_user_tokens(
+            payloads, max_workers=max_workers, use_processes=use_processes
+        )
+
+    def create_service_tokens(
+            self,
+            payloads: Iterable[dict],
+            max_workers: Optional[int] = None,
+            use_processes: bool = False,
+    ) -> List[str]:
+        return self.token_manager.create_service_tokens(
+            payloads, max_workers=max_workers, use_processes=use_processes
+        )
+
+    def close(self):
+        self.token_manager.close()
+
     def validate_token(self, token: str) -> dict:
         return self.token_manager.validate_token(token)
+
+    def check_token(self, token: str) -> ValidationResult:
+        return self.token_manager.check_token(token)
+
+    def validate_tokens(
+            self,
+            tokens: Iterable[str],
+            max_workers: Optional[int] = None,
+            executor: Optional[Executor] = None,
+    ) -> List[dict]:
+        return self.token_manager.validate_tokens(
+            tokens, max_workers=max_workers, executor=executor
+        )
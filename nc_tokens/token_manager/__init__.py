@@ -1,4 +1,40 @@
 from .token_management import TokenManager, KeyLoader
 from .token_encoder_decoder import JWTDecoder, JWTEncoder
+from .token_cache import VerifiedTokenCache
+from .async_token_management import AsyncTokenManager
+from .keyring import KeyRing, KeyRefresher
+from .token_validator import TokenValidator
+from .precheck import TokenPrecheck
+from .serializers import JSONSerializer, get_serializer
+from .algorithms import SigningAlgorithm, Signer, Verifier, get_algorithm
+from .issuer import ParallelTokenIssuer
+from .streaming import read_tokens, validate_stream
+from .claims import (
+    ClaimsPolicy, ClaimsChecker, TokenTypeRule, SystemClock, ManualClock
+)
+from .revocation import (
+    RevocationList, RevocationRefresher, RevocationSource,
+    FileRevocationSource, S3RevocationSource, BloomFilter
+)
+from .service_tokens import ServiceTokenProvider
+from .results import (
+    Reason, ValidationResult, TokenError, MalformedTokenError,
+    RejectedTokenError, InvalidSignatureError, ExpiredTokenError
+)
+from .observers import (
+    TokenObserver, MetricsObserver, PrometheusObserver, OpenTelemetryObserver
+)
 
-__all__ = ['TokenManager', 'JWTEncoder', 'JWTDecoder', 'KeyLoader']
+__all__ = ['TokenManager', 'JWTEncoder', 'JWTDecoder', 'KeyLoader',
+           'VerifiedTokenCache', 'AsyncTokenManager', 'KeyRing',
+           'KeyRefresher', 'TokenValidator', 'TokenPrecheck',
+           'JSONSerializer', 'get_serializer',
+           'SigningAlgorithm', 'get_algorithm', 'ParallelTokenIssuer',
+           'TokenObserver', 'MetricsObserver', 'PrometheusObserver',
+           'OpenTelemetryObserver', 'read_tokens', 'validate_stream',
+           'Reason', 'ValidationResult', 'TokenError', 'MalformedTokenError',
+           'RejectedTokenError', 'InvalidSignatureError', 'ExpiredTokenError',
+           'ClaimsPolicy', 'ClaimsChecker', 'TokenTypeRule', 'SystemClock',
+           'ManualClock', 'RevocationList', 'RevocationRefresher',
+           'RevocationSource', 'FileRevocationSource', 'S3RevocationSource',
+           'BloomFilter', 'ServiceTokenProvider', 'Signer', 'Verifier']
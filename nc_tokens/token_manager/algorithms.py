@@ -0,0 +1,192 @@
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, padding, rsa
+from cryptography.hazmat.primitives.asymmetric.utils import (
+    decode_dss_signature, encode_dss_signature
+)
+from typing import Dict, Optional
+
+from ..rsa_token_lib import key_id
+
+
+class SigningAlgorithm:
+    """JWS signing algorithm."""
+    name: str = ''
+    private_key_type: type = object
+    public_key_type: type = object
+
+    def accepts(self, key) -> bool:
+        """
+        Whether the key can be used with this algorithm.
+        :param key: private or public key
+        :return: True if the key type matches
+        """
+        return isinstance(key, (self.private_key_type, self.public_key_type))
+
+    def sign(self, private_key, data: bytes) -> bytes:
+        """
+        Sign data.
+        :param private_key: private key
+        :param data: signing input
+        :return: raw JWS signature
+        """
+        raise NotImplementedError
+
+    def verify(self, public_key, signature: bytes, data: bytes):
+        """
+        Verify a signature, raises InvalidSignature when it doesn't match.
+        :param public_key: public key
+        :param signature: raw JWS signature
+        :param data: signing input
+        """
+        raise NotImplementedError
+
+
+class RS256(SigningAlgorithm):
+    """RSASSA-PKCS1-v1_5 with SHA-256."""
+    name = 'RS256'
+    private_key_type = rsa.RSAPrivateKey
+    public_key_type = rsa.RSAPublicKey
+
+    def __init__(self):
+        self._padding = padding.PKCS1v15()
+        self._hash = hashes.SHA256()
+
+    def sign(self, private_key, data: bytes) -> bytes:
+        return private_key.sign(data, self._padding, self._hash)
+
+    def verify(self, public_key, signature: bytes, data: bytes):
+        public_key.verify(signature, data, self._padding, self._hash)
+
+
+class ES256(SigningAlgorithm):
+    """ECDSA on P-256 with SHA-256, signatures in the JWS r || s form."""
+    name = 'ES256'
+    private_key_type = ec.EllipticCurvePrivateKey
+    public_key_type = ec.EllipticCurvePublicKey
+    _size = 32
+
+    def __init__(self):
+        self._ecdsa = ec.ECDSA(hashes.SHA256())
+
+    def accepts(self, key) -> bool:
+        return super().accepts(key) and isinstance(key.curve, ec.SECP256R1)
+
+    def sign(self, private_key, data: bytes) -> bytes:
+        r, s = decode_dss_signature(private_key.sign(data, self._ecdsa))
+        return r.to_bytes(self._size, 'big') + s.to_bytes(self._size, 'big')
+
+    def verify(self, public_key, signature: bytes, data: bytes):
+        if len(signature) != 2 * self._size:
+            raise ValueError("Invalid signature length")
+        r = int.from_bytes(signature[:self._size], 'big')
+        s = int.from_bytes(signature[self._size:], 'big')
+        public_key.verify(encode_dss_signature(r, s), data, self._ecdsa)
+
+
+class EdDSA(SigningAlgorithm):
+    """Ed25519 signatures."""
+    name = 'EdDSA'
+    private_key_type = ed25519.Ed25519PrivateKey
+    public_key_type = ed25519.Ed25519PublicKey
+
+    def sign(self, private_key, data: bytes) -> bytes:
+        return private_key.sign(data)
+
+    def verify(self, public_key, signature: bytes, data: bytes):
+        public_key.verify(signature, data)
+
+
+ALGORITHMS: Dict[str, SigningAlgorithm] = {
+    algorithm.name: algorithm for algorithm in (RS256(), ES256(), EdDSA())
+}
+
+
+def get_algorithm(name: str) -> SigningAlgorithm:
+    """
+    Signing algorithm by JWS name.
+    :param name: 'RS256', 'ES256' or 'EdDSA'
+    :return: signing algorithm
+    """
+    try:
+        return ALGORITHMS[name]
+    except KeyError:
+        raise ValueError(f"Unsupported algorithm: {name}")
+
+
+def algorithm_for_key(key) -> SigningAlgorithm:
+    """
+    Signing algorithm matching the type of a key.
+    :param key: private or public key
+    :return: signing algorithm
+    """
+    for algorithm in ALGORITHMS.values():
+        if algorithm.accepts(key):
+            return algorithm
+    raise ValueError(f"Unsupported key type: {type(key).__name__}")
+
+
+class Signer:
+    """
+    Private key bound to its algorithm, with the key id computed on first
+    use. JWTEncoder accepts it in place of a private key and skips the
+    per-key lookups.
+    """
+    __slots__ = ('private_key', 'algorithm', 'key_size', '_kid')
+
+    def __init__(self, private_key,
+                 algorithm: Optional[SigningAlgorithm] = None):
+        self.private_key = private_key
+        self.algorithm = algorithm or algorithm_for_key(private_key)
+        if not self.algorithm.accepts(private_key):
+            raise ValueError(
+                f"The key can't be used with {self.algorithm.name}"
+            )
+        self.key_size = getattr(private_key, 'key_size', None)
+        self._kid = None
+
+    @property
+    def kid(self) -> str:
+        """Key id of the public key, see nc_tokens.rsa_token_lib.key_id."""
+        if self._kid is None:
+            self._kid = key_id(self.private_key.public_key())
+        return self._kid
+
+    def sign(self, data: bytes) -> bytes:
+        """
+        Sign data.
+        :param data: signing input
+        :return: raw JWS signature
+        """
+        return self.algorithm.sign(self.private_key, data)
+
+
+class Verifier:
+    """
+    Public key bound to its algorithm. JWTDecoder accepts it, or a mapping
+    from kid to verifiers, in place of public keys and compares the header
+    alg with a string instead of checking the key type per token.
+    """
+    __slots__ = ('public_key', 'algorithm', 'key_size')
+
+    def __init__(self, public_key,
+                 algorithm: Optional[SigningAlgorithm] = None):
+        self.public_key = public_key
+        self.algorithm = algorithm or algorithm_for_key(public_key)
+        if not self.algorithm.accepts(public_key):
+            raise ValueError(
+                f"The key can't be used with {self.algorithm.name}"
+            )
+        self.key_size = getattr(public_key, 'key_size', None)
+
+    def verify(self, signature: bytes, data: bytes) -> bool:
+        """
+        Verify a signature.
+        :param signature: raw JWS signature
+        :param data: signing input
+        :return: True if the signature matches
+        """
+        try:
+            self.algorithm.verify(self.public_key, signature, data)
+        except Exception:
+            return False
+        return True
@@ -0,0 +1,117 @@
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any, Callable, Optional
+import asyncio
+
+from .token_encoder_decoder import JWTEncoder, JWTDecoder
+from .token_management import TokenManager
+from .token_cache import VerifiedTokenCache
+from ..rsa_token_lib import KeyLoader, SpacesConfig, SpacesKeyLoader
+
+
+class AsyncTokenManager:
+    """
+    Asyncio token management class. Key loading, signing and verification
+    run on an executor so the event loop never blocks on network or RSA.
+    """
+    def __init__(
+            self,
+            token_manager: TokenManager,
+            executor: Optional[Executor] = None,
+    ):
+        self.token_manager = token_manager
+        self.executor = executor
+
+    @classmethod
+    async def create(
+            cls,
+            key_management: KeyLoader,
+            encoder: JWTEncoder,
+            decoder: JWTDecoder,
+            token_cache: Optional[VerifiedTokenCache] = None,
+            executor: Optional[Executor] = None,
+    ) -> 'AsyncTokenManager':
+        """
+        Creates the manager loading the keys on the executor.
+        :param key_management: key loader
+        :param encoder: token encoder
+        :param decoder: token decoder
+        :param token_cache: optional cache of verified tokens
+        :param executor: executor for blocking work, None uses the loop
+        default executor
+        :return: async token manager with the keys loaded
+        """
+        token_manager = await cls._run_in_executor(
+            executor,
+            partial(TokenManager, key_management, encoder, decoder,
+                    token_cache=token_cache)
+        )
+        return cls(token_manager, executor=executor)
+
+    @classmethod
+    async def from_spaces_config(
+            cls,
+            configuration: SpacesConfig,
+            token_cache: Optional[VerifiedTokenCache] = None,
+            executor: Optional[Executor] = None,
+    ) -> 'AsyncTokenManager':
+        """
+        Creates the manager with a SpacesKeyLoader, the bucket validation
+        and key download run on the executor.
+        :param configuration: spaces configuration
+        :param token_cache: optional cache of verified tokens
+        :param executor: executor for blocking work
+        :return: async token manager with the keys loaded
+        """
+        key_management = await cls._run_in_executor(
+            executor, partial(SpacesKeyLoader, configuration)
+        )
+        return await cls.create(key_management, JWTEncoder(), JWTDecoder(),
+                                token_cache=token_cache, executor=executor)
+
+    @staticmethod
+    async def _run_in_executor(
+            executor: Optional[Executor],
+            function: Callable[[], Any]
+    ) -> Any:
+        """
+        Run a blocking function on the executor.
+        :param executor: executor or None for the loop default executor
+        :param function: function without arguments
+        :return: result of the function
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, function)
+
+    async def _run(self, function: Callable, *args) -> Any:
+        return await self._run_in_executor(self.executor,
+                                           partial(function, *args))
+
+    async def load_keys(self):
+        """Loads again the private and public keys."""
+        await self._run(self.token_manager._load_keys)
+
+    async def create_user_token(self, payload: dict) -> Optional[str]:
+        """
+        Creates a new user token, see TokenManager.create_user_token
+        :param payload: user payload
+        :return: encoded token
+        """
+        return await self._run(self.token_manager.create_user_token, payload)
+
+    async def create_service_token(self, payload: dict) -> str:
+        """
+        Creates a new service token, see TokenManager.create_service_token
+        :param payload: service payload
+        :return: encoded token
+        """
+        return await self._run(self.token_manager.create_service_token,
+                               payload)
+
+    async def validate_token(self, token: str) -> dict:
+        """
+        Validates the given token, see TokenManager.validate_token
+        :param token: token to validate
+        :return: decoded payload or dictionary with the error
+        """
+        return await self._run(self.token_manager.validate_token, token)
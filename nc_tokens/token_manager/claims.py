@@ -0,0 +1,203 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Collection, Dict, FrozenSet, Optional, Tuple
+import time
+
+from .results import Reason
+
+
+def _utc_timestamp() -> float:
+    # same reference as the exp check has always used
+    return datetime.utcnow().timestamp()
+
+
+class SystemClock:
+    """
+    Wall clock in milliseconds, read once every resync_interval seconds and
+    advanced with time.monotonic in between. Reading it costs a monotonic
+    call, and jumps of the wall clock are picked up on the next resync.
+    """
+    def __init__(self, resync_interval: float = 60.0, wall_clock=None):
+        self.resync_interval = resync_interval
+        self._wall_clock = wall_clock or _utc_timestamp
+        self._sync(time.monotonic())
+
+    def _sync(self, monotonic: float):
+        self._offset_ms = self._wall_clock() * 1000 - monotonic * 1000
+        self._next_sync = monotonic + self.resync_interval
+
+    def now_ms(self) -> int:
+        """
+        Current time.
+        :return: milliseconds since the epoch
+        """
+        monotonic = time.monotonic()
+        if monotonic >= self._next_sync:
+            self._sync(monotonic)
+        return int(monotonic * 1000 + self._offset_ms)
+
+
+class ManualClock:
+    """Clock that only moves when told to, for tests."""
+    def __init__(self, now_ms: int):
+        self._now_ms = now_ms
+
+    def now_ms(self) -> int:
+        return self._now_ms
+
+    def advance(self, milliseconds: int):
+        """
+        Move the clock forward.
+        :param milliseconds: milliseconds to add
+        """
+        self._now_ms += milliseconds
+
+
+_default_clock: Optional[SystemClock] = None
+
+
+def default_clock() -> SystemClock:
+    """
+    Shared SystemClock.
+    :return: clock
+    """
+    global _default_clock
+    if _default_clock is None:
+        _default_clock = SystemClock()
+    return _default_clock
+
+
+@dataclass
+class TokenTypeRule:
+    """
+    Extra claims rules for one token_type, added to those of the policy.
+    """
+    required_claims: Tuple[str, ...] = ()
+    audiences: Optional[Collection[str]] = None
+    issuers: Optional[Collection[str]] = None
+
+
+@dataclass
+class ClaimsPolicy:
+    """
+    Declarative claims validation, compiled once into a ClaimsChecker.
+
+    exp, nbf and iat are timestamps in milliseconds, like the exp claim
+    created by this library. A time claim that is checked and isn't a
+    number is rejected as Reason.INVALID_TIME_CLAIM; with verify_nbf or
+    verify_iat False that claim is not checked and may hold anything.
+    leeway, in seconds, tolerates clock skew.
+    aud may be a string or a list, one of its values must be in audiences.
+    With token_types, the token_type claim must be one of its keys and the
+    rule of that type applies on top of the policy.
+    """
+    required_claims: Tuple[str, ...] = ("exp",)
+    audiences: Optional[Collection[str]] = None
+    issuers: Optional[Collection[str]] = None
+    leeway: float = 0.0
+    verify_nbf: bool = True
+    verify_iat: bool = True
+    token_types: Optional[Dict[str, TokenTypeRule]] = field(default=None)
+
+    def compile(self, clock=None) -> 'ClaimsChecker':
+        """
+        Fast checker for the policy.
+        :param clock: object with now_ms(), the shared SystemClock if None
+        :return: claims checker
+        """
+        return ClaimsChecker(self, clock or default_clock())
+
+
+# bool is an int subclass but not a timestamp
+_TIME_TYPES = (int, float)
+
+
+def _frozen(values: Optional[Collection[str]]) -> Optional[FrozenSet[str]]:
+    return None if values is None else frozenset(values)
+
+
+class _Rules:
+    """Required claims, audiences and issuers as sets."""
+    __slots__ = ('required_claims', 'audiences', 'issuers')
+
+    def __init__(self, required_claims, audiences, issuers):
+        self.required_claims = tuple(required_claims)
+        self.audiences = _frozen(audiences)
+        self.issuers = _frozen(issuers)
+
+    def check(self, payload: Dict) -> Optional[Reason]:
+        for claim in self.required_claims:
+            if claim not in payload:
+                return Reason.MISSING_CLAIM
+        audiences = self.audiences
+        if audiences is not None:
+            audience = payload.get('aud')
+            if isinstance(audience, str):
+                if audience not in audiences:
+                    return Reason.INVALID_AUDIENCE
+            elif (not isinstance(audience, list)
+                  or audiences.isdisjoint(audience)):
+                return Reason.INVALID_AUDIENCE
+        if self.issuers is not None and payload.get('iss') not in self.issuers:
+            return Reason.INVALID_ISSUER
+        return None
+
+
+class ClaimsChecker:
+    """Compiled ClaimsPolicy, see ClaimsPolicy.compile."""
+    def __init__(self, policy: ClaimsPolicy, clock):
+        self.policy = policy
+        self.clock = clock
+        self._leeway_ms = int(policy.leeway * 1000)
+        self._verify_nbf = policy.verify_nbf
+        self._verify_iat = policy.verify_iat
+        self._rules = _Rules(policy.required_claims, policy.audiences,
+                             policy.issuers)
+        self._token_types = None
+        if policy.token_types is not None:
+            self._token_types = {
+                token_type: _Rules(rule.required_claims, rule.audiences,
+                                   rule.issuers)
+                for token_type, rule in policy.token_types.items()
+            }
+
+    def check(self, payload: Dict) -> Optional[Reason]:
+        """
+        Check the claims of a decoded payload.
+        :param payload: decoded payload
+        :return: reason of the rejection, None if the claims are valid
+        """
+        reason = self._rules.check(payload)
+        if reason is not None:
+            return reason
+        if self._token_types is not None:
+            rules = self._token_types.get(payload.get('token_type'))
+            if rules is None:
+                return Reason.INVALID_TOKEN_TYPE
+            reason = rules.check(payload)
+            if reason is not None:
+                return reason
+
+        now = self.clock.now_ms()
+        leeway = self._leeway_ms
+        exp = payload.get('exp')
+        if exp is not None:
+            if type(exp) not in _TIME_TYPES:
+                return Reason.INVALID_TIME_CLAIM
+            if now - leeway >= exp:
+                return Reason.EXPIRED
+        if self._verify_nbf:
+            nbf = payload.get('nbf')
+            if nbf is not None:
+                if type(nbf) not in _TIME_TYPES:
+                    return Reason.INVALID_TIME_CLAIM
+                if now + leeway < nbf:
+                    return Reason.NOT_YET_VALID
+        if self._verify_iat:
+            iat = payload.get('iat')
+            if iat is not None:
+                if type(iat) not in _TIME_TYPES:
+                    return Reason.INVALID_TIME_CLAIM
+                if now + leeway < iat:
+                    return Reason.ISSUED_IN_FUTURE
+        return None
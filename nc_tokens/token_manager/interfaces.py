@@ -1,20 +1,34 @@
 from abc import ABC, abstractmethod
-from typing import Dict
+from typing import Dict, Mapping, Optional, Union
 from cryptography.hazmat.primitives.asymmetric import rsa
 
+from .algorithms import Signer, Verifier
+
 
 class TokenEncoder(ABC):
     @abstractmethod
     def encode(self,
                payload: Dict,
-               private_key: rsa.RSAPrivateKey,
+               private_key: Union[rsa.RSAPrivateKey, Signer],
                token_type: str) -> str:
-        """Encodes payload using private key."""
+        """
+        Encodes payload using private key. TokenManager passes a Signer to
+        JWTEncoder and the private key to other encoders.
+        """
         raise NotImplementedError
 
 
 class TokenDecoder(ABC):
     @abstractmethod
-    def decode(self, token: str, public_key: rsa.RSAPublicKey) -> Dict:
-        """Decodes payload using public key."""
+    def decode(
+            self,
+            token: str,
+            public_key: Union[rsa.RSAPublicKey, Verifier,
+                              Mapping[Optional[str], rsa.RSAPublicKey]]
+    ) -> Dict:
+        """
+        Decodes payload using public key, or a mapping from kid to public
+        key after a rotation. TokenManager passes Verifiers to JWTDecoder and
+        the public keys to other decoders.
+        """
         raise NotImplementedError
@@ -0,0 +1,135 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+import os
+
+from .parallel import ordered_map
+from .token_encoder_decoder import JWTEncoder
+from ..rsa_token_lib import KeyLoader
+from ..rsa_token_lib.forking import register_after_fork
+
+_worker_encoder: Optional[JWTEncoder] = None
+_worker_private_key = None
+
+
+def _load_issuer_worker(key_loader: KeyLoader,
+                        encoder_factory: Callable[[], JWTEncoder]):
+    """
+    Process pool initializer, loads the private key and builds the encoder
+    once per worker.
+    :param key_loader: key loader, only load_private_key is called
+    :param encoder_factory: callable returning the encoder of the worker
+    """
+    global _worker_encoder, _worker_private_key
+    _worker_private_key = key_loader.load_private_key()
+    _worker_encoder = encoder_factory()
+
+
+def _issue_token(payload: Dict, token_type: str) -> str:
+    """
+    Encode a payload with the key and encoder of the worker.
+    :param payload: payload of the token
+    :param token_type: 'service' or 'user'
+    :return: encoded token
+    """
+    return _worker_encoder.encode(payload, _worker_private_key,
+                                  token_type=token_type)
+
+
+class ParallelTokenIssuer:
+    """
+    Issues tokens on a process pool it owns, for throughput on many cores.
+
+    Every worker loads the private key once through the key loader and keeps
+    it, so the key never leaves the loader and is not sent with requests.
+    Payloads are sent in chunks and only payloads and token strings cross
+    the process boundary. The key loader and the encoder factory must be
+    picklable, for example a module level class or a functools.partial.
+
+    The workers belong to the process that created the issuer, a forked
+    child starts its own pool on first use.
+    """
+    def __init__(
+            self,
+            key_loader: KeyLoader,
+            max_workers: Optional[int] = None,
+            chunk_size: int = 256,
+            encoder_factory: Callable[[], JWTEncoder] = JWTEncoder,
+    ):
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._initargs = (key_loader, encoder_factory)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        register_after_fork(self)
+
+    def _after_fork(self):
+        self._executor = None
+
+    @property
+    def _pool(self) -> ProcessPoolExecutor:
+        """Process pool of the issuer, created again in forked children."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_load_issuer_worker,
+                initargs=self._initargs
+            )
+        return self._executor
+
+    def __enter__(self) -> 'ParallelTokenIssuer':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Shut down the worker processes.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _issue(self, payloads: Iterable[Dict],
+               token_type: str) -> Iterator[str]:
+        """
+        Encode payloads on the workers.
+        :param payloads: iterable of payloads
+        :param token_type: 'service' or 'user'
+        :return: iterator of tokens in the same order as the payloads
+        """
+        return ordered_map(partial(_issue_token, token_type=token_type),
+                           payloads, self._pool, chunk_size=self.chunk_size,
+                           window=self.max_workers * 2)
+
+    def create_user_token(self, payload: Dict) -> str:
+        """
+        Creates a user token on a worker.
+        :param payload: payload like TokenManager.create_user_token
+        :return: encoded token
+        """
+        return self._pool.submit(_issue_token, payload, "user").result()
+
+    def create_service_token(self, payload: Dict) -> str:
+        """
+        Creates a service token on a worker.
+        :param payload: payload like TokenManager.create_service_token
+        :return: encoded token
+        """
+        return self._pool.submit(_issue_token, payload, "service").result()
+
+    def create_user_tokens(self, payloads: Iterable[Dict]) -> List[str]:
+        """
+        Creates many user tokens on the workers.
+        :param payloads: iterable of payloads
+        :return: list of encoded tokens in the same order as the payloads
+        """
+        return list(self._issue(payloads, "user"))
+
+    def create_service_tokens(self, payloads: Iterable[Dict]) -> List[str]:
+        """
+        Creates many service tokens on the workers.
+        :param payloads: iterable of payloads
+        :return: list of encoded tokens in the same order as the payloads
+        """
+        return list(self._issue(payloads, "service"))
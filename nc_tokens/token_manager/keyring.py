@@ -0,0 +1,276 @@
+from collections.abc import Mapping
+from typing import Any, Dict, NamedTuple, Optional
+import logging
+import threading
+
+from .algorithms import Signer, Verifier
+from ..rsa_token_lib import KeyLoader, key_id
+from ..rsa_token_lib.forking import register_after_fork
+
+logger = logging.getLogger(__name__)
+
+
+class _KeyRingState(NamedTuple):
+    private_key: Any
+    public_key: Any
+    kid: Optional[str]
+    previous_keys: Dict[str, Any]
+    verification_key: Any
+    signer: Optional[Signer]
+    generation: int
+
+
+class KeyRing:
+    """
+    Current key pair plus the public keys it replaced, indexed by kid.
+
+    The whole state is an immutable snapshot replaced with a single
+    attribute assignment, so readers never take a lock. Keys are wrapped
+    once per rotation in the Signer and Verifiers handed to the encoder and
+    the decoder. A public key that is a mapping from kid to public key, as
+    loaded by JwksKeyLoader, is handed to the decoder as is.
+
+    generation is incremented whenever a public key stops being accepted,
+    including kids removed from a key set with a generation such as
+    JwksKeySet, so caches of verified tokens can tell which entries are
+    still valid.
+    """
+    def __init__(self, max_previous_keys: int = 2):
+        self.max_previous_keys = max_previous_keys
+        self._state = _KeyRingState(None, None, None, {}, None, None, 0)
+        self._lock = threading.Lock()
+        register_after_fork(self)
+
+    def _after_fork(self):
+        # the snapshot is kept, a parent thread may have held the lock
+        self._lock = threading.Lock()
+
+    @property
+    def private_key(self):
+        return self._state.private_key
+
+    @property
+    def public_key(self):
+        return self._state.public_key
+
+    @property
+    def kid(self) -> Optional[str]:
+        """Key id of the current public key, None until first rotation."""
+        return self._state.kid
+
+    @property
+    def previous_keys(self) -> Dict[str, Any]:
+        return self._state.previous_keys
+
+    @property
+    def public_keys(self):
+        """
+        verification_key with the raw public keys, for decoders other than
+        JWTDecoder: the public key when there is only one, otherwise a
+        mapping from kid to public key where None maps to the current key.
+        """
+        state = self._state
+        if not state.previous_keys or isinstance(state.public_key, Mapping):
+            return state.public_key
+        keys = dict(state.previous_keys)
+        keys[state.kid] = state.public_key
+        keys[None] = state.public_key
+        return keys
+
+    @property
+    def generation(self) -> int:
+        """
+        Number of rotations that dropped a public key, plus the generation
+        of the key set when the public key is one.
+        """
+        state = self._state
+        return state.generation + self._key_set_generation(state.public_key)
+
+    @property
+    def verification_key(self):
+        """
+        Key for JWTDecoder.decode: the Verifier of the public key when there
+        is only one, otherwise a mapping from kid to Verifier where None
+        maps to the current key for tokens without kid.
+        """
+        return self._state.verification_key
+
+    @property
+    def signer(self) -> Optional[Signer]:
+        """Signer of the private key, for JWTEncoder.encode."""
+        return self._state.signer
+
+    @staticmethod
+    def _verification_key(public_key, kid: Optional[str],
+                          previous_keys: Dict[str, Any]):
+        if public_key is None or isinstance(public_key, Mapping):
+            return public_key
+        verifier = Verifier(public_key)
+        if not previous_keys:
+            return verifier
+        keys = {previous_kid: Verifier(key)
+                for previous_kid, key in previous_keys.items()}
+        keys[kid] = verifier
+        keys[None] = verifier
+        return keys
+
+    @staticmethod
+    def _key_set_generation(public_key) -> int:
+        if not isinstance(public_key, Mapping):
+            return 0
+        return getattr(public_key, 'generation', 0)
+
+    @staticmethod
+    def _signer(private_key) -> Optional[Signer]:
+        return None if private_key is None else Signer(private_key)
+
+    def rotate(self, private_key, public_key) -> bool:
+        """
+        Make the key pair the current one. The replaced public key keeps
+        validating tokens until max_previous_keys newer keys are rotated in.
+        :param private_key: new private key
+        :param public_key: new public key
+        :return: True if the public key changed
+        """
+        with self._lock:
+            state = self._state
+            if state.public_key is None:
+                self._state = _KeyRingState(
+                    private_key, public_key, None, {},
+                    self._verification_key(public_key, None, {}),
+                    self._signer(private_key), state.generation
+                )
+                return True
+
+            if isinstance(public_key, Mapping):
+                # a key set resolves kids and rotations itself
+                changed = public_key is not state.public_key
+                generation = state.generation
+                if changed:
+                    # fold in the replaced key set, the sum never decreases
+                    generation += 1 + self._key_set_generation(
+                        state.public_key
+                    )
+                self._state = _KeyRingState(
+                    private_key, public_key, None, {}, public_key,
+                    self._signer(private_key), generation
+                )
+                return changed
+
+            current_kid = state.kid or key_id(state.public_key)
+            new_kid = key_id(public_key)
+            if new_kid == current_kid:
+                if private_key is not state.private_key:
+                    state = state._replace(private_key=private_key,
+                                           signer=self._signer(private_key))
+                self._state = state._replace(kid=current_kid)
+                return False
+
+            previous_keys = {current_kid: state.public_key}
+            previous_keys.update(
+                (kid, key) for kid, key in state.previous_keys.items()
+                if kid != new_kid
+            )
+            previous_keys = dict(
+                list(previous_keys.items())[:self.max_previous_keys]
+            )
+            dropped = not (set(state.previous_keys) | {current_kid}) <= (
+                set(previous_keys) | {new_kid}
+            )
+            self._state = _KeyRingState(
+                private_key, public_key, new_kid, previous_keys,
+                self._verification_key(public_key, new_kid, previous_keys),
+                self._signer(private_key), state.generation + dropped
+            )
+            return True
+
+    def set_private_key(self, private_key):
+        """
+        Set the private key without rotating, used by lazy loading.
+        :param private_key: private key
+        """
+        with self._lock:
+            self._state = self._state._replace(
+                private_key=private_key, signer=self._signer(private_key)
+            )
+
+    def set_public_key(self, public_key):
+        """
+        Set the public key without rotating, used by lazy loading.
+        :param public_key: public key
+        """
+        with self._lock:
+            state = self._state
+            self._state = state._replace(
+                public_key=public_key,
+                verification_key=self._verification_key(
+                    public_key, state.kid, state.previous_keys
+                )
+            )
+
+
+class KeyRefresher:
+    """
+    Background thread polling a KeyLoader and rotating a KeyRing. A
+    refresher running when the process forks is started again in the child.
+    """
+    def __init__(self, key_management: KeyLoader, keyring: KeyRing,
+                 interval: float):
+        self.key_management = key_management
+        self.keyring = keyring
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        register_after_fork(self)
+
+    def _after_fork(self):
+        running = self._thread is not None and not self._stop.is_set()
+        self._stop = threading.Event()
+        self._thread = None
+        if running:
+            self.start()
+
+    def start(self):
+        """Start polling in a daemon thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='nc-tokens-key-refresher',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Stop polling.
+        :param timeout: seconds to wait for the thread to finish
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def refresh(self) -> bool:
+        """
+        Load the keys once and rotate them into the keyring.
+        :return: True if the public key changed
+        """
+        previous_size = getattr(self.keyring.public_key, 'key_size', None)
+        private_key, public_key = self.key_management.load_keys()
+        rotated = self.keyring.rotate(private_key, public_key)
+        key_size = getattr(public_key, 'key_size', None)
+        if rotated and previous_size and key_size and key_size > previous_size:
+            # RSA signing cost grows about with the cube of the key size
+            logger.warning("Key size grew from %d to %d bits, signatures "
+                           "will cost more CPU, see benchmarks/key_sizes.py",
+                           previous_size, key_size)
+        return rotated
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if self.refresh():
+                    logger.info("Rotated to key %s", self.keyring.kid)
+            except Exception:
+                logger.exception("Failed to refresh the keys, keeping the "
+                                 "current ones")
@@ -0,0 +1,128 @@
+from typing import Dict
+import threading
+
+from ..rsa_token_lib.forking import register_after_fork
+
+# Timed stages: base64 and json decoding, signature verification, expiry
+# check, the whole precheck and the key downloads of SpacesKeyLoader
+STAGES = ('precheck', 'base64', 'json', 'signature', 'expiry', 'key_fetch')
+# Outcomes of a validation. rejected covers tokens that are well formed but
+# not acceptable: algorithm not allowed or not matching the key, unknown kid
+# claims refused by the claims policy or revoked jti.
+OUTCOMES = ('ok', 'expired', 'bad_signature', 'malformed', 'rejected')
+
+
+class TokenObserver:
+    """
+    Receives stage timings and validation outcomes. Every method is a no-op,
+    subclasses override what they need. Without an observer the decoder
+    takes its uninstrumented path and nothing is timed.
+    """
+    def on_stage(self, stage: str, seconds: float):
+        """
+        Called when a stage finishes, also when it fails.
+        :param stage: one of STAGES
+        :param seconds: duration of the stage
+        """
+
+    def on_outcome(self, outcome: str):
+        """
+        Called once per validated token.
+        :param outcome: one of OUTCOMES
+        """
+
+
+class MetricsObserver(TokenObserver):
+    """In-process counters and stage totals, safe to share between threads."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+        self.stage_counts = dict.fromkeys(STAGES, 0)
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+        register_after_fork(self)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def on_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self.stage_counts[stage] += 1
+            self.stage_seconds[stage] += seconds
+
+    def on_outcome(self, outcome: str):
+        with self._lock:
+            self.outcomes[outcome] += 1
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """
+        Copy of the metrics.
+        :return: dictionary with outcomes, stage_counts and stage_seconds
+        """
+        with self._lock:
+            return {
+                'outcomes': dict(self.outcomes),
+                'stage_counts': dict(self.stage_counts),
+                'stage_seconds': dict(self.stage_seconds),
+            }
+
+
+class PrometheusObserver(TokenObserver):
+    """
+    Exports a <namespace>_stage_seconds histogram labelled by stage and a
+    <namespace>_validations_total counter labelled by outcome.
+    prometheus_client is imported on construction.
+    """
+    def __init__(self, registry=None, namespace: str = 'nc_tokens'):
+        from prometheus_client import REGISTRY, Counter, Histogram
+
+        registry = registry or REGISTRY
+        self._stage_seconds = Histogram(
+            f'{namespace}_stage_seconds', 'Duration of token stages',
+            ['stage'], registry=registry,
+            buckets=(.00001, .000025, .00005, .0001, .00025, .0005, .001,
+                     .0025, .005, .01, .05, .25, 1.0)
+        )
+        self._validations = Counter(
+            f'{namespace}_validations', 'Validated tokens by outcome',
+            ['outcome'], registry=registry
+        )
+        self._stages = {stage: self._stage_seconds.labels(stage)
+                        for stage in STAGES}
+        self._outcomes = {outcome: self._validations.labels(outcome)
+                          for outcome in OUTCOMES}
+
+    def on_stage(self, stage: str, seconds: float):
+        self._stages[stage].observe(seconds)
+
+    def on_outcome(self, outcome: str):
+        self._outcomes[outcome].inc()
+
+
+class OpenTelemetryObserver(TokenObserver):
+    """
+    Records a <namespace>.stage.duration histogram with a stage attribute
+    and a <namespace>.validations counter with an outcome attribute on an
+    OpenTelemetry meter, the global one when None.
+    """
+    def __init__(self, meter=None, namespace: str = 'nc_tokens'):
+        if meter is None:
+            from opentelemetry import metrics
+
+            meter = metrics.get_meter('nc_tokens')
+        self._stage_duration = meter.create_histogram(
+            f'{namespace}.stage.duration', unit='s',
+            description='Duration of token stages'
+        )
+        self._validations = meter.create_counter(
+            f'{namespace}.validations',
+            description='Validated tokens by outcome'
+        )
+        self._stages = {stage: {'stage': stage} for stage in STAGES}
+        self._outcomes = {outcome: {'outcome': outcome}
+                          for outcome in OUTCOMES}
+
+    def on_stage(self, stage: str, seconds: float):
+        self._stage_duration.record(seconds, self._stages[stage])
+
+    def on_outcome(self, outcome: str):
+        self._validations.add(1, self._outcomes[outcome])
@@ -0,0 +1,147 @@
+from collections import deque
+from concurrent.futures import (
+    Executor, ProcessPoolExecutor, ThreadPoolExecutor
+)
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional, TypeVar
+import base64
+import os
+
+from .algorithms import algorithm_for_key
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def default_workers() -> int:
+    """
+    Default number of thread workers, same rule as ThreadPoolExecutor.
+    :return: number of workers
+    """
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+def _chunks(items: Iterable[T], chunk_size: int) -> Iterator[List[T]]:
+    """
+    Split an iterable in lists of chunk_size items.
+    :param items: iterable to split
+    :param chunk_size: items per chunk
+    :return: iterator of chunks
+    """
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _apply_chunk(function: Callable[[T], R], chunk: List[T]) -> List[R]:
+    """
+    Apply function to every item of the chunk.
+    :param function: function to apply
+    :param chunk: list of items
+    :return: list of results
+    """
+    return [function(item) for item in chunk]
+
+
+def ordered_map(
+        function: Callable[[T], R],
+        items: Iterable[T],
+        executor: Executor,
+        chunk_size: int = 64,
+        window: int = 16,
+) -> Iterator[R]:
+    """
+    Map function over items on the executor, yielding results in input
+    order. At most `window` chunks are in flight, so memory stays bounded
+    for arbitrarily large inputs.
+    :param function: function to apply to every item
+    :param items: iterable of items
+    :param executor: concurrent.futures executor
+    :param chunk_size: items sent to the executor per task
+    :param window: maximum number of chunks in flight
+    :return: iterator of results in input order
+    """
+    pending = deque()
+    for chunk in _chunks(items, chunk_size):
+        if len(pending) >= window:
+            yield from pending.popleft().result()
+        pending.append(executor.submit(_apply_chunk, function, chunk))
+    while pending:
+        yield from pending.popleft().result()
+
+
+def map_in_threads(
+        function: Callable[[T], R],
+        items: Iterable[T],
+        max_workers: Optional[int] = None,
+        executor: Optional[Executor] = None,
+        chunk_size: int = 64,
+) -> List[R]:
+    """
+    Map function over items on a thread pool, keeping the input order.
+    :param function: function to apply to every item
+    :param items: iterable of items
+    :param max_workers: number of threads of the pool created for the call,
+    ignored when executor is given
+    :param executor: existing concurrent.futures executor to use
+    :param chunk_size: items sent to the pool per task
+    :return: list of results in input order
+    """
+    if executor is not None:
+        return list(ordered_map(function, items, executor,
+                                chunk_size=chunk_size))
+    max_workers = max_workers or default_workers()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(ordered_map(function, items, pool,
+                                chunk_size=chunk_size,
+                                window=max_workers * 2))
+
+
+_worker_private_key: Optional[rsa.RSAPrivateKey] = None
+
+
+def _load_worker_private_key(private_key_der: bytes):
+    """
+    Process pool initializer, parses the private key once per worker.
+    :param private_key_der: private key in DER PKCS8 format
+    """
+    global _worker_private_key
+    _worker_private_key = serialization.load_der_private_key(
+        private_key_der, password=None
+    )
+
+
+def sign_with_worker_key(signature_input: bytes) -> bytes:
+    """
+    Sign with the private key loaded by the process pool initializer.
+    :param signature_input: in bytes of data
+    :return: base64url encoded signature
+    """
+    signature = algorithm_for_key(_worker_private_key).sign(
+        _worker_private_key, signature_input
+    )
+    return base64.urlsafe_b64encode(signature).rstrip(b'=')
+
+
+class SigningProcessPool(ProcessPoolExecutor):
+    """Process pool whose workers keep a parsed copy of the private key."""
+    def __init__(
+            self,
+            private_key: rsa.RSAPrivateKey,
+            max_workers: Optional[int] = None,
+    ):
+        private_key_der = private_key.private_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        )
+        super().__init__(
+            max_workers=max_workers,
+            initializer=_load_worker_private_key,
+            initargs=(private_key_der,)
+        )
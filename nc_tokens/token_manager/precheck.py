@@ -0,0 +1,21 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+
+@dataclass
+class TokenPrecheck:
+    """
+    Cheap checks JWTDecoder runs before the RSA signature verification, so
+    malformed, stale or foreign tokens never cost a public key operation.
+    allowed_algorithms defaults to the allowlist of the decoder. With
+    reject_expired the claims policy of the decoder, or the expiration
+    without one, is checked too.
+    """
+    max_token_length: int = 8192
+    max_header_length: int = 512
+    allowed_algorithms: Optional[Tuple[str, ...]] = None
+    reject_expired: bool = True
+
+
+PRECHECK_STAGES = ('length', 'segments', 'header', 'algorithm', 'payload',
+                   'expired', 'claims')
@@ -0,0 +1,149 @@
+from enum import Enum
+from typing import Dict, Optional
+
+
+class Reason(Enum):
+    """Why a token was rejected, with its message and observer outcome."""
+    MALFORMED = ("Invalid token format", 'malformed')
+    TOKEN_TOO_LONG = ("Token is too long", 'malformed')
+    HEADER_TOO_LONG = ("Header is too long", 'malformed')
+    INVALID_HEADER = ("Invalid header format", 'malformed')
+    INVALID_PAYLOAD = ("Invalid payload format", 'malformed')
+    MISSING_EXPIRATION = ("Token has no expiration", 'malformed')
+    ALGORITHM_NOT_ALLOWED = ("Algorithm not allowed", 'rejected')
+    ALGORITHM_MISMATCH = ("Algorithm does not match the key", 'rejected')
+    UNKNOWN_KEY_ID = ("Unknown key id", 'rejected')
+    INVALID_SIGNATURE = ("Invalid signature", 'bad_signature')
+    EXPIRED = ("Token has expired", 'expired')
+    MISSING_CLAIM = ("Token is missing a required claim", 'rejected')
+    INVALID_AUDIENCE = ("Invalid audience", 'rejected')
+    INVALID_ISSUER = ("Invalid issuer", 'rejected')
+    INVALID_TOKEN_TYPE = ("Invalid token type", 'rejected')
+    NOT_YET_VALID = ("Token is not yet valid", 'rejected')
+    ISSUED_IN_FUTURE = ("Token was issued in the future", 'rejected')
+    INVALID_TIME_CLAIM = ("Invalid time claim", 'malformed')
+    REVOKED = ("Token has been revoked", 'rejected')
+
+    def __init__(self, message: str, outcome: str):
+        self.message = message
+        self.outcome = outcome
+
+
+class TokenError(ValueError):
+    """
+    Invalid token. A ValueError, so existing handlers keep working, whose
+    message is only formatted when str() is called.
+    """
+    def __init__(self, reason: Reason, detail: Optional[str] = None):
+        super().__init__(reason, detail)
+        self.reason = reason
+        self.detail = detail
+
+    def __str__(self) -> str:
+        return f"Invalid token: {self.detail or self.reason.message}"
+
+
+class MalformedTokenError(TokenError):
+    """The token can't be parsed or misses required parts."""
+
+
+class RejectedTokenError(TokenError):
+    """
+    The algorithm, key id or claims of the token are not accepted, or the
+    token was revoked.
+    """
+
+
+class InvalidSignatureError(TokenError):
+    """The signature doesn't match."""
+
+
+class ExpiredTokenError(TokenError):
+    """The token has expired."""
+
+
+_ERRORS = {
+    'malformed': MalformedTokenError,
+    'rejected': RejectedTokenError,
+    'bad_signature': InvalidSignatureError,
+    'expired': ExpiredTokenError,
+}
+
+
+def token_error(reason: Reason, detail: Optional[str] = None) -> TokenError:
+    """
+    Exception of the class matching the reason.
+    :param reason: reason of the rejection
+    :param detail: message replacing the one of the reason
+    :return: exception, not raised
+    """
+    return _ERRORS[reason.outcome](reason, detail)
+
+
+class ValidationResult:
+    """
+    Outcome of a validation: the payload, or the reason of the rejection.
+    Failures without detail are shared instances, so rejecting a token
+    allocates nothing and formats no message until error is read.
+    """
+    __slots__ = ('payload', 'reason', 'detail')
+
+    def __init__(self, payload: Optional[Dict] = None,
+                 reason: Optional[Reason] = None,
+                 detail: Optional[str] = None):
+        self.payload = payload
+        self.reason = reason
+        self.detail = detail
+
+    @classmethod
+    def failure(cls, reason: Reason,
+                detail: Optional[str] = None) -> 'ValidationResult':
+        """
+        Result of a rejected token.
+        :param reason: reason of the rejection
+        :param detail: message replacing the one of the reason
+        :return: validation result
+        """
+        if detail is None:
+            return _FAILURES[reason]
+        return cls(reason=reason, detail=detail)
+
+    @property
+    def valid(self) -> bool:
+        return self.reason is None
+
+    def __bool__(self) -> bool:
+        return self.reason is None
+
+    @property
+    def error(self) -> Optional[str]:
+        """Error message as returned by validate_token, None when valid."""
+        if self.reason is None:
+            return None
+        return f"Invalid token: {self.detail or self.reason.message}"
+
+    def to_dict(self) -> Dict:
+        """
+        The validate_token form of the result.
+        :return: payload, or dictionary with the error
+        """
+        if self.reason is None:
+            return self.payload
+        return {'error': self.error}
+
+    def unwrap(self) -> Dict:
+        """
+        The payload, raising the TokenError of a rejected token.
+        :return: payload
+        """
+        if self.reason is not None:
+            raise token_error(self.reason, self.detail)
+        return self.payload
+
+    def __repr__(self) -> str:
+        if self.reason is None:
+            return f"ValidationResult(payload={self.payload!r})"
+        return f"ValidationResult(reason={self.reason.name})"
+
+
+_FAILURES = {reason: ValidationResult(reason=reason) for reason in Reason}
@@ -0,0 +1,452 @@
+"""
+Token revocation by jti.
+
+Revoked jti are kept in memory until the exp of their token, behind a Bloom
+filter so the check of a token that was not revoked, the common case, costs
+one hash and one word test. Lists are loaded incrementally from a
+RevocationSource: a JSON lines file of {"jti": ..., "exp": ...} entries,
+exp in milliseconds, only appended to between reloads.
+"""
+from array import array
+from bisect import bisect_left
+from math import ceil
+from typing import (
+    Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+)
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from .claims import default_clock
+from ..rsa_token_lib.forking import register_after_fork
+
+logger = logging.getLogger(__name__)
+
+Entry = Tuple[str, int]
+
+
+def _block_mask(index: int) -> int:
+    digest = hashlib.blake2b(index.to_bytes(2, 'little'), digest_size=6)
+    mask = 0
+    for byte in digest.digest():
+        mask |= 1 << (byte & 63)
+    return mask
+
+
+# Bits set by a digest inside its 64-bit block, selected by its 12 low
+# bits: one table lookup instead of computing the bit positions.
+_BLOCK_MASKS = array('Q', map(_block_mask, range(4096)))
+
+
+def _digest(jti: str) -> int:
+    """64-bit digest identifying a jti in the filter and the index."""
+    return int.from_bytes(
+        hashlib.blake2b(jti.encode(), digest_size=8).digest(), 'little'
+    )
+
+
+class BloomFilter:
+    """
+    Blocked Bloom filter of 64-bit digests. Every digest sets up to six
+    bits of a single 64-bit word, both picked from the digest itself, so a
+    test is one table lookup and one word comparison.
+    """
+    def __init__(self, capacity: int, bits_per_entry: int = 16):
+        if capacity < 1:
+            raise ValueError("capacity must be greater than zero")
+        self.capacity = capacity
+        self.size = max(1, ceil(capacity * bits_per_entry / 64))
+        self._words = array('Q', bytes(8 * self.size))
+
+    def add(self, digest: int):
+        """
+        Add a digest.
+        :param digest: 64-bit digest
+        """
+        mask = _BLOCK_MASKS[digest & 0xFFF]
+        self._words[(digest >> 12) % self.size] |= mask
+
+    def __contains__(self, digest: int) -> bool:
+        mask = _BLOCK_MASKS[digest & 0xFFF]
+        return self._words[(digest >> 12) % self.size] & mask == mask
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the bit array."""
+        return self.size * 8
+
+
+class _RevocationState(NamedTuple):
+    bloom: BloomFilter
+    # sorted digests and the exp of each, 16 bytes per revoked token
+    digests: array
+    exps: array
+    # entries added since the arrays were built, merged into them when
+    # they grow past a fraction of the arrays
+    recent: Dict[int, int]
+
+
+class RevocationUpdate(NamedTuple):
+    """
+    Entries read from a source. With full=True they are the whole list and
+    replace the current one, otherwise they are added to it.
+    """
+    entries: List[Entry]
+    position: Any
+    full: bool
+
+
+class RevocationSource:
+    """Where revocation lists are read from."""
+    def read(self, position: Any) -> RevocationUpdate:
+        """
+        Read the entries added since position.
+        :param position: position returned by the previous read, None for
+        the first one
+        :return: entries and the position to give to the next read
+        """
+        raise NotImplementedError
+
+
+def parse_entries(data: bytes) -> List[Entry]:
+    """
+    Parse JSON lines of revocation entries, invalid lines are skipped.
+    :param data: complete lines
+    :return: list of (jti, exp)
+    """
+    entries = []
+    for line in data.splitlines():
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+            entries.append((str(entry['jti']), int(entry['exp'])))
+        except (ValueError, TypeError, KeyError):
+            logger.warning("Skipping invalid revocation entry: %r", line)
+    return entries
+
+
+def _complete_lines(data: bytes) -> int:
+    """Length of data up to its last newline."""
+    return data.rfind(b'\n') + 1
+
+
+class FileRevocationSource(RevocationSource):
+    """
+    JSON lines file. Only the bytes appended since the last read are
+    parsed. A file that was replaced, truncated or rewritten is read again
+    in full.
+    """
+    def __init__(self, path: str):
+        self.path = path
+
+    def read(self, position: Optional[Tuple[int, int]]) -> RevocationUpdate:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return RevocationUpdate([], None, True)
+        inode, offset = position or (None, 0)
+        if inode != stat.st_ino or stat.st_size < offset:
+            offset = 0
+        elif stat.st_size == offset:
+            return RevocationUpdate([], position, False)
+
+        with open(self.path, 'rb') as file:
+            if offset:
+                # an append keeps the newline that ended the last read
+                file.seek(offset - 1)
+                if file.read(1) != b'\n':
+                    offset = 0
+                    file.seek(0)
+            data = file.read()
+        end = _complete_lines(data)
+        return RevocationUpdate(parse_entries(data[:end]),
+                                (stat.st_ino, offset + end), offset == 0)
+
+    def append(self, jti: str, exp: int):
+        """
+        Add an entry at the end of the file.
+        :param jti: jti of the revoked token
+        :param exp: exp of the revoked token, in milliseconds
+        """
+        line = json.dumps({'jti': jti, 'exp': exp}, separators=(',', ':'))
+        with open(self.path, 'a', encoding='utf-8') as file:
+            file.write(line + '\n')
+
+
+class S3RevocationSource(RevocationSource):
+    """
+    JSON lines object in a Spaces or S3 bucket. An unchanged object costs a
+    conditional GET answered with 304, a grown one a ranged GET of the new
+    bytes. An object that is shorter or doesn't continue the previous one
+    is read again in full.
+
+    client is a boto3 client, or a callable returning one. A source made
+    with from_key_loader asks the loader for its client on every read, so
+    it uses the client the loader creates again in forked children.
+    """
+    def __init__(self, client, bucket: str, key: str):
+        self._client = client
+        self.bucket = bucket
+        self.key = key
+
+    @property
+    def client(self):
+        """boto3 s3 client."""
+        return self._client() if callable(self._client) else self._client
+
+    @classmethod
+    def from_key_loader(cls, key_loader,
+                        key: str = 'revoked_tokens.jsonl'
+                        ) -> 'S3RevocationSource':
+        """
+        Source in the bucket of a SpacesKeyLoader, sharing its boto3 client.
+        :param key_loader: SpacesKeyLoader
+        :param key: name of the object
+        :return: revocation source
+        """
+        return cls(lambda: key_loader.client,
+                   key_loader.config.spaces_bucket, key)
+
+    def read(self, position: Optional[Tuple[Optional[str], int]]
+             ) -> RevocationUpdate:
+        from botocore.exceptions import ClientError
+
+        etag, offset = position or (None, 0)
+        arguments = {'Bucket': self.bucket, 'Key': self.key}
+        if etag is not None:
+            arguments['IfNoneMatch'] = etag
+        if offset:
+            arguments['Range'] = f'bytes={offset - 1}-'
+        try:
+            response = self.client.get_object(**arguments)
+        except ClientError as error:
+            error_code = error.response['Error']['Code']
+            if error_code in ('304', 'NotModified'):
+                return RevocationUpdate([], position, False)
+            if error_code == 'InvalidRange':
+                return self.read(None)
+            if error_code == 'NoSuchKey':
+                return RevocationUpdate([], None, True)
+            raise
+
+        data = response['Body'].read()
+        if offset:
+            if not data.startswith(b'\n'):
+                return self.read(None)
+            data = data[1:]
+        end = _complete_lines(data)
+        # keep no ETag while a line is incomplete, so it is read again
+        etag = response.get('ETag') if end == len(data) else None
+        return RevocationUpdate(parse_entries(data[:end]),
+                                (etag, offset + end), offset == 0)
+
+
+class RevocationList:
+    """
+    Revoked jti until the exp of their token.
+
+    A jti is identified by its 64-bit blake2b digest. Lookups read an
+    immutable snapshot without locking: a Bloom filter answers for the
+    tokens that were never revoked, the others are searched in sorted
+    arrays of digests and exps, 16 bytes per revoked token. Entries added
+    one by one go to a small mapping merged into the arrays as it grows.
+    Expired entries are dropped whenever the arrays are rebuilt.
+    """
+    def __init__(self, source: Optional[RevocationSource] = None,
+                 capacity: int = 10000, bits_per_entry: int = 16,
+                 clock=None):
+        self.source = source
+        self.capacity = capacity
+        self.bits_per_entry = bits_per_entry
+        self.clock = clock or default_clock()
+        self._position = None
+        self._lock = threading.Lock()
+        self._state = self._build({}, 0)
+        register_after_fork(self)
+
+    def _after_fork(self):
+        # the snapshot is kept, a parent thread may have held the lock
+        self._lock = threading.Lock()
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        """
+        Whether the token with this jti was revoked and hasn't expired.
+        :param jti: jti claim, None for tokens without one
+        :return: True if revoked
+        """
+        if jti is None:
+            return False
+        digest = _digest(jti if isinstance(jti, str) else str(jti))
+        state = self._state
+        if digest not in state.bloom:
+            return False
+        exp = state.recent.get(digest)
+        if exp is None:
+            digests = state.digests
+            index = bisect_left(digests, digest)
+            if index == len(digests) or digests[index] != digest:
+                return False
+            exp = state.exps[index]
+        return self.clock.now_ms() < exp
+
+    def __contains__(self, jti: str) -> bool:
+        return self.is_revoked(jti)
+
+    def __len__(self) -> int:
+        state = self._state
+        return len(state.digests) + len(state.recent)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Size of the list.
+        :return: dictionary with the number of entries and the bytes of the
+        filter and of the arrays
+        """
+        state = self._state
+        return {
+            'size': len(state.digests) + len(state.recent),
+            'bloom_bytes': state.bloom.nbytes,
+            'index_bytes': 16 * len(state.digests),
+        }
+
+    def revoke(self, jti: str, exp: int):
+        """
+        Revoke a token.
+        :param jti: jti claim of the token
+        :param exp: exp claim of the token, in milliseconds
+        """
+        self.update([(jti, exp)])
+
+    def update(self, entries: Iterable[Entry]):
+        """
+        Add revoked tokens.
+        :param entries: iterable of (jti, exp)
+        """
+        now = self.clock.now_ms()
+        with self._lock:
+            state = self._state
+            recent = state.recent
+            for jti, exp in entries:
+                if exp <= now:
+                    continue
+                digest = _digest(jti)
+                # bits first, so readers never find an entry the filter
+                # doesn't know
+                state.bloom.add(digest)
+                recent[digest] = max(exp, recent.get(digest, 0))
+            if (len(recent) > max(1024, len(state.digests) // 8)
+                    or len(recent) + len(state.digests)
+                    > state.bloom.capacity):
+                self._state = self._build(self._entries(state), now)
+
+    def replace(self, entries: Iterable[Entry]):
+        """
+        Replace the whole list.
+        :param entries: iterable of (jti, exp)
+        """
+        now = self.clock.now_ms()
+        revoked: Dict[int, int] = {}
+        for jti, exp in entries:
+            if exp > now:
+                digest = _digest(jti)
+                revoked[digest] = max(exp, revoked.get(digest, 0))
+        state = self._build(revoked, now)
+        with self._lock:
+            self._state = state
+
+    def purge(self):
+        """Drop the expired entries."""
+        with self._lock:
+            self._state = self._build(self._entries(self._state),
+                                      self.clock.now_ms())
+
+    @staticmethod
+    def _entries(state: _RevocationState) -> Dict[int, int]:
+        entries = dict(zip(state.digests, state.exps))
+        entries.update(state.recent)
+        return entries
+
+    def _build(self, entries: Dict[int, int], now: int) -> _RevocationState:
+        """
+        Snapshot of the unexpired entries, with a filter sized for twice as
+        many when they don't fit in the configured capacity.
+        :param entries: mapping from digest to exp
+        :param now: current time in milliseconds
+        :return: new state
+        """
+        digests = sorted(digest for digest, exp in entries.items()
+                         if exp > now)
+        bloom = BloomFilter(max(self.capacity, 2 * len(digests)),
+                            self.bits_per_entry)
+        for digest in digests:
+            bloom.add(digest)
+        return _RevocationState(
+            bloom, array('Q', digests),
+            array('q', (entries[digest] for digest in digests)), {}
+        )
+
+    def refresh(self) -> int:
+        """
+        Read the entries added to the source since the last refresh.
+        :return: number of entries read
+        """
+        if self.source is None:
+            return 0
+        update = self.source.read(self._position)
+        if update.full:
+            self.replace(update.entries)
+        elif update.entries:
+            self.update(update.entries)
+        self._position = update.position
+        return len(update.entries)
+
+
+class RevocationRefresher:
+    """
+    Background thread refreshing a RevocationList from its source. A
+    refresher running when the process forks is started again in the child.
+    """
+    def __init__(self, revocations: RevocationList, interval: float):
+        self.revocations = revocations
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        register_after_fork(self)
+
+    def _after_fork(self):
+        running = self._thread is not None and not self._stop.is_set()
+        self._stop = threading.Event()
+        self._thread = None
+        if running:
+            self.start()
+
+    def start(self):
+        """Start polling in a daemon thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='nc-tokens-revocation-refresher',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Stop polling.
+        :param timeout: seconds to wait for the thread to finish
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.revocations.refresh()
+            except Exception:
+                logger.exception("Failed to refresh the revocation list, "
+                                 "keeping the current one")
@@ -0,0 +1,168 @@
+from enum import Enum
+from typing import Any, Optional
+from uuid import UUID
+import json
+import re
+
+# Floats are the only JSON values the fast backends write differently from
+# the stdlib: exponents (1e16 instead of 1e+16) and, with orjson, floats in
+# [1e-5, 1e-4) written without exponent (0.00001 instead of 1e-05). Output
+# matching this pattern, including false positives inside strings, is
+# re-encoded with the stdlib so tokens are byte-identical whatever backend
+# is installed. Non-finite floats are not valid JSON and are not supported.
+_FLOAT_MISMATCH = re.compile(rb'\de[-+\d]|0\.0000[1-9]')
+
+_JSON_KEY_TYPES = (str, int, float, type(None))
+
+
+def _not_serializable(value: Any):
+    """orjson default rejecting what the stdlib rejects."""
+    raise TypeError(
+        f"Object of type {type(value).__name__} is not JSON serializable"
+    )
+
+
+def _needs_stdlib(data: Any) -> bool:
+    """
+    Whether data holds values the fast backends serialize but the stdlib
+    rejects: UUID and Enum values that aren't str, int or float, which
+    orjson writes, and dict keys of other types than str, int, float, bool
+    and None, which orjson and ujson convert to strings.
+    :param data: data to serialize
+    :return: True if the stdlib must serialize it
+    """
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, (str, int, float)) or value is None:
+            continue
+        if isinstance(value, dict):
+            for key in value:
+                if not isinstance(key, _JSON_KEY_TYPES):
+                    return True
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+        elif isinstance(value, (UUID, Enum)):
+            return True
+    return False
+
+
+class JSONSerializer:
+    """Compact JSON serialization, stdlib implementation."""
+    name = 'json'
+
+    def __init__(self):
+        self._encode = json.JSONEncoder(separators=(',', ':'),
+                                        ensure_ascii=False).encode
+
+    def _stdlib_dumps(self, data: Any) -> bytes:
+        return self._encode(data).encode('utf-8')
+
+    def dumps(self, data: Any) -> bytes:
+        """
+        Serialize to compact UTF-8 JSON.
+        :param data: data to serialize
+        :return: JSON bytes
+        """
+        return self._stdlib_dumps(data)
+
+    def loads(self, data: bytes) -> Any:
+        """
+        Deserialize JSON bytes.
+        :param data: JSON bytes
+        :return: deserialized data
+        """
+        return json.loads(data)
+
+
+class OrjsonSerializer(JSONSerializer):
+    """
+    JSON serialization with orjson. Values orjson serializes but the stdlib
+    rejects, such as datetime, dataclasses and UUID, are passed to the
+    stdlib, which raises the same TypeError as the other backends.
+    """
+    name = 'orjson'
+
+    def __init__(self):
+        super().__init__()
+        import orjson
+
+        self._orjson = orjson
+        self._options = (orjson.OPT_NON_STR_KEYS
+                         | orjson.OPT_PASSTHROUGH_DATETIME
+                         | orjson.OPT_PASSTHROUGH_DATACLASS)
+
+    def dumps(self, data: Any) -> bytes:
+        if _needs_stdlib(data):
+            return self._stdlib_dumps(data)
+        try:
+            output = self._orjson.dumps(data, option=self._options,
+                                        default=_not_serializable)
+        except TypeError:
+            return self._stdlib_dumps(data)
+        if _FLOAT_MISMATCH.search(output):
+            return self._stdlib_dumps(data)
+        return output
+
+    def loads(self, data: bytes) -> Any:
+        return self._orjson.loads(data)
+
+
+class UjsonSerializer(JSONSerializer):
+    """
+    JSON serialization with ujson. Data with dict keys ujson would convert
+    to strings is passed to the stdlib, which rejects it.
+    """
+    name = 'ujson'
+
+    def __init__(self):
+        super().__init__()
+        import ujson
+
+        self._ujson = ujson
+
+    def dumps(self, data: Any) -> bytes:
+        if _needs_stdlib(data):
+            return self._stdlib_dumps(data)
+        try:
+            output = self._ujson.dumps(
+                data, ensure_ascii=False, escape_forward_slashes=False
+            ).encode('utf-8')
+        except (TypeError, OverflowError):
+            return self._stdlib_dumps(data)
+        if _FLOAT_MISMATCH.search(output):
+            return self._stdlib_dumps(data)
+        return output
+
+    def loads(self, data: bytes) -> Any:
+        return self._ujson.loads(data)
+
+
+_SERIALIZERS = (OrjsonSerializer, UjsonSerializer, JSONSerializer)
+_default_serializer: Optional[JSONSerializer] = None
+
+
+def get_serializer(name: Optional[str] = None) -> JSONSerializer:
+    """
+    JSON serializer by name, or the fastest installed one: orjson, ujson,
+    then the stdlib.
+    :param name: 'orjson', 'ujson', 'json' or None to auto-select
+    :return: serializer
+    """
+    global _default_serializer
+    if name is None and _default_serializer is not None:
+        return _default_serializer
+    for serializer_class in _SERIALIZERS:
+        if name is not None and serializer_class.name != name:
+            continue
+        try:
+            serializer = serializer_class()
+        except ImportError:
+            if name is not None:
+                raise
+            continue
+        if name is None:
+            _default_serializer = serializer
+        return serializer
+    raise ValueError(f"Unknown JSON serializer: {name}")
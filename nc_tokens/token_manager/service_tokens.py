@@ -0,0 +1,224 @@
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Dict, NamedTuple, Optional, Tuple
+import logging
+import threading
+import uuid
+
+from .claims import default_clock
+from ..rsa_token_lib.forking import register_after_fork
+
+logger = logging.getLogger(__name__)
+
+# service_name, audience and scope of a cached token
+Identity = Tuple[str, Optional[str], Optional[str]]
+
+
+class _ServiceToken(NamedTuple):
+    token: str
+    refresh_at: int
+    expires_at: int
+
+
+class ServiceTokenProvider:
+    """
+    Reuses service tokens instead of signing one per outbound call.
+
+    Tokens are minted per (service_name, audience, scope) with a lifetime
+    in seconds. Once refresh_fraction of the lifetime has elapsed the next
+    caller starts a refresh on a background thread and still gets the
+    cached token, until less than expiry_margin seconds are left; callers
+    then wait for the new token. Concurrent callers of one identity share a
+    single signature, so the signing load follows the number of identities
+    and not the request rate.
+
+    token_manager is a TokenManager, a TokenCreatorManager or anything with
+    create_service_token. claims are added to every payload, for example
+    iss and sub. Tokens carry a random jti, so they can be revoked.
+
+    A forked child keeps the cached tokens and creates its own background
+    thread. Mints in progress in the parent are forgotten and done again.
+    """
+    def __init__(
+            self,
+            token_manager,
+            lifetime: float = 300.0,
+            refresh_fraction: float = 0.75,
+            expiry_margin: float = 5.0,
+            claims: Optional[Dict] = None,
+            clock=None,
+            executor: Optional[Executor] = None,
+    ):
+        if lifetime <= 0:
+            raise ValueError("lifetime must be greater than zero")
+        if not 0 < refresh_fraction <= 1:
+            raise ValueError("refresh_fraction must be between 0 and 1")
+        if not 0 <= expiry_margin < lifetime:
+            raise ValueError("expiry_margin must be shorter than lifetime")
+        self.token_manager = token_manager
+        self.lifetime = lifetime
+        self.refresh_fraction = refresh_fraction
+        self.expiry_margin = expiry_margin
+        self.claims = dict(claims or {})
+        self.clock = clock or default_clock()
+        self.signs = 0
+        self._tokens: Dict[Identity, _ServiceToken] = {}
+        self._pending: Dict[Identity, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = executor
+        self._owns_executor = executor is None
+        register_after_fork(self)
+
+    def _after_fork(self):
+        # the threads minting in the parent don't exist in the child
+        self._lock = threading.Lock()
+        self._pending = {}
+        if self._owns_executor:
+            self._executor = None
+
+    def get_token(self, service_name: str, audience: Optional[str] = None,
+                  scope: Optional[str] = None) -> str:
+        """
+        Service token for an identity, cached or freshly minted.
+        :param service_name: service_name claim
+        :param audience: aud claim, omitted when None
+        :param scope: scope claim, omitted when None
+        :return: encoded token
+        """
+        identity = (service_name, audience, scope)
+        cached = self._tokens.get(identity)
+        if cached is not None:
+            now = self.clock.now_ms()
+            if now < cached.refresh_at:
+                return cached.token
+            if now < cached.expires_at:
+                future, owner = self._pending_mint(identity)
+                if owner:
+                    self._submit_refresh(identity, future)
+                return cached.token
+
+        future, owner = self._pending_mint(identity)
+        if owner:
+            self._mint(identity, future)
+        return future.result().token
+
+    def _pending_mint(self, identity: Identity) -> Tuple[Future, bool]:
+        """
+        Future of the mint in progress for the identity, or a new one.
+        :param identity: service_name, audience and scope
+        :return: future and whether the caller must mint
+        """
+        with self._lock:
+            future = self._pending.get(identity)
+            if future is not None:
+                return future, False
+            future = self._pending[identity] = Future()
+            return future, True
+
+    def _mint(self, identity: Identity, future: Future):
+        """
+        Sign a token for the identity and publish it to the waiters.
+        :param identity: service_name, audience and scope
+        :param future: future of the mint, always completed
+        """
+        try:
+            minted = self._create_token(identity)
+        except BaseException as error:
+            with self._lock:
+                del self._pending[identity]
+            future.set_exception(error)
+            return
+        with self._lock:
+            self._tokens[identity] = minted
+            self.signs += 1
+            del self._pending[identity]
+        future.set_result(minted)
+
+    def _submit_refresh(self, identity: Identity, future: Future):
+        """
+        Start a background refresh, failing its future if the executor
+        refuses it so callers of the identity don't wait forever.
+        :param identity: service_name, audience and scope
+        :param future: future of the mint
+        """
+        try:
+            self._background().submit(self._refresh, identity, future)
+        except BaseException as error:
+            with self._lock:
+                self._pending.pop(identity, None)
+            future.set_exception(error)
+            logger.error("Failed to start the refresh of the service token "
+                         "of %s", identity[0], exc_info=error)
+
+    def _refresh(self, identity: Identity, future: Future):
+        """_mint on the background thread, logging failures."""
+        self._mint(identity, future)
+        if future.exception() is not None:
+            logger.error("Failed to refresh the service token of %s",
+                         identity[0], exc_info=future.exception())
+
+    def _create_token(self, identity: Identity) -> _ServiceToken:
+        """
+        Sign a new token.
+        :param identity: service_name, audience and scope
+        :return: token with its refresh and expiry times in milliseconds
+        """
+        service_name, audience, scope = identity
+        issued_at = self.clock.now_ms()
+        lifetime_ms = int(self.lifetime * 1000)
+        payload = dict(self.claims)
+        payload.update(service_name=service_name, token_type="service",
+                       iat=issued_at, exp=issued_at + lifetime_ms,
+                       jti=uuid.uuid4().hex)
+        if audience is not None:
+            payload["aud"] = audience
+        if scope is not None:
+            payload["scope"] = scope
+        token = self.token_manager.create_service_token(payload)
+        return _ServiceToken(
+            token,
+            issued_at + int(lifetime_ms * self.refresh_fraction),
+            issued_at + lifetime_ms - int(self.expiry_margin * 1000)
+        )
+
+    def _background(self) -> Executor:
+        """Executor of the background refreshes, created on first use."""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=1,
+                        thread_name_prefix='nc-tokens-service-tokens'
+                    )
+        return self._executor
+
+    def invalidate(self, service_name: Optional[str] = None):
+        """
+        Drop cached tokens, the next call mints a new one.
+        :param service_name: only drop the tokens of this service
+        """
+        with self._lock:
+            if service_name is None:
+                self._tokens.clear()
+                return
+            for identity in [identity for identity in self._tokens
+                             if identity[0] == service_name]:
+                del self._tokens[identity]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Provider counters.
+        :return: dictionary with the cached identities and the signatures
+        """
+        return {'size': len(self._tokens), 'signs': self.signs}
+
+    def close(self):
+        """Wait for the background refreshes and stop their thread."""
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def __enter__(self) -> 'ServiceTokenProvider':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,152 @@
+"""
+Streaming token validation for logs and bulk files.
+
+Tokens are read line by line, validated on a thread pool in chunks with a
+bounded number of chunks in flight, and written as JSONL in input order, so
+memory stays constant whatever the size of the input.
+
+    nc-tokens-validate access.log --public-key public_key.pem --extract
+    cat tokens.txt | nc-tokens-validate --jwks jwks.json > results.jsonl
+"""
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import IO, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+import argparse
+import json
+import re
+import sys
+
+from .parallel import default_workers, ordered_map
+from .token_validator import TokenValidator
+from ..rsa_token_lib import JwksKeyLoader
+
+# Three base64url segments separated by dots, as found in log lines
+TOKEN_PATTERN = re.compile(r'[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+')
+
+
+def read_tokens(lines: Iterable[str],
+                extract: bool = False) -> Iterator[Tuple[int, str]]:
+    """
+    Tokens of an iterable of lines, blank lines and lines without a token
+    are skipped.
+    :param lines: lines, for example an open file or sys.stdin
+    :param extract: find the token inside the line instead of taking the
+    whole stripped line
+    :return: iterator of (line number starting at 1, token)
+    """
+    for line_number, line in enumerate(lines, 1):
+        if extract:
+            match = TOKEN_PATTERN.search(line)
+            if match is None:
+                continue
+            token = match.group(0)
+        else:
+            token = line.strip()
+            if not token:
+                continue
+        yield line_number, token
+
+
+def validate_stream(
+        tokens: Iterable[Tuple[int, str]],
+        validator: TokenValidator,
+        executor: Optional[Executor] = None,
+        max_workers: Optional[int] = None,
+        chunk_size: int = 256,
+) -> Iterator[Dict]:
+    """
+    Validate numbered tokens lazily, yielding results in input order.
+    :param tokens: iterable of (line number, token), see read_tokens
+    :param validator: TokenValidator or anything with check_token
+    :param executor: existing executor, a thread pool is created otherwise
+    :param max_workers: number of threads of the pool created for the call
+    :param chunk_size: tokens sent to the pool per task
+    :return: iterator of results with line, valid and payload or error
+    """
+    def validate(numbered_token):
+        line_number, token = numbered_token
+        result = validator.check_token(token)
+        if not result.valid:
+            return {'line': line_number, 'valid': False,
+                    'error': result.error}
+        return {'line': line_number, 'valid': True,
+                'payload': result.payload}
+
+    if executor is not None:
+        yield from ordered_map(validate, tokens, executor,
+                               chunk_size=chunk_size)
+        return
+    max_workers = max_workers or default_workers()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        yield from ordered_map(validate, tokens, pool, chunk_size=chunk_size,
+                               window=max_workers * 2)
+
+
+def write_jsonl(results: Iterable[Dict], output: IO[str]) -> Dict[str, int]:
+    """
+    Write results as JSON lines.
+    :param results: iterable of results
+    :param output: text stream
+    :return: number of valid and invalid tokens
+    """
+    counts = {'valid': 0, 'invalid': 0}
+    for result in results:
+        counts['valid' if result['valid'] else 'invalid'] += 1
+        output.write(json.dumps(result, separators=(',', ':')))
+        output.write('\n')
+    return counts
+
+
+def _validator(arguments: argparse.Namespace) -> TokenValidator:
+    if arguments.jwks:
+        if arguments.jwks.startswith(('http://', 'https://')):
+            return TokenValidator.from_key_loader(
+                JwksKeyLoader(arguments.jwks)
+            )
+        with open(arguments.jwks, 'rb') as file:
+            return TokenValidator.from_jwks(file.read())
+    return TokenValidator.from_file(arguments.public_key)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """
+    Command line entry point.
+    :param argv: arguments, sys.argv when None
+    :return: exit status
+    """
+    parser = argparse.ArgumentParser(
+        prog='nc-tokens-validate',
+        description='Validate tokens line by line and write JSONL results.'
+    )
+    parser.add_argument('input', nargs='?', default='-',
+                        help='file with tokens, stdin when - or missing')
+    keys = parser.add_mutually_exclusive_group(required=True)
+    keys.add_argument('--public-key', help='PEM or DER public key file')
+    keys.add_argument('--jwks', help='JWKS file or URL')
+    parser.add_argument('--output', default='-',
+                        help='JSONL output file, stdout when -')
+    parser.add_argument('--extract', action='store_true',
+                        help='find the token inside each line, for logs')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=256)
+    arguments = parser.parse_args(argv)
+
+    validator = _validator(arguments)
+    source = (sys.stdin if arguments.input == '-'
+              else open(arguments.input, encoding='utf-8', errors='replace'))
+    output = (sys.stdout if arguments.output == '-'
+              else open(arguments.output, 'w', encoding='utf-8'))
+    try:
+        counts = write_jsonl(
+            validate_stream(read_tokens(source, extract=arguments.extract),
+                            validator, max_workers=arguments.workers,
+                            chunk_size=arguments.chunk_size),
+            output
+        )
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+    print(f"{counts['valid']} valid, {counts['invalid']} invalid",
+          file=sys.stderr)
+    return 0
@@ -0,0 +1,130 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Union
+import hashlib
+import threading
+import time
+
+from ..rsa_token_lib.forking import register_after_fork
+
+
+def _copy_json(value: Any) -> Any:
+    """
+    Copy the dicts and lists of a decoded JSON value, the other values are
+    immutable and shared.
+    :param value: decoded JSON value
+    :return: copy
+    """
+    if isinstance(value, dict):
+        return {key: _copy_json(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy_json(item) for item in value]
+    return value
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU cache of tokens whose signature was already verified.
+
+    Entries can be stored with a generation, the KeyRing generation for
+    TokenManager, and are only returned for that generation, so tokens
+    signed with a key dropped from the keyring are verified again.
+
+    Payloads are copied when stored and returned, nested claims such as
+    role lists included, so callers may mutate them.
+    """
+    def __init__(self, max_size: int = 1024):
+        if max_size < 1:
+            raise ValueError("max_size must be greater than zero")
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # payload, exp, generation and whether the payload has nested
+        # dicts or lists, flat payloads are copied with a single dict()
+        self._entries: "OrderedDict[bytes, Tuple[Dict, int, int, bool]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        register_after_fork(self)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cache_key(token: Union[str, bytes, memoryview]) -> bytes:
+        """
+        Hash the token so the cache never keeps raw bearer tokens.
+        :param token: token, as a string or bytes
+        :return: sha256 digest of the token
+        """
+        if isinstance(token, str):
+            token = token.encode()
+        return hashlib.sha256(token).digest()
+
+    @staticmethod
+    def _now() -> int:
+        """
+        Current time in milliseconds, same unit as the 'exp' claim.
+        :return: timestamp in milliseconds
+        """
+        return int(time.time() * 1000)
+
+    def get(self, token: str, generation: int = 0) -> Optional[Dict]:
+        """
+        Get the verified payload of a token.
+        :param token: token
+        :param generation: generation the payload must have been stored with
+        :return: copy of the payload or None if the token is not cached
+        """
+        key = self._cache_key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            payload, exp, entry_generation, nested = entry
+            if entry_generation != generation or self._now() >= exp:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return _copy_json(payload) if nested else dict(payload)
+
+    def put(self, token: str, payload: Dict, generation: int = 0):
+        """
+        Store the payload of a token whose signature was verified.
+        :param token: token
+        :param payload: decoded payload
+        :param generation: generation of the keys that verified it
+        """
+        exp = payload.get('exp')
+        if not isinstance(exp, (int, float)) or isinstance(exp, bool):
+            return
+        nested = any(isinstance(value, (dict, list))
+                     for value in payload.values())
+        payload = _copy_json(payload) if nested else dict(payload)
+        key = self._cache_key(token)
+        with self._lock:
+            self._entries[key] = (payload, exp, generation, nested)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Remove every cached token."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Cache counters.
+        :return: dictionary with hits, misses and current size
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
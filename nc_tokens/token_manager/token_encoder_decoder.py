@@ -1,59 +1,177 @@
-from datetime import datetime, timedelta
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
-from typing import Dict, Tuple
+from cryptography.hazmat.primitives.asymmetric import rsa
+from concurrent.futures import Executor
+from functools import partial
+from itertools import islice
+from typing import (
+    Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+)
 from .interfaces import TokenEncoder, TokenDecoder
-import json
-import base64
+from .parallel import SigningProcessPool, ordered_map, sign_with_worker_key
+from .precheck import TokenPrecheck, PRECHECK_STAGES
+from .serializers import JSONSerializer, get_serializer
+from .algorithms import (
+    ALGORITHMS, SigningAlgorithm, Signer, Verifier, algorithm_for_key,
+    get_algorithm
+)
+from .observers import TokenObserver
+from .results import Reason, ValidationResult
+from .claims import ClaimsChecker, ClaimsPolicy, default_clock
+from .revocation import RevocationList
+from ..rsa_token_lib import key_id
+from ..rsa_token_lib.forking import register_after_fork
+import binascii
+import re
+import threading
+import time
+
+_URLSAFE_TRANSLATION = bytes.maketrans(b'+/', b'-_')
+_URLSAFE_DECODE = bytes.maketrans(b'-_', b'+/')
+_DOT = re.compile(rb'\.')
+
+# reason of a token that raised in a precheck stage, such as a token
+# without len(), an unhashable alg or a claim of the wrong type
+_PRECHECK_ERRORS = {
+    'length': Reason.MALFORMED,
+    'segments': Reason.MALFORMED,
+    'header': Reason.INVALID_HEADER,
+    'algorithm': Reason.ALGORITHM_NOT_ALLOWED,
+    'payload': Reason.INVALID_PAYLOAD,
+    'claims': Reason.MALFORMED,
+}
+
+Token = Union[str, bytes, bytearray, memoryview]
+# signing input, header, payload and signature of a token
+TokenParts = Tuple[memoryview, memoryview, memoryview, memoryview]
+
+
+def _untimed(stage: str, function: Callable, *args):
+    """Run a stage of JWTDecoder._check without an observer."""
+    return function(*args)
 
 
 class JWTEncoder(TokenEncoder):
-    """JWT encoder class"""
+    """
+    JWT encoder class
+
+    The encoded header only depends on the algorithm and the key id, so it
+    is computed once per (alg, kid) and tokens are assembled as bytes. JSON
+    goes through the fastest installed serializer, see get_serializer.
+
+    The algorithm ('RS256', 'ES256' or 'EdDSA') follows the type of the
+    private key unless one is given. A Signer can be given instead of the
+    private key, it carries its algorithm and key id.
+    """
+    def __init__(
+            self,
+            include_kid: bool = True,
+            serializer: Optional[JSONSerializer] = None,
+            algorithm: Optional[str] = None,
+    ):
+        self.include_kid = include_kid
+        self.serializer = serializer or get_serializer()
+        self.algorithm = get_algorithm(algorithm) if algorithm else None
+        self._key_cache: Tuple[Any, Optional[SigningAlgorithm],
+                               Optional[str]] = (None, None, None)
+        self._header_segments: Dict[Tuple[str, Optional[str]], bytes] = {}
+
     @staticmethod
-    def _base64url_encode(data: bytes) -> str:
+    def _base64url_encode_bytes(data: bytes) -> bytes:
         """
-        Base64 encode data.
+        Base64 encode data without going through str.
         :param data: bytes of data
-        :return: string base64
+        :return: base64url bytes without padding
         """
-        return base64.urlsafe_b64encode(data).rstrip(b'=').decode('utf-8')
+        return binascii.b2a_base64(data, newline=False).translate(
+            _URLSAFE_TRANSLATION
+        ).rstrip(b'=')
 
     @staticmethod
-    def _create_header() -> Dict:
+    def _create_header(kid: Optional[str] = None,
+                       alg: str = "RS256") -> Dict:
         """
         Create header
+        :param kid: key id of the signing key
+        :param alg: JWS algorithm name
         :return: dictionary with
         """
-        return {"alg": "RS256", "typ": "JWT"}
+        header = {"alg": alg, "typ": "JWT"}
+        if kid is not None:
+            header["kid"] = kid
+        return header
+
+    def _signing_context(
+            self,
+            private_key
+    ) -> Tuple[SigningAlgorithm, Optional[str]]:
+        """
+        Algorithm and key id of the private key, computed once per key.
+        :param private_key: private key
+        :return: signing algorithm and key id, None when include_kid is
+        disabled
+        """
+        if isinstance(private_key, Signer):
+            algorithm = private_key.algorithm
+            if self.algorithm is not None and self.algorithm is not algorithm:
+                raise ValueError(
+                    f"The key can't be used with {self.algorithm.name}"
+                )
+            return algorithm, private_key.kid if self.include_kid else None
+        cached_key, algorithm, kid = self._key_cache
+        if cached_key is not private_key:
+            algorithm = self.algorithm or algorithm_for_key(private_key)
+            if not algorithm.accepts(private_key):
+                raise ValueError(
+                    f"The key can't be used with {algorithm.name}"
+                )
+            kid = None
+            if self.include_kid:
+                kid = key_id(private_key.public_key())
+            self._key_cache = (private_key, algorithm, kid)
+        return algorithm, kid
 
-    def _encode_parts(self, header: Dict, payload: Dict) -> Tuple[str, str]:
+    def _header_segment(self, private_key) -> bytes:
         """
-        Encode parts.
-        :param header: header of the request
+        Encoded header for the key, computed once per (alg, kid).
+        :param private_key: private key
+        :return: base64url encoded header
+        """
+        algorithm, kid = self._signing_context(private_key)
+        cache_key = (algorithm.name, kid)
+        segment = self._header_segments.get(cache_key)
+        if segment is None:
+            if len(self._header_segments) >= 16:
+                self._header_segments = {}
+            segment = self._base64url_encode_bytes(
+                self.serializer.dumps(self._create_header(kid, algorithm.name))
+            )
+            self._header_segments[cache_key] = segment
+        return segment
+
+    def _encode_payload(self, payload: Dict) -> bytes:
+        """
+        Encode payload.
         :param payload: payload of the request
-        :return: encoded header and encoded payload
+        :return: base64url encoded payload
         """
-        encoded_header = self._base64url_encode(json.dumps(header).encode())
-        encoded_payload = self._base64url_encode(json.dumps(payload).encode())
-        return encoded_header, encoded_payload
+        return self._base64url_encode_bytes(self.serializer.dumps(payload))
 
     def _create_signature(
             self,
             signature_input: bytes,
             private_key: rsa.RSAPrivateKey
-    ) -> str:
+    ) -> bytes:
         """
         Create signature for the token
         :param signature_input: in bytes of data
-        :param private_key: private key
-        :return:
+        :param private_key: private key or Signer
+        :return: base64url encoded signature
         """
-        signature = private_key.sign(
-            signature_input,
-            padding.PKCS1v15(),
-            hashes.SHA256()
-        )
-        return self._base64url_encode(signature)
+        if isinstance(private_key, Signer):
+            signature = private_key.sign(signature_input)
+            return self._base64url_encode_bytes(signature)
+        algorithm, _ = self._signing_context(private_key)
+        signature = algorithm.sign(private_key, signature_input)
+        return self._base64url_encode_bytes(signature)
 
     def encode(
             self,
@@ -68,101 +186,470 @@ class JWTEncoder(TokenEncoder):
         :param token_type: 'service' or 'user'
         :return: encoded string payload
         """
-        header = self._create_header()
-        encoded_header, encoded_payload = self._encode_parts(header, payload)
-        signature_input = f"{encoded_header}.{encoded_payload}".encode()
-        encoded_signature = self._create_signature(
-            signature_input, private_key
-        )
-        return f"{encoded_header}.{encoded_payload}.{encoded_signature}"
+        signature_input = b'.'.join((
+            self._header_segment(private_key),
+            self._encode_payload(payload)
+        ))
+        signature = self._create_signature(signature_input, private_key)
+        return b'.'.join((signature_input, signature)).decode('ascii')
+
+    def encode_many(
+            self,
+            payloads: Iterable[Dict],
+            private_key: rsa.RSAPrivateKey,
+            token_type: str,
+            executor: Optional[Executor] = None,
+    ) -> List[str]:
+        """
+        Encode many payloads. The header is encoded once and the signatures
+        are created on the executor when one is given.
+        :param payloads: iterable of payloads
+        :param private_key: private key with RSAPrivateKey
+        :param token_type: 'service' or 'user'
+        :param executor: thread pool or SigningProcessPool used to sign
+        :return: list of encoded tokens in the same order as the payloads
+        """
+        header_segment = self._header_segment(private_key)
+        signature_inputs = [
+            b'.'.join((header_segment, self._encode_payload(payload)))
+            for payload in payloads
+        ]
+
+        if isinstance(executor, SigningProcessPool):
+            sign = sign_with_worker_key
+        else:
+            sign = partial(self._create_signature, private_key=private_key)
+        if executor is None:
+            signatures = map(sign, signature_inputs)
+        else:
+            signatures = ordered_map(sign, signature_inputs, executor)
+
+        return [
+            b'.'.join((signature_input, signature)).decode('ascii')
+            for signature_input, signature in zip(signature_inputs, signatures)
+        ]
 
 
 class JWTDecoder(TokenDecoder):
+    """
+    JWT decoder class
+
+    With a TokenPrecheck the token length, segments, header algorithm and
+    expiration are checked before the signature, and every rejection is
+    counted by stage in precheck_rejections.
+
+    The algorithm is taken from the token header. It must be in
+    allowed_algorithms (every supported algorithm by default) and match the
+    type of the public key. Verifiers can be given instead of public keys,
+    their algorithm is checked by name.
+
+    With an observer, decode reports the duration of every stage and the
+    outcome of every token to it.
+
+    Without claims only exp is checked. With a ClaimsPolicy, compiled once,
+    or a ClaimsChecker the policy replaces that check. clock is any object
+    with now_ms(), the shared SystemClock by default.
+
+    With a RevocationList, tokens whose jti was revoked are rejected after
+    their claims, also when validated from a cached payload.
+    """
+    def __init__(
+            self,
+            precheck: Optional[TokenPrecheck] = None,
+            serializer: Optional[JSONSerializer] = None,
+            allowed_algorithms: Optional[Iterable[str]] = None,
+            observer: Optional[TokenObserver] = None,
+            claims: Union[ClaimsPolicy, ClaimsChecker, None] = None,
+            clock=None,
+            revocations: Optional[RevocationList] = None,
+    ):
+        self.precheck = precheck
+        self.observer = observer
+        self.clock = clock or default_clock()
+        if isinstance(claims, ClaimsPolicy):
+            claims = claims.compile(self.clock)
+        self.claims = claims
+        self.revocations = revocations
+        self.serializer = serializer or get_serializer()
+        self.allowed_algorithms = frozenset(
+            get_algorithm(name).name
+            for name in (allowed_algorithms or ALGORITHMS)
+        )
+        self.precheck_rejections = dict.fromkeys(PRECHECK_STAGES, 0)
+        self._rejections_lock = threading.Lock()
+        register_after_fork(self)
+
+    def _after_fork(self):
+        self._rejections_lock = threading.Lock()
+
     @staticmethod
-    def _base64url_decode(data: str) -> bytes:
+    def _base64url_decode(data: Union[str, bytes, memoryview]) -> bytes:
         """
         Base64 decode data.
-        :param data: data string to pass to base64
+        :param data: base64url string or bytes, with or without padding
         :return: base64 decoded data
         """
-        padding_data = '=' * (4 - (len(data) % 4))
-        return base64.urlsafe_b64decode(data + padding_data)
+        if isinstance(data, str):
+            data = data.encode('ascii')
+        data = bytes(data).translate(_URLSAFE_DECODE)
+        return binascii.a2b_base64(data + b'=' * (-len(data) % 4))
 
     @staticmethod
-    def _split_token(token: str) -> list[str]:
+    def _split_token(token: Token) -> Optional[TokenParts]:
         """
-        Split token by a dot.
-        :param token: token
-        :return: only the token
+        Locate the two dots of the token once and slice it without copies.
+        :param token: token as a string, bytes or memoryview
+        :return: signing input, header, payload and signature segments,
+        memoryviews over the token bytes, None without exactly two dots
         """
-        parts = token.split('.')
-        if len(parts) != 3:
-            raise ValueError("Invalid token format")
-        return parts
+        if isinstance(token, str):
+            token = token.encode()
+        view = memoryview(token)
+        if view.format != 'B' or view.ndim != 1:
+            view = view.cast('B')
+        dots = [match.start() for match in islice(_DOT.finditer(view), 3)]
+        if len(dots) != 2:
+            return None
+        first, second = dots
+        return (view[:second], view[:first], view[first + 1:second],
+                view[second + 1:])
 
     @staticmethod
     def _verify_signature(signature_input: bytes, signature: bytes,
-                          public_key: rsa.RSAPublicKey):
+                          public_key: rsa.RSAPublicKey,
+                          algorithm: SigningAlgorithm = ALGORITHMS['RS256']
+                          ) -> bool:
         """
         verify signature.
         :param signature_input: input of the sign
         :param signature: signature
-        :param public_key: public key from RSAPrivateKey
-        :return:
+        :param public_key: public key or Verifier
+        :param algorithm: signing algorithm of the token
+        :return: True if the signature matches
         """
+        if isinstance(public_key, Verifier):
+            return public_key.verify(signature, signature_input)
         try:
-            public_key.verify(
-                signature,
-                signature_input,
-                padding.PKCS1v15(),
-                hashes.SHA256()
-            )
+            algorithm.verify(public_key, signature, signature_input)
         except Exception:
-            raise ValueError("Invalid signature")
+            return False
+        return True
+
+    def _header_algorithm(
+            self,
+            header: Dict,
+            public_key
+    ) -> Union[SigningAlgorithm, Reason]:
+        """
+        Algorithm of the token header, checked against the allowlist and
+        the key type.
+        :param header: decoded header
+        :param public_key: public key the token is verified with
+        :return: signing algorithm, or the reason of the rejection
+        """
+        name = header.get('alg')
+        if name not in self.allowed_algorithms:
+            return Reason.ALGORITHM_NOT_ALLOWED
+        if isinstance(public_key, Verifier):
+            algorithm = public_key.algorithm
+            if algorithm.name != name:
+                return Reason.ALGORITHM_MISMATCH
+            return algorithm
+        algorithm = ALGORITHMS[name]
+        if not algorithm.accepts(public_key):
+            return Reason.ALGORITHM_MISMATCH
+        return algorithm
 
-    def _decode_payload(self, payload_b64: str) -> Dict:
+    def _decode_segment(self, data) -> Optional[bytes]:
+        """
+        Base64 decode a segment of the token.
+        :param data: base64url segment
+        :return: decoded bytes, None if it isn't valid base64
+        """
+        try:
+            return self._base64url_decode(data)
+        except ValueError:
+            return None
+
+    def _decode_payload(self, payload_b64) -> Optional[Dict]:
         """
         Decode payload.
         :param payload_b64: payload in base64 format
-        :return: json file with a decoded payload
+        :return: decoded payload, None if it isn't a base64 JSON object
+        """
+        data = self._decode_segment(payload_b64)
+        return None if data is None else self._load_json_object(data)
+
+    def _decode_header(self, header_b64) -> Optional[Dict]:
+        """
+        Decode header.
+        :param header_b64: header in base64 format
+        :return: decoded header, None if it isn't a base64 JSON object
+        """
+        data = self._decode_segment(header_b64)
+        return None if data is None else self._load_json_object(data)
+
+    def _load_json_object(self, data: bytes) -> Optional[Dict]:
+        """
+        Parse a JSON object.
+        :param data: JSON bytes
+        :return: dictionary, None if data isn't a JSON object
         """
         try:
-            payload_json = self._base64url_decode(payload_b64).decode('utf-8')
-            return json.loads(payload_json)
-        except json.JSONDecodeError:
-            raise ValueError("Invalid payload format")
+            value = self.serializer.loads(data)
+        except ValueError:
+            return None
+        return value if isinstance(value, dict) else None
 
-    def decode(self, token: str, public_key: rsa.RSAPublicKey) -> Dict:
+    @staticmethod
+    def _resolve_key(
+            header: Dict,
+            public_keys: Mapping[Optional[str], rsa.RSAPublicKey]
+    ) -> Optional[rsa.RSAPublicKey]:
         """
-        Decode token and verify expiration.
-        :param token: token
-        :param public_key: public key
+        Find the public key of the token by the kid of its header.
+        :param header: decoded header
+        :param public_keys: mapping from kid to public key
+        :return: public key, None for an unknown kid
+        """
+        return public_keys.get(header.get('kid'))
+
+    def decode(self, token: Token, public_key: rsa.RSAPublicKey) -> Dict:
+        """
+        Decode token and verify expiration. The signature is verified over
+        a slice of the token, bytes and memoryview tokens are not copied.
+        :param token: token as a string, bytes or memoryview
+        :param public_key: public key, or a mapping from kid to public key
+        where None is the key of tokens without kid
         :return: decoded payload
+        :raises TokenError: a ValueError subclass with the reason
+        """
+        return self.check(token, public_key).unwrap()
+
+    def check(self, token: Token,
+              public_key: rsa.RSAPublicKey) -> ValidationResult:
+        """
+        Like decode, without raising. Rejected tokens give shared results
+        and their message is only formatted when read.
+        :param token: token as a string, bytes or memoryview
+        :param public_key: public key, or a mapping from kid to public key
+        :return: validation result with the payload or the reason
+        """
+        observer = self.observer
+        try:
+            if observer is None:
+                result = self._check(token, public_key)
+            else:
+                result = self._check(token, public_key,
+                                     self._stage_timer(observer))
+        except Exception as error:
+            reason, detail = Reason.MALFORMED, str(error)
+        else:
+            if not isinstance(result, Reason):
+                if observer is not None:
+                    observer.on_outcome('ok')
+                return ValidationResult(result)
+            reason, detail = result, None
+        if observer is not None:
+            observer.on_outcome(reason.outcome)
+        return ValidationResult.failure(reason, detail)
+
+    def _check(self, token: Token, public_key,
+               timed: Callable = _untimed) -> Union[Dict, Reason]:
+        """
+        Validate the token.
+        :param token: token
+        :param public_key: public key, or a mapping from kid to public key
+        :param timed: called as timed(stage, function, *args) to run every
+        stage, _stage_timer(observer) reports their durations
+        :return: decoded payload, or the reason of the rejection
+        """
+        header = payload = None
+        if self.precheck is None:
+            parts = self._split_token(token)
+            if parts is None:
+                return Reason.MALFORMED
+        else:
+            checked = timed('precheck', self._precheck_token, token)
+            if isinstance(checked, Reason):
+                return checked
+            parts, header, payload = checked
+        signature_input, header_b64, payload_b64, signature_b64 = parts
+        if header is None:
+            data = timed('base64', self._decode_segment, header_b64)
+            if data is not None:
+                header = timed('json', self._load_json_object, data)
+            if header is None:
+                return Reason.INVALID_HEADER
+        if isinstance(public_key, Mapping):
+            public_key = self._resolve_key(header, public_key)
+            if public_key is None:
+                return Reason.UNKNOWN_KEY_ID
+        algorithm = self._header_algorithm(header, public_key)
+        if isinstance(algorithm, Reason):
+            return algorithm
+
+        signature = timed('base64', self._decode_segment, signature_b64)
+        if signature is None or not timed(
+                'signature', self._verify_signature, signature_input,
+                signature, public_key, algorithm):
+            return Reason.INVALID_SIGNATURE
+
+        if payload is None:
+            data = timed('base64', self._decode_segment, payload_b64)
+            if data is not None:
+                payload = timed('json', self._load_json_object, data)
+            if payload is None:
+                return Reason.INVALID_PAYLOAD
+        reason = (timed('expiry', self._claims_reason, payload)
+                  or self._revocation_reason(payload))
+        return payload if reason is None else reason
+
+    @staticmethod
+    def _stage_timer(observer: TokenObserver) -> Callable:
+        """
+        timed function for _check reporting stage durations.
+        :param observer: observer
+        :return: function called as timed(stage, function, *args)
+        """
+        clock = time.perf_counter
+
+        def timed(stage, function, *args):
+            start = clock()
+            try:
+                return function(*args)
+            finally:
+                observer.on_stage(stage, clock() - start)
+
+        return timed
+
+    def _reject(self, stage: str, reason: Reason) -> Reason:
+        """
+        Count a precheck rejection.
+        :param stage: precheck stage that rejected the token
+        :param reason: reason of the rejection
+        :return: the reason
         """
+        with self._rejections_lock:
+            self.precheck_rejections[stage] += 1
+        return reason
+
+    def _precheck_token(
+            self,
+            token: Token
+    ) -> Union[Tuple[TokenParts, Dict, Dict], Reason]:
+        """
+        Run the precheck stages, cheapest first. A stage that raises
+        rejects the token and is counted like any other rejection.
+        :param token: token as a string, bytes or memoryview
+        :return: token parts, decoded header and decoded payload, or the
+        reason of the rejection
+        """
+        precheck = self.precheck
+        stage = 'length'
         try:
-            header_b64, payload_b64, signature_b64 = self._split_token(token)
+            if len(token) > precheck.max_token_length:
+                return self._reject(stage, Reason.TOKEN_TOO_LONG)
 
-            signature_input = f"{header_b64}.{payload_b64}".encode()
-            signature = self._base64url_decode(signature_b64)
+            stage = 'segments'
+            parts = self._split_token(token)
+            if parts is None:
+                return self._reject(stage, Reason.MALFORMED)
+            _, header_b64, payload_b64, _ = parts
 
-            self._verify_signature(signature_input, signature, public_key)
+            stage = 'header'
+            if len(header_b64) > precheck.max_header_length:
+                return self._reject(stage, Reason.HEADER_TOO_LONG)
+            header = self._decode_header(header_b64)
+            if header is None:
+                return self._reject(stage, Reason.INVALID_HEADER)
+            stage = 'algorithm'
+            allowed_algorithms = (precheck.allowed_algorithms
+                                  or self.allowed_algorithms)
+            if header.get('alg') not in allowed_algorithms:
+                return self._reject(stage, Reason.ALGORITHM_NOT_ALLOWED)
 
+            stage = 'payload'
             payload = self._decode_payload(payload_b64)
-            self._verify_expiration(payload)
+            if payload is None:
+                return self._reject(stage, Reason.INVALID_PAYLOAD)
+            if precheck.reject_expired:
+                stage = 'claims'
+                reason = self._claims_reason(payload)
+                if reason is not None:
+                    if reason is Reason.EXPIRED:
+                        stage = 'expired'
+                    return self._reject(stage, reason)
+        except Exception:
+            return self._reject(stage, _PRECHECK_ERRORS[stage])
 
-            return payload
-        except Exception as e:
-            raise ValueError(f"Invalid token: {str(e)}")
+        return parts, header, payload
 
-    @staticmethod
-    def _verify_expiration(payload: Dict):
+    def verify_payload(self, payload: Dict):
+        """
+        Verify the claims of an already decoded payload.
+        :param payload: decoded payload
+        :raises TokenError: a ValueError subclass with the reason
+        """
+        self.check_payload(payload).unwrap()
+
+    def check_payload(self, payload: Dict) -> ValidationResult:
+        """
+        Like verify_payload, without raising.
+        :param payload: decoded payload
+        :return: validation result
+        """
+        observer = self.observer
+        start = time.perf_counter() if observer is not None else 0.0
+        try:
+            reason = (self._claims_reason(payload)
+                      or self._revocation_reason(payload))
+        except Exception as error:
+            result = ValidationResult.failure(Reason.MALFORMED, str(error))
+        else:
+            if reason is None:
+                result = ValidationResult(payload)
+            else:
+                result = ValidationResult.failure(reason)
+        if observer is not None:
+            observer.on_stage('expiry', time.perf_counter() - start)
+            observer.on_outcome(
+                'ok' if result.reason is None else result.reason.outcome
+            )
+        return result
+
+    def _claims_reason(self, payload: Dict) -> Optional[Reason]:
+        """
+        Check the claims with the policy, or only the expiration.
+        :param payload: decoded payload
+        :return: reason of the rejection, None if the claims are valid
+        """
+        if self.claims is not None:
+            return self.claims.check(payload)
+        return self._expiration_reason(payload)
+
+    def _revocation_reason(self, payload: Dict) -> Optional[Reason]:
+        """
+        Check the jti against the revocation list.
+        :param payload: decoded payload
+        :return: Reason.REVOKED, None if not revoked or without a list
+        """
+        revocations = self.revocations
+        if revocations is not None and revocations.is_revoked(
+                payload.get('jti')):
+            return Reason.REVOKED
+        return None
+
+    def _expiration_reason(self, payload: Dict) -> Optional[Reason]:
         """
-        Verify token expiration.
+        Check token expiration.
         :param payload: decoded payload
+        :return: reason of the rejection, None if the token hasn't expired
         """
         exp = payload.get('exp')
         if not exp:
-            raise ValueError("Token has no expiration")
+            return Reason.MISSING_EXPIRATION
 
-        if int(datetime.utcnow().timestamp() * 1000) >= exp:
-            raise ValueError("Token has expired")
+        if self.clock.now_ms() >= exp:
+            return Reason.EXPIRED
+        return None
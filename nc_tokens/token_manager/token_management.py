@@ -1,31 +1,189 @@
 import datetime
 
+from concurrent.futures import Executor, ThreadPoolExecutor
 from .token_encoder_decoder import JWTEncoder, JWTDecoder
-from typing import Optional
-from ..rsa_token_lib import KeyLoader
+from .token_cache import VerifiedTokenCache
+from .parallel import map_in_threads, default_workers, SigningProcessPool
+from .keyring import KeyRing, KeyRefresher
+from .results import ValidationResult
+from .claims import ClaimsPolicy
+from .revocation import RevocationList, RevocationRefresher
+from collections.abc import Mapping
+from typing import Dict, Iterable, List, Optional
+from ..rsa_token_lib import KeyLoader, public_keys_to_jwks
+from ..rsa_token_lib.forking import register_after_fork
+import threading
 
 
 class TokenManager:
-    """Token management class"""
+    """
+    Token management class
+
+    With lazy=True the keys are not loaded on construction, the private key
+    is loaded on the first signature and the public key on the first
+    validation, so validate-only processes never fetch the private key.
+
+    With key_refresh_interval set a background thread polls the key loader
+    and rotates new keys into the keyring. Tokens signed with the replaced
+    keys keep validating, looked up by the kid of their header.
+
+    JWTEncoder and JWTDecoder are given the Signer and Verifiers the
+    keyring builds once per rotation, other encoders and decoders, including
+    subclasses overriding encode, decode or check, the raw keys.
+
+    A claims_policy is compiled once and installed on the decoder, which
+    then checks it on every validation instead of only exp.
+
+    A RevocationList given as revocations is installed on the decoder too.
+    With revocation_refresh_interval set it is loaded from its source on
+    construction and then refreshed by a background thread.
+
+    A TokenManager can be shared between threads: validation reads the
+    keyring snapshot and takes no lock. It can also be created before
+    os.fork, as in the preload mode of gunicorn or uWSGI: the keys loaded
+    in the parent are shared copy-on-write with the children, which create
+    their own boto3 clients, locks and background threads.
+    """
     def __init__(
             self,
             key_management: KeyLoader,
             encoder: JWTEncoder,
             decoder: JWTDecoder,
+            token_cache: Optional[VerifiedTokenCache] = None,
+            lazy: bool = False,
+            keyring: Optional[KeyRing] = None,
+            key_refresh_interval: Optional[float] = None,
+            claims_policy: Optional[ClaimsPolicy] = None,
+            revocations: Optional[RevocationList] = None,
+            revocation_refresh_interval: Optional[float] = None,
     ):
         self.key_management = key_management
         self.encoder = encoder
         self.decoder = decoder
-        self.private_key = None
-        self.public_key = None
-        self._load_keys()
+        if claims_policy is not None:
+            self.decoder.claims = claims_policy.compile(self.decoder.clock)
+        self.token_cache = token_cache
+        self.lazy = lazy
+        self.keyring = keyring or KeyRing()
+        self._keys_lock = threading.Lock()
+        register_after_fork(self)
+        self.key_refresher = None
+        if not lazy:
+            self._load_keys()
+        if key_refresh_interval is not None:
+            self.key_refresher = KeyRefresher(
+                key_management, self.keyring, key_refresh_interval
+            )
+            self.key_refresher.start()
+        self.revocations = revocations
+        self.revocation_refresher = None
+        if revocations is not None:
+            self.decoder.revocations = revocations
+            if revocation_refresh_interval is not None:
+                revocations.refresh()
+                self.revocation_refresher = RevocationRefresher(
+                    revocations, revocation_refresh_interval
+                )
+                self.revocation_refresher.start()
 
     def _load_keys(self):
         """
         Load private and public keys
         :return: private and public keys
         """
-        self.private_key, self.public_key = self.key_management.load_keys()
+        self.keyring.rotate(*self.key_management.load_keys())
+
+    def _after_fork(self):
+        self._keys_lock = threading.Lock()
+
+    def close(self):
+        """Stops the background key and revocation refreshers."""
+        if self.key_refresher is not None:
+            self.key_refresher.stop()
+        if self.revocation_refresher is not None:
+            self.revocation_refresher.stop()
+
+    def _load_private_key(self):
+        """Load only the private key, used by lazy mode."""
+        with self._keys_lock:
+            if self.keyring.private_key is None:
+                self.keyring.set_private_key(
+                    self.key_management.load_private_key()
+                )
+
+    def _load_public_key(self):
+        """Load only the public key, used by lazy mode."""
+        with self._keys_lock:
+            if self.keyring.public_key is None:
+                self.keyring.set_public_key(
+                    self.key_management.load_public_key()
+                )
+
+    @property
+    def private_key(self):
+        """Private key, loaded on first use in lazy mode."""
+        if self.keyring.private_key is None and self.lazy:
+            self._load_private_key()
+        return self.keyring.private_key
+
+    @property
+    def public_key(self):
+        """Public key, loaded on first use in lazy mode."""
+        if self.keyring.public_key is None and self.lazy:
+            self._load_public_key()
+        return self.keyring.public_key
+
+    @property
+    def signer(self):
+        """Signer of the private key passed to the encoder."""
+        if self.keyring.signer is None and self.lazy:
+            self._load_private_key()
+        return self.keyring.signer
+
+    @property
+    def verification_key(self):
+        """Verifier or kid mapping of verifiers passed to the decoder."""
+        if self.keyring.verification_key is None and self.lazy:
+            self._load_public_key()
+        return self.keyring.verification_key
+
+    def _encoding_key(self):
+        """
+        Key for encoder.encode: the Signer when the encoder uses the encode
+        of JWTEncoder, the private key for other encoders.
+        """
+        if getattr(type(self.encoder), 'encode', None) is JWTEncoder.encode:
+            return self.signer
+        return self.private_key
+
+    def _decoding_key(self):
+        """
+        Key for decoder.decode and check: the Verifiers when the decoder
+        uses the decode and check of JWTDecoder, the public keys for other
+        decoders.
+        """
+        decoder_type = type(self.decoder)
+        if (getattr(decoder_type, 'decode', None) is JWTDecoder.decode
+                and getattr(decoder_type, 'check', None) is JWTDecoder.check):
+            return self.verification_key
+        if self.keyring.public_key is None and self.lazy:
+            self._load_public_key()
+        return self.keyring.public_keys
+
+    def export_jwks(self) -> Dict[str, List[Dict[str, str]]]:
+        """
+        JWKS document of the current public key and of the replaced keys
+        still accepted, to publish for validators using JwksKeyLoader.
+        :return: JWKS dictionary, serialize it with json.dumps
+        """
+        public_key = self.public_key
+        if public_key is None:
+            raise ValueError("No public key loaded")
+        if isinstance(public_key, Mapping):
+            return public_keys_to_jwks(public_key)
+        public_keys = {self.keyring.kid: public_key}
+        public_keys.update(self.keyring.previous_keys)
+        return public_keys_to_jwks(public_keys)
 
     def create_user_token(self, payload: dict) -> Optional[str]:
         """
@@ -39,7 +197,7 @@ class TokenManager:
             "aud": "jti",
             "exp": datetime.datetime.timestamp(),
             "iat": 128937218974,
-            "nbf": "bf",
+            "nbf": 128937218974,
             "token_type": "user"
         }
 
@@ -48,7 +206,7 @@ class TokenManager:
         """
         return self.encoder.encode(
             payload,
-            self.private_key,
+            self._encoding_key(),
             token_type=payload["token_type"]
         )
 
@@ -64,7 +222,7 @@ class TokenManager:
             "aud": "jti",
             "exp": datetime.datetime.timestamp(),
             "iat": 128937218974,
-            "nbf": "bf",
+            "nbf": 128937218974,
             "service_name": "service_name",
             "token_type": "service"
         }
@@ -74,10 +232,72 @@ class TokenManager:
         """
         return self.encoder.encode(
             payload,
-            self.private_key,
+            self._encoding_key(),
             token_type=payload['token_type']
         )
 
+    def create_user_tokens(
+            self,
+            payloads: Iterable[dict],
+            max_workers: Optional[int] = None,
+            use_processes: bool = False,
+    ) -> List[str]:
+        """
+        Creates many user tokens, signing them on a worker pool.
+        :param payloads: iterable of payloads like create_user_token
+        :param max_workers: number of workers of the pool
+        :param use_processes: sign on processes instead of threads
+        :return: list of encoded tokens in the same order as the payloads
+        """
+        return self._create_tokens(payloads, "user", max_workers,
+                                   use_processes)
+
+    def create_service_tokens(
+            self,
+            payloads: Iterable[dict],
+            max_workers: Optional[int] = None,
+            use_processes: bool = False,
+    ) -> List[str]:
+        """
+        Creates many service tokens, signing them on a worker pool.
+        :param payloads: iterable of payloads like create_service_token
+        :param max_workers: number of workers of the pool
+        :param use_processes: sign on processes instead of threads
+        :return: list of encoded tokens in the same order as the payloads
+        """
+        return self._create_tokens(payloads, "service", max_workers,
+                                   use_processes)
+
+    def _create_tokens(
+            self,
+            payloads: Iterable[dict],
+            token_type: str,
+            max_workers: Optional[int],
+            use_processes: bool,
+    ) -> List[str]:
+        """
+        Encode the payloads on a thread pool or a SigningProcessPool.
+        :param payloads: iterable of payloads
+        :param token_type: 'service' or 'user'
+        :param max_workers: number of workers of the pool
+        :param use_processes: sign on processes instead of threads
+        :return: list of encoded tokens
+        """
+        if use_processes:
+            pool = SigningProcessPool(self.private_key,
+                                      max_workers=max_workers)
+        else:
+            pool = ThreadPoolExecutor(
+                max_workers=max_workers or default_workers()
+            )
+        with pool:
+            return self.encoder.encode_many(
+                payloads,
+                self._encoding_key(),
+                token_type=token_type,
+                executor=pool
+            )
+
     def validate_token(self, token: str) -> dict:
         """
         Validates the given token.
@@ -85,8 +305,68 @@ class TokenManager:
         :return: True if the token is valid, False otherwise
         """
         try:
-            return self.decoder.decode(token, self.public_key)
+            if self.token_cache is not None:
+                return self._validate_cached_token(token)
+            return self.decoder.decode(token, self._decoding_key())
         except ValueError as error:
             return {
                 'error': str(error)
             }
+
+    def check_token(self, token: str) -> ValidationResult:
+        """
+        Validates the given token without raising. Rejected tokens don't
+        build exceptions or error messages, see ValidationResult.
+        :param token: token to validate
+        :return: validation result with the payload or the reason
+        """
+        if self.token_cache is None:
+            return self.decoder.check(token, self._decoding_key())
+        # read before verifying, a key dropped meanwhile misses next time
+        generation = self.keyring.generation
+        payload = self.token_cache.get(token, generation)
+        if payload is None:
+            result = self.decoder.check(token, self._decoding_key())
+            if result.valid:
+                self.token_cache.put(token, result.payload, generation)
+            return result
+        return self.decoder.check_payload(payload)
+
+    def validate_tokens(
+            self,
+            tokens: Iterable[str],
+            max_workers: Optional[int] = None,
+            executor: Optional[Executor] = None,
+            chunk_size: int = 64,
+    ) -> List[dict]:
+        """
+        Validates many tokens in parallel. Signature verification releases
+        the GIL, so a thread pool uses every core.
+        :param tokens: iterable of tokens to validate
+        :param max_workers: number of threads of the pool created for the
+        call, ignored when executor is given
+        :param executor: existing concurrent.futures executor to use
+        :param chunk_size: tokens sent to the pool per task
+        :return: list with the result of validate_token for every token, in
+        the same order as the input
+        """
+        return map_in_threads(self.validate_token, tokens,
+                              max_workers=max_workers, executor=executor,
+                              chunk_size=chunk_size)
+
+    def _validate_cached_token(self, token: str) -> dict:
+        """
+        Validates the token skipping the signature check for tokens that
+        were already verified with keys still in the keyring. Expiration is
+        checked on every call.
+        :param token: token to validate
+        :return: decoded payload
+        """
+        generation = self.keyring.generation
+        payload = self.token_cache.get(token, generation)
+        if payload is None:
+            payload = self.decoder.decode(token, self._decoding_key())
+            self.token_cache.put(token, payload, generation)
+            return payload
+        self.decoder.verify_payload(payload)
+        return payload
@@ -0,0 +1,117 @@
+from concurrent.futures import Executor
+from cryptography.hazmat.primitives.asymmetric import rsa
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Union
+
+from .token_encoder_decoder import JWTDecoder
+from .parallel import map_in_threads
+from .results import ValidationResult
+from ..rsa_token_lib import KeyLoader, load_jwks, parse_public_key
+
+PublicKeys = Union[rsa.RSAPublicKey, Mapping[Optional[str], rsa.RSAPublicKey]]
+
+
+class TokenValidator:
+    """
+    Verify-only token validation. Holds public keys only, never loads the
+    private key and never needs object store credentials.
+    """
+    def __init__(
+            self,
+            public_key: PublicKeys,
+            decoder: Optional[JWTDecoder] = None,
+    ):
+        self.public_key = public_key
+        self.decoder = decoder or JWTDecoder()
+
+    @classmethod
+    def from_pem(cls, data: bytes, **kwargs) -> 'TokenValidator':
+        """
+        Validator for a PEM public key.
+        :param data: PEM SubjectPublicKeyInfo bytes
+        :return: token validator
+        """
+        return cls(parse_public_key(data), **kwargs)
+
+    @classmethod
+    def from_der(cls, data: bytes, **kwargs) -> 'TokenValidator':
+        """
+        Validator for a DER public key.
+        :param data: DER SubjectPublicKeyInfo bytes
+        :return: token validator
+        """
+        return cls(parse_public_key(data), **kwargs)
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> 'TokenValidator':
+        """
+        Validator for a PEM or DER public key file.
+        :param path: path of the public key
+        :return: token validator
+        """
+        with open(path, 'rb') as file:
+            return cls(parse_public_key(file.read()), **kwargs)
+
+    @classmethod
+    def from_jwks(
+            cls,
+            document: Union[str, bytes, Dict[str, Any]],
+            **kwargs
+    ) -> 'TokenValidator':
+        """
+        Validator for the keys of a JWKS document, selected by token kid.
+        :param document: JWKS as a JSON string, bytes or dictionary
+        :return: token validator
+        """
+        keys = load_jwks(document)
+        if not keys:
+            raise ValueError("The JWKS document has no signature keys")
+        if len(keys) == 1:
+            return cls(next(iter(keys.values())), **kwargs)
+        return cls(keys, **kwargs)
+
+    @classmethod
+    def from_key_loader(cls, key_loader: KeyLoader,
+                        **kwargs) -> 'TokenValidator':
+        """
+        Validator for the public key of a key loader.
+        :param key_loader: key loader, only load_public_key is called
+        :return: token validator
+        """
+        return cls(key_loader.load_public_key(), **kwargs)
+
+    def validate_token(self, token: str) -> dict:
+        """
+        Validates the given token.
+        :param token: token to validate
+        :return: decoded payload or dictionary with the error
+        """
+        try:
+            return self.decoder.decode(token, self.public_key)
+        except ValueError as error:
+            return {
+                'error': str(error)
+            }
+
+    def check_token(self, token: str) -> ValidationResult:
+        """
+        Validates the given token without raising.
+        :param token: token to validate
+        :return: validation result with the payload or the reason
+        """
+        return self.decoder.check(token, self.public_key)
+
+    def validate_tokens(
+            self,
+            tokens: Iterable[str],
+            max_workers: Optional[int] = None,
+            executor: Optional[Executor] = None,
+    ) -> List[dict]:
+        """
+        Validates many tokens in parallel, see TokenManager.validate_tokens
+        :param tokens: iterable of tokens to validate
+        :param max_workers: number of threads of the pool
+        :param executor: existing concurrent.futures executor to use
+        :return: list of results in the same order as the input
+        """
+        return map_in_threads(self.validate_token, tokens,
+                              max_workers=max_workers, executor=executor)
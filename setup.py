@@ -28,4 +28,15 @@ setup(
         "pycparser==2.22",
         "botocore~=1.35.1"
     ],
+    entry_points={
+        "console_scripts": [
+            "nc-tokens-validate=nc_tokens.token_manager.streaming:main",
+        ],
+    },
+    extras_require={
+        "orjson": ["orjson>=3.6"],
+        "ujson": ["ujson>=5.0"],
+        "prometheus": ["prometheus_client>=0.12"],
+        "opentelemetry": ["opentelemetry-api>=1.12"],
+    },
 )
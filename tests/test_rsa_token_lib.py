@@ -1,8 +1,38 @@
+import dataclasses
+import os
+import pickle
+import stat
+import subprocess
+import sys
+import tempfile
 import unittest
 from unittest.mock import Mock, patch
 from botocore.exceptions import ClientError
+from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import rsa
-from nc_tokens.rsa_token_lib import SpacesConfig, SpacesKeyLoader
+from nc_tokens.rsa_token_lib import (
+    SpacesConfig, SpacesKeyLoader, FileKeyLoader, InMemoryKeyLoader
+)
+
+try:
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+
+def _pem_key_pair():
+    private_key = rsa.generate_private_key(public_exponent=65537,
+                                           key_size=2048)
+    private_pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+    public_pem = private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return private_key, private_pem, public_pem
 
 
 class TestSpacesKeyLoader(unittest.TestCase):
@@ -120,5 +150,326 @@ class TestSpacesKeyLoader(unittest.TestCase):
         )
 
 
+class TestLazySpacesKeyLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.config = SpacesConfig(
+            spaces_bucket="test-bucket",
+            spaces_region="nyc3",
+            access_key_id="test-access-key",
+            secret_access_key="test-secret-key",
+        )
+        self.objects = {
+            "private_key.pem": b'private-key-data',
+            "public_key.pem": b'public-key-data',
+        }
+
+    def _get_object(self, Bucket, Key):
+        return {'Body': Mock(read=lambda: self.objects[Key])}
+
+    @patch('boto3.session.Session')
+    def test_init_does_not_touch_network(self, mock_session):
+        SpacesKeyLoader(self.config, lazy=True)
+
+        mock_session.assert_not_called()
+
+    def test_pickled_copy_creates_its_own_client(self):
+        loader = SpacesKeyLoader(self.config, lazy=True)
+        loader._client = Mock()
+
+        copy = pickle.loads(pickle.dumps(loader))
+
+        self.assertIsNone(copy._client)
+        self.assertEqual(copy.config, self.config)
+
+    @patch('boto3.session.Session')
+    @patch('cryptography.hazmat.primitives.serialization.load_pem_private_key')
+    @patch('cryptography.hazmat.primitives.serialization.load_pem_public_key')
+    def test_load_keys_fetches_both_keys(
+            self,
+            mock_load_public,
+            mock_load_private,
+            mock_session
+    ):
+        mock_client = mock_session.return_value.client.return_value
+        mock_client.get_object.side_effect = self._get_object
+
+        loader = SpacesKeyLoader(self.config, lazy=True)
+        private_key, public_key = loader.load_keys()
+
+        self.assertEqual(private_key, mock_load_private.return_value)
+        self.assertEqual(public_key, mock_load_public.return_value)
+        mock_client.head_bucket.assert_not_called()
+        mock_load_private.assert_called_once_with(
+            b'private-key-data', password=None, backend=unittest.mock.ANY
+        )
+        mock_load_public.assert_called_once_with(
+            b'public-key-data', backend=unittest.mock.ANY
+        )
+
+    @patch('boto3.session.Session')
+    @patch('cryptography.hazmat.primitives.serialization.load_pem_private_key')
+    @patch('cryptography.hazmat.primitives.serialization.load_pem_public_key')
+    def test_load_public_key_skips_private_key(
+            self,
+            mock_load_public,
+            mock_load_private,
+            mock_session
+    ):
+        mock_client = mock_session.return_value.client.return_value
+        mock_client.get_object.side_effect = self._get_object
+
+        loader = SpacesKeyLoader(self.config, lazy=True)
+        loader.load_public_key()
+
+        mock_client.get_object.assert_called_once_with(
+            Bucket="test-bucket", Key="public_key.pem"
+        )
+        mock_load_private.assert_not_called()
+
+    @patch('boto3.session.Session')
+    def test_missing_bucket_raises_value_error(self, mock_session):
+        mock_client = mock_session.return_value.client.return_value
+        mock_client.get_object.side_effect = ClientError(
+            {'Error': {'Code': 'NoSuchBucket'}},
+            'GetObject'
+        )
+
+        loader = SpacesKeyLoader(self.config, lazy=True)
+        with self.assertRaises(ValueError):
+            loader.load_public_key()
+
+    def test_import_does_not_import_boto3(self):
+        code = "import sys, nc_tokens; sys.exit('boto3' in sys.modules)"
+        self.assertEqual(
+            subprocess.run([sys.executable, "-c", code]).returncode, 0
+        )
+
+
+@unittest.skipIf(mock_aws is None, "moto is not installed")
+class TestSpacesKeyLoaderKeyCache(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_aws = mock_aws()
+        self.mock_aws.start()
+        self.addCleanup(self.mock_aws.stop)
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+
+        self.private_key, self.private_pem, self.public_pem = _pem_key_pair()
+        self.config = SpacesConfig(
+            spaces_bucket="keys-bucket",
+            spaces_region="us-east-1",
+            access_key_id="test-access-key",
+            secret_access_key="test-secret-key",
+            endpoint_url="https://s3.us-east-1.amazonaws.com",
+            cache_dir=os.path.join(self.cache_dir.name, "keys"),
+        )
+        loader = SpacesKeyLoader(self.config, lazy=True)
+        self.s3 = loader.client
+        self.s3.create_bucket(Bucket="keys-bucket")
+        self._upload(self.private_pem, self.public_pem)
+
+    def _upload(self, private_pem, public_pem):
+        self.s3.put_object(Bucket="keys-bucket", Key="private_key.pem",
+                           Body=private_pem)
+        self.s3.put_object(Bucket="keys-bucket", Key="public_key.pem",
+                           Body=public_pem)
+
+    def test_cache_files_have_restricted_permissions(self):
+        SpacesKeyLoader(self.config, lazy=True).load_keys()
+
+        cache_files = os.listdir(self.config.cache_dir)
+        self.assertEqual(len(cache_files), 2)
+        self.assertEqual(
+            stat.S_IMODE(os.stat(self.config.cache_dir).st_mode), 0o700
+        )
+        for name in cache_files:
+            path = os.path.join(self.config.cache_dir, name)
+            self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+
+    def test_downloads_are_reported_to_the_observer(self):
+        observer = Mock()
+
+        SpacesKeyLoader(self.config, lazy=True, observer=observer).load_keys()
+
+        self.assertEqual(
+            [call.args[0] for call in observer.on_stage.call_args_list],
+            ['key_fetch', 'key_fetch']
+        )
+
+    def test_fresh_cache_does_not_use_network(self):
+        SpacesKeyLoader(self.config, lazy=True).load_keys()
+        self.config.cache_ttl = 3600
+
+        loader = SpacesKeyLoader(self.config, lazy=True)
+        private_key, public_key = loader.load_keys()
+
+        self.assertIsNone(loader._client)
+        self.assertEqual(public_key, self.private_key.public_key())
+
+    def test_buckets_sharing_a_cache_dir_keep_their_keys(self):
+        SpacesKeyLoader(self.config, lazy=True).load_keys()
+        other_private_key, other_private_pem, other_public_pem = (
+            _pem_key_pair()
+        )
+        self.s3.create_bucket(Bucket="other-bucket")
+        self.s3.put_object(Bucket="other-bucket", Key="public_key.pem",
+                           Body=other_public_pem)
+        other_config = dataclasses.replace(
+            self.config, spaces_bucket="other-bucket", cache_ttl=3600
+        )
+
+        public_key = SpacesKeyLoader(other_config,
+                                     lazy=True).load_public_key()
+
+        self.assertEqual(public_key, other_private_key.public_key())
+        self.assertEqual(len(os.listdir(self.config.cache_dir)), 3)
+
+    def test_stale_cache_uses_conditional_get(self):
+        SpacesKeyLoader(self.config, lazy=True).load_keys()
+
+        loader = SpacesKeyLoader(self.config, lazy=True)
+        with patch.object(loader.client, 'get_object',
+                          wraps=loader.client.get_object) as get_object:
+            public_key = loader.load_public_key()
+
+        self.assertIn('IfNoneMatch', get_object.call_args.kwargs)
+        self.assertEqual(public_key, self.private_key.public_key())
+
+    def test_changed_key_is_downloaded_again(self):
+        SpacesKeyLoader(self.config, lazy=True).load_keys()
+        new_private_key, new_private_pem, new_public_pem = _pem_key_pair()
+        self._upload(new_private_pem, new_public_pem)
+
+        public_key = SpacesKeyLoader(self.config, lazy=True).load_public_key()
+
+        self.assertEqual(public_key, new_private_key.public_key())
+
+    def test_unchanged_keys_are_not_parsed_again(self):
+        loader = SpacesKeyLoader(self.config, lazy=True)
+        private_key, public_key = loader.load_keys()
+
+        with patch.object(loader, '_parse_private_key') as parse_private:
+            self.assertIs(loader.load_keys()[0], private_key)
+            self.assertIs(loader.load_private_key(), private_key)
+        parse_private.assert_not_called()
+        self.assertIs(loader.load_public_key(), public_key)
+
+        new_private_key, new_private_pem, new_public_pem = _pem_key_pair()
+        self._upload(new_private_pem, new_public_pem)
+        self.assertEqual(loader.load_public_key(),
+                         new_private_key.public_key())
+
+    def test_der_keys(self):
+        self._upload(
+            self.private_key.private_bytes(
+                serialization.Encoding.DER,
+                serialization.PrivateFormat.PKCS8,
+                serialization.NoEncryption()
+            ),
+            self.private_key.public_key().public_bytes(
+                serialization.Encoding.DER,
+                serialization.PublicFormat.SubjectPublicKeyInfo
+            )
+        )
+
+        for key_format in ("der", "auto"):
+            with self.subTest(key_format=key_format):
+                self.config.key_format = key_format
+                self.config.cache_dir = None
+                private_key, public_key = SpacesKeyLoader(
+                    self.config, lazy=True
+                ).load_keys()
+                self.assertEqual(public_key, self.private_key.public_key())
+                self.assertEqual(private_key.private_numbers(),
+                                 self.private_key.private_numbers())
+
+    def test_unknown_key_format(self):
+        self.config.key_format = "jks"
+
+        with self.assertRaises(ValueError):
+            SpacesKeyLoader(self.config, lazy=True)
+
+
+class TestLocalKeyLoaders(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.private_key, cls.private_pem, cls.public_pem = _pem_key_pair()
+        cls.private_der = cls.private_key.private_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        )
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def _write(self, name, data):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as file:
+            file.write(data)
+        return path
+
+    def test_file_loader_reads_pem(self):
+        loader = FileKeyLoader(self._write("private.pem", self.private_pem),
+                               self._write("public.pem", self.public_pem))
+
+        private_key, public_key = loader.load_keys()
+
+        self.assertEqual(private_key.private_numbers(),
+                         self.private_key.private_numbers())
+        self.assertEqual(public_key, self.private_key.public_key())
+
+    def test_file_loader_reads_der_with_mmap(self):
+        loader = FileKeyLoader(self._write("private.der", self.private_der),
+                               use_mmap=True)
+
+        private_key, public_key = loader.load_keys()
+
+        self.assertEqual(public_key, self.private_key.public_key())
+
+    def test_file_loader_public_key_only(self):
+        loader = FileKeyLoader(
+            public_key_path=self._write("public.pem", self.public_pem)
+        )
+
+        self.assertEqual(loader.load_keys(),
+                         (None, self.private_key.public_key()))
+        with self.assertRaises(ValueError):
+            loader.load_private_key()
+
+    def test_file_loader_empty_file_with_mmap(self):
+        loader = FileKeyLoader(self._write("private.pem", b''),
+                               use_mmap=True)
+
+        with self.assertRaises(ValueError):
+            loader.load_private_key()
+
+    def test_in_memory_loader_accepts_bytes(self):
+        loader = InMemoryKeyLoader(self.private_pem)
+
+        private_key, public_key = loader.load_keys()
+
+        self.assertEqual(public_key, self.private_key.public_key())
+
+    def test_in_memory_loader_requires_a_key(self):
+        with self.assertRaises(ValueError):
+            InMemoryKeyLoader()
+
+    def test_in_memory_loader_can_be_pickled(self):
+        loader = pickle.loads(pickle.dumps(InMemoryKeyLoader(
+            self.private_key
+        )))
+
+        private_key, public_key = loader.load_keys()
+
+        self.assertEqual(private_key.private_numbers(),
+                         self.private_key.private_numbers())
+        self.assertEqual(public_key, self.private_key.public_key())
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+from datetime import datetime, timedelta
+from nc_tokens.rsa_token_lib import InMemoryKeyLoader
+from nc_tokens.token_creator import TokenCreatorManager
+
+
+class TestTokenCreatorManager(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.key_loader = InMemoryKeyLoader.generate()
+
+    def setUp(self):
+        self.token_creator = TokenCreatorManager(key_loader=self.key_loader)
+        self.payload = {
+            "iss": "iss",
+            "sub": "sub",
+            "aud": "aud",
+            "exp": int((datetime.utcnow() + timedelta(hours=1)).timestamp()
+                       * 1000),
+            "token_type": "user"
+        }
+
+    def test_create_and_validate_with_key_loader(self):
+        token = self.token_creator.create_user_token(self.payload)
+
+        self.assertEqual(self.token_creator.validate_token(token),
+                         self.payload)
+        self.assertIsNone(self.token_creator.spaces_config)
+
+    def test_spaces_credentials_required_without_key_loader(self):
+        with self.assertRaises(ValueError):
+            TokenCreatorManager(spaces_bucket="bucket")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,60 @@
+import base64
+import dataclasses
+import enum
+import http.server
+import io
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
 import unittest
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from unittest.mock import Mock, patch
 from datetime import datetime, timedelta
-from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
 from nc_tokens.token_manager import JWTEncoder, JWTDecoder
-from nc_tokens.rsa_token_lib import KeyLoader
-from nc_tokens.token_manager import TokenManager
+from nc_tokens.rsa_token_lib import (
+    InMemoryKeyLoader, KeyLoader, JwksKeyLoader, SpacesConfig,
+    SpacesKeyLoader, key_id, public_key_from_jwk, public_key_to_jwk,
+    public_keys_to_jwks
+)
+from nc_tokens.token_manager import (
+    TokenManager, VerifiedTokenCache, AsyncTokenManager, KeyRing,
+    TokenValidator, TokenPrecheck, JSONSerializer, get_serializer,
+    ParallelTokenIssuer, MetricsObserver, OpenTelemetryObserver,
+    PrometheusObserver, read_tokens, validate_stream, Reason,
+    ValidationResult, TokenError, ExpiredTokenError, InvalidSignatureError,
+    MalformedTokenError, RejectedTokenError, ClaimsPolicy, TokenTypeRule,
+    SystemClock, ManualClock, RevocationList, FileRevocationSource,
+    S3RevocationSource, BloomFilter, ServiceTokenProvider, Signer, Verifier,
+    get_algorithm
+)
+from nc_tokens.token_manager import streaming
+from nc_tokens.token_manager.interfaces import TokenDecoder, TokenEncoder
+
+try:
+    import boto3
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+try:
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+except ImportError:
+    MeterProvider = None
+
+_PRIVATE_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
 
 
 class TestTokenManager(unittest.TestCase):
@@ -29,6 +79,61 @@ class TestTokenManager(unittest.TestCase):
         self.assertEqual(self.token_manager.public_key, self.mock_public_key)
         self.mock_key_loader.load_keys.assert_called_once()
 
+    def test_keys_are_wrapped_once(self):
+        signer = self.token_manager.signer
+        verifier = self.token_manager.verification_key
+
+        self.assertIs(signer.private_key, self.mock_private_key)
+        self.assertIs(verifier.public_key, self.mock_public_key)
+        self.assertIs(self.token_manager.signer, signer)
+        self.assertIs(self.token_manager.verification_key, verifier)
+
+    def test_jwt_encoder_and_decoder_get_signer_and_verifier(self):
+        token_manager = TokenManager(InMemoryKeyLoader(_PRIVATE_KEY),
+                                     JWTEncoder(), JWTDecoder())
+        payload = {"sub": "subject", "exp": 2 ** 50, "token_type": "user"}
+
+        with patch.object(JWTEncoder, '_signing_context', autospec=True,
+                          side_effect=JWTEncoder._signing_context) as context:
+            token = token_manager.create_user_token(payload)
+        with patch.object(JWTDecoder, '_verify_signature',
+                          side_effect=JWTDecoder._verify_signature) as verify:
+            self.assertEqual(token_manager.validate_token(token), payload)
+
+        self.assertIs(context.call_args.args[1], token_manager.signer)
+        self.assertIs(verify.call_args.args[2],
+                      token_manager.verification_key)
+
+    def test_other_encoders_and_decoders_get_raw_keys(self):
+        class Encoder(TokenEncoder):
+            def encode(self, payload, private_key, token_type):
+                self.private_key = private_key
+                return "token"
+
+        class Decoder(TokenDecoder):
+            def decode(self, token, public_key):
+                self.public_key = public_key
+                return {}
+
+        new_key = ec.generate_private_key(ec.SECP256R1())
+        encoder, decoder = Encoder(), Decoder()
+        token_manager = TokenManager(InMemoryKeyLoader(_PRIVATE_KEY),
+                                     encoder, decoder)
+        token_manager.create_service_token({"token_type": "service"})
+        token_manager.validate_token("token")
+
+        self.assertIs(encoder.private_key, _PRIVATE_KEY)
+        self.assertIs(decoder.public_key, token_manager.public_key)
+
+        token_manager.keyring.rotate(new_key, new_key.public_key())
+        token_manager.validate_token("token")
+
+        self.assertEqual(decoder.public_key, {
+            key_id(_PRIVATE_KEY.public_key()): _PRIVATE_KEY.public_key(),
+            key_id(new_key.public_key()): new_key.public_key(),
+            None: new_key.public_key(),
+        })
+
     def test_create_user_token(self):
         payload = {
             "iss": "test_issuer",
@@ -100,6 +205,1803 @@ class TestTokenManager(unittest.TestCase):
             self.mock_public_key
         )
 
+    def test_validate_tokens_keeps_input_order(self):
+        tokens = [f"token_{index}" for index in range(200)]
+        self.mock_decoder.decode.side_effect = (
+            lambda token, key: {"sub": token}
+        )
+
+        result = self.token_manager.validate_tokens(tokens, max_workers=4)
+
+        self.assertEqual(result, [{"sub": token} for token in tokens])
+
+    def test_validate_tokens_reports_errors_per_token(self):
+        def decode(token, key):
+            if token == "bad":
+                raise ValueError("Invalid token format")
+            return {"sub": token}
+        self.mock_decoder.decode.side_effect = decode
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            result = self.token_manager.validate_tokens(
+                iter(["good", "bad", "good"]), executor=executor,
+                chunk_size=1
+            )
+
+        self.assertEqual(result, [
+            {"sub": "good"},
+            {"error": "Invalid token format"},
+            {"sub": "good"},
+        ])
+
+    def test_lazy_validate_loads_only_public_key(self):
+        self.mock_key_loader.reset_mock()
+        self.mock_key_loader.load_public_key.return_value = (
+            self.mock_public_key
+        )
+        token_manager = TokenManager(self.mock_key_loader, self.mock_encoder,
+                                     self.mock_decoder, lazy=True)
+        self.mock_key_loader.load_keys.assert_not_called()
+
+        token_manager.validate_token("token")
+        token_manager.validate_token("token")
+
+        self.mock_key_loader.load_public_key.assert_called_once()
+        self.mock_key_loader.load_private_key.assert_not_called()
+        self.mock_decoder.decode.assert_called_with("token",
+                                                    self.mock_public_key)
+
+    def test_lazy_create_loads_only_private_key(self):
+        self.mock_key_loader.reset_mock()
+        self.mock_key_loader.load_private_key.return_value = (
+            self.mock_private_key
+        )
+        token_manager = TokenManager(self.mock_key_loader, self.mock_encoder,
+                                     self.mock_decoder, lazy=True)
+
+        token_manager.create_user_token({"token_type": "user"})
+
+        self.mock_key_loader.load_private_key.assert_called_once()
+        self.mock_key_loader.load_public_key.assert_not_called()
+
+    def test_create_user_tokens_uses_thread_pool(self):
+        payloads = [{"sub": "a", "token_type": "user"}]
+        self.mock_encoder.encode_many.return_value = ["token"]
+
+        result = self.token_manager.create_user_tokens(payloads,
+                                                       max_workers=2)
+
+        self.assertEqual(result, ["token"])
+        args, kwargs = self.mock_encoder.encode_many.call_args
+        self.assertEqual(args, (payloads, self.mock_private_key))
+        self.assertEqual(kwargs['token_type'], "user")
+        self.assertIsInstance(kwargs['executor'], ThreadPoolExecutor)
+
+
+class TestBatchTokenCreation(unittest.TestCase):
+
+    def setUp(self):
+        key_loader = Mock(spec=KeyLoader)
+        key_loader.load_keys.return_value = (
+            _PRIVATE_KEY, _PRIVATE_KEY.public_key()
+        )
+        self.encoder = JWTEncoder()
+        self.token_manager = TokenManager(key_loader, self.encoder,
+                                          JWTDecoder())
+        exp = int((datetime.utcnow() + timedelta(hours=1)).timestamp() * 1000)
+        self.payloads = [
+            {"sub": f"service_{index}", "exp": exp,
+             "service_name": "service_name", "token_type": "service"}
+            for index in range(20)
+        ]
+
+    def _expected_tokens(self):
+        return [
+            self.encoder.encode(payload, _PRIVATE_KEY, token_type="service")
+            for payload in self.payloads
+        ]
+
+    def test_thread_pool_matches_single_encode(self):
+        tokens = self.token_manager.create_service_tokens(self.payloads,
+                                                          max_workers=4)
+
+        self.assertEqual(tokens, self._expected_tokens())
+
+    def test_process_pool_matches_single_encode(self):
+        tokens = self.token_manager.create_service_tokens(
+            self.payloads, max_workers=2, use_processes=True
+        )
+
+        self.assertEqual(tokens, self._expected_tokens())
+        self.assertEqual(
+            [self.token_manager.validate_token(token) for token in tokens],
+            self.payloads
+        )
+
+    def test_encoded_segments_are_compact_json(self):
+        token = self.encoder.encode(self.payloads[0], _PRIVATE_KEY,
+                                    token_type="service")
+        header_b64, payload_b64, _ = token.split('.')
+
+        header_json = base64.urlsafe_b64decode(header_b64 + '==')
+        payload_json = base64.urlsafe_b64decode(payload_b64 + '==')
+        self.assertEqual(
+            header_json,
+            json.dumps(_header(token), separators=(',', ':')).encode()
+        )
+        self.assertEqual(
+            payload_json,
+            json.dumps(self.payloads[0], separators=(',', ':')).encode()
+        )
+
+    def test_encode_many_without_executor(self):
+        tokens = self.encoder.encode_many(self.payloads, _PRIVATE_KEY,
+                                          token_type="service")
+
+        self.assertEqual(tokens, self._expected_tokens())
+
+
+class TestVerifiedTokenCache(unittest.TestCase):
+
+    private_key = _PRIVATE_KEY
+    public_key = _PRIVATE_KEY.public_key()
+
+    def setUp(self):
+        self.mock_key_loader = Mock(spec=KeyLoader)
+        self.mock_key_loader.load_keys.return_value = (
+            self.private_key, self.public_key
+        )
+        self.decoder = JWTDecoder()
+        self.token_cache = VerifiedTokenCache(max_size=2)
+        self.token_manager = TokenManager(
+            self.mock_key_loader, JWTEncoder(), self.decoder,
+            token_cache=self.token_cache
+        )
+
+    @staticmethod
+    def _payload(sub: str, exp_delta: timedelta = timedelta(hours=1)):
+        return {
+            "sub": sub,
+            "exp": int((datetime.utcnow() + exp_delta).timestamp() * 1000),
+            "token_type": "user"
+        }
+
+    def test_second_validation_skips_signature(self):
+        token = self.token_manager.create_user_token(self._payload("a"))
+
+        with patch.object(self.decoder, '_verify_signature',
+                          wraps=self.decoder._verify_signature) as verify:
+            first = self.token_manager.validate_token(token)
+            second = self.token_manager.validate_token(token)
+
+        self.assertEqual(first, second)
+        self.assertEqual(verify.call_count, 1)
+        self.assertEqual(self.token_cache.stats(),
+                         {'hits': 1, 'misses': 1, 'size': 1})
+
+    def test_hit_still_checks_expiration(self):
+        payload = self._payload("a")
+        token = self.token_manager.create_user_token(payload)
+        self.decoder.clock = ManualClock(payload["exp"] - 1)
+        self.token_manager.validate_token(token)
+
+        self.decoder.clock.advance(1)
+        result = self.token_manager.validate_token(token)
+
+        self.assertEqual(result, {'error': 'Invalid token: Token has expired'})
+        self.assertEqual(self.token_cache.hits, 1)
+
+    def test_hits_do_not_share_nested_claims(self):
+        payload = dict(self._payload("a"), roles=["reader"],
+                       scopes={"api": ["read"]})
+        token = self.token_manager.create_user_token(payload)
+
+        for _ in range(2):
+            result = self.token_manager.validate_token(token)
+            result["roles"].append("admin")
+            result["scopes"]["api"].append("write")
+
+        self.assertEqual(self.token_manager.validate_token(token)["roles"],
+                         ["reader"])
+        self.assertEqual(self.token_cache.get(token)["scopes"],
+                         {"api": ["read"]})
+        self.assertEqual(self.token_cache.hits, 3)
+
+    def test_expired_entries_are_evicted(self):
+        payload = self._payload("a")
+        self.token_cache.put("token", payload)
+
+        with patch('nc_tokens.token_manager.token_cache.time.time',
+                   return_value=payload['exp'] / 1000 + 1):
+            self.assertIsNone(self.token_cache.get("token"))
+        self.assertEqual(len(self.token_cache), 0)
+
+    def test_least_recently_used_is_evicted(self):
+        self.token_cache.put("a", self._payload("a"))
+        self.token_cache.put("b", self._payload("b"))
+        self.token_cache.get("a")
+        self.token_cache.put("c", self._payload("c"))
+
+        self.assertIsNotNone(self.token_cache.get("a"))
+        self.assertIsNone(self.token_cache.get("b"))
+        self.assertIsNotNone(self.token_cache.get("c"))
+
+    def test_invalid_tokens_are_not_cached(self):
+        self.token_manager.validate_token("invalid.token.value")
+
+        self.assertEqual(len(self.token_cache), 0)
+
+
+def _header(token: str) -> dict:
+    header_b64 = token.split('.')[0]
+    return json.loads(base64.urlsafe_b64decode(header_b64 + '=='))
+
+
+class TestKeyRotation(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.keys = [
+            rsa.generate_private_key(public_exponent=65537, key_size=2048)
+            for _ in range(3)
+        ]
+
+    def setUp(self):
+        self.key_loader = Mock(spec=KeyLoader)
+        self.key_loader.load_keys.return_value = self._pair(0)
+        self.token_manager = TokenManager(self.key_loader, JWTEncoder(),
+                                          JWTDecoder(),
+                                          keyring=KeyRing(max_previous_keys=1))
+        self.payload = {
+            "sub": "test_subject",
+            "exp": int((datetime.utcnow() + timedelta(hours=1)).timestamp()
+                       * 1000),
+            "token_type": "user"
+        }
+
+    def _pair(self, index):
+        return self.keys[index], self.keys[index].public_key()
+
+    def test_header_contains_kid(self):
+        token = self.token_manager.create_user_token(self.payload)
+
+        self.assertEqual(_header(token)["kid"],
+                         key_id(self.keys[0].public_key()))
+
+    def test_tokens_of_previous_key_still_validate(self):
+        old_token = self.token_manager.create_user_token(self.payload)
+
+        self.assertTrue(self.token_manager.keyring.rotate(*self._pair(1)))
+        new_token = self.token_manager.create_user_token(self.payload)
+
+        self.assertEqual(_header(new_token)["kid"],
+                         key_id(self.keys[1].public_key()))
+        self.assertEqual(self.token_manager.validate_token(old_token),
+                         self.payload)
+        self.assertEqual(self.token_manager.validate_token(new_token),
+                         self.payload)
+
+    def test_keys_older_than_max_previous_are_dropped(self):
+        old_token = self.token_manager.create_user_token(self.payload)
+        self.token_manager.keyring.rotate(*self._pair(1))
+        self.token_manager.keyring.rotate(*self._pair(2))
+
+        result = self.token_manager.validate_token(old_token)
+
+        self.assertEqual(result, {'error': 'Invalid token: Unknown key id'})
+
+    def test_cached_tokens_of_dropped_keys_are_verified_again(self):
+        self.token_manager.token_cache = VerifiedTokenCache()
+        old_token = self.token_manager.create_user_token(self.payload)
+        self.assertEqual(self.token_manager.validate_token(old_token),
+                         self.payload)
+        self.token_manager.keyring.rotate(*self._pair(1))
+        new_token = self.token_manager.create_user_token(self.payload)
+        self.token_manager.validate_token(new_token)
+
+        self.assertEqual(self.token_manager.validate_token(old_token),
+                         self.payload)
+        self.token_manager.keyring.rotate(*self._pair(2))
+
+        self.assertEqual(self.token_manager.validate_token(old_token),
+                         {'error': 'Invalid token: Unknown key id'})
+        self.assertFalse(self.token_manager.check_token(old_token).valid)
+        self.assertEqual(self.token_manager.validate_token(new_token),
+                         self.payload)
+
+    def test_same_key_does_not_rotate(self):
+        self.token_manager.keyring.rotate(*self._pair(1))
+
+        self.assertFalse(self.token_manager.keyring.rotate(*self._pair(1)))
+        self.assertEqual(len(self.token_manager.keyring.previous_keys), 1)
+
+    def test_tokens_without_kid_use_current_key(self):
+        self.token_manager.keyring.rotate(*self._pair(1))
+        token = JWTEncoder(include_kid=False).encode(
+            self.payload, self.keys[1], token_type="user"
+        )
+
+        self.assertEqual(self.token_manager.validate_token(token),
+                         self.payload)
+
+    def test_background_refresher_rotates_keys(self):
+        token_manager = TokenManager(self.key_loader, JWTEncoder(),
+                                     JWTDecoder(), key_refresh_interval=0.01)
+        self.addCleanup(token_manager.close)
+        self.key_loader.load_keys.return_value = self._pair(1)
+
+        deadline = time.monotonic() + 5
+        while (token_manager.private_key is not self.keys[1]
+               and time.monotonic() < deadline):
+            time.sleep(0.01)
+
+        self.assertIs(token_manager.private_key, self.keys[1])
+        self.assertIn(key_id(self.keys[0].public_key()),
+                      token_manager.keyring.previous_keys)
+
+
+class TestTokenValidator(unittest.TestCase):
+
+    def setUp(self):
+        self.encoder = JWTEncoder()
+        self.payload = {
+            "sub": "test_subject",
+            "exp": int((datetime.utcnow() + timedelta(hours=1)).timestamp()
+                       * 1000),
+            "token_type": "service"
+        }
+        self.token = self.encoder.encode(self.payload, _PRIVATE_KEY,
+                                         token_type="service")
+
+    def _public_bytes(self, encoding):
+        return _PRIVATE_KEY.public_key().public_bytes(
+            encoding=encoding,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+
+    def test_from_pem(self):
+        validator = TokenValidator.from_pem(
+            self._public_bytes(serialization.Encoding.PEM)
+        )
+
+        self.assertEqual(validator.validate_token(self.token), self.payload)
+
+    def test_from_der(self):
+        validator = TokenValidator.from_der(
+            self._public_bytes(serialization.Encoding.DER)
+        )
+
+        self.assertEqual(validator.validate_tokens([self.token, "bad"]),
+                         [self.payload,
+                          {'error': 'Invalid token: Invalid token format'}])
+
+    def test_from_jwks_selects_key_by_kid(self):
+        other_key = rsa.generate_private_key(public_exponent=65537,
+                                             key_size=2048)
+        jwks = json.dumps({"keys": [
+            public_key_to_jwk(other_key.public_key()),
+            public_key_to_jwk(_PRIVATE_KEY.public_key()),
+        ]})
+        validator = TokenValidator.from_jwks(jwks)
+        other_token = self.encoder.encode(self.payload, other_key,
+                                          token_type="service")
+
+        self.assertEqual(validator.validate_token(self.token), self.payload)
+        self.assertEqual(validator.validate_token(other_token), self.payload)
+
+    def test_from_key_loader_loads_only_public_key(self):
+        key_loader = Mock(spec=KeyLoader)
+        key_loader.load_public_key.return_value = _PRIVATE_KEY.public_key()
+
+        validator = TokenValidator.from_key_loader(key_loader)
+
+        self.assertEqual(validator.validate_token(self.token), self.payload)
+        key_loader.load_keys.assert_not_called()
+        key_loader.load_private_key.assert_not_called()
+
+
+class TestJSONSerializers(unittest.TestCase):
+
+    payloads = [
+        {"sub": "user", "exp": 1924377087629, "roles": ["a", "b"]},
+        {"name": "Jos\u00e9 / \u2028", "exp": 1924377087629,
+         "nested": {"1": None, "ok": True}},
+        {"float": 1724377087.629, "big": 1e16, "small": 1.5e-7},
+        {"sub": "user", "score": 2.5e-05, "weights": [-9.9e-05, 0.0001]},
+        {"huge": 2 ** 70, 1: "non string key"},
+    ]
+
+    def _available_serializers(self):
+        serializers = [JSONSerializer()]
+        for name in ('orjson', 'ujson'):
+            try:
+                serializers.append(get_serializer(name))
+            except ImportError:
+                pass
+        return serializers
+
+    def test_output_is_identical_for_every_backend(self):
+        expected = [JSONSerializer().dumps(payload)
+                    for payload in self.payloads]
+
+        for serializer in self._available_serializers():
+            with self.subTest(serializer=serializer.name):
+                self.assertEqual(
+                    [serializer.dumps(payload) for payload in self.payloads],
+                    expected
+                )
+
+    def test_types_rejected_by_the_stdlib_are_rejected_by_every_backend(self):
+        @dataclasses.dataclass
+        class Claims:
+            sub: str
+
+        class Color(enum.Enum):
+            RED = "red"
+
+        keys = [datetime(2030, 1, 1), datetime(2030, 1, 1).date(),
+                uuid.uuid4(), Color.RED]
+        payloads = [{"sub": "user", "value": value}
+                    for value in keys + [Claims("user"), {1, 2}]]
+        payloads += [{"sub": "user", "nested": [{key: 1}]} for key in keys]
+        for serializer in self._available_serializers():
+            for payload in payloads:
+                with self.subTest(serializer=serializer.name,
+                                  payload=payload):
+                    with self.assertRaises(TypeError):
+                        serializer.dumps(payload)
+
+    def test_loads_from_bytes(self):
+        for serializer in self._available_serializers():
+            with self.subTest(serializer=serializer.name):
+                self.assertEqual(
+                    serializer.loads(serializer.dumps(self.payloads[1])),
+                    self.payloads[1]
+                )
+
+    def test_tokens_are_identical_for_every_backend(self):
+        payload = self.payloads[1]
+        expected = JWTEncoder(serializer=JSONSerializer()).encode(
+            payload, _PRIVATE_KEY, token_type="user"
+        )
+
+        for serializer in self._available_serializers():
+            with self.subTest(serializer=serializer.name):
+                token = JWTEncoder(serializer=serializer).encode(
+                    payload, _PRIVATE_KEY, token_type="user"
+                )
+                self.assertEqual(token, expected)
+                self.assertEqual(
+                    JWTDecoder(serializer=serializer).decode(
+                        token, _PRIVATE_KEY.public_key()
+                    )["name"],
+                    payload["name"]
+                )
+
+    def test_unknown_serializer(self):
+        with self.assertRaises(ValueError):
+            get_serializer("yaml")
+
+
+class TestBytesTokenInput(unittest.TestCase):
+
+    def setUp(self):
+        self.public_key = _PRIVATE_KEY.public_key()
+        self.payload = {
+            "sub": "test_subject",
+            "exp": int((datetime.utcnow() + timedelta(hours=1)).timestamp()
+                       * 1000),
+            "token_type": "service"
+        }
+        self.token = JWTEncoder().encode(self.payload, _PRIVATE_KEY,
+                                         token_type="service")
+
+    def test_bytes_like_tokens(self):
+        data = self.token.encode()
+        for token in (data, bytearray(data), memoryview(data)):
+            with self.subTest(type=type(token).__name__):
+                self.assertEqual(JWTDecoder().decode(token, self.public_key),
+                                 self.payload)
+
+    def test_slice_of_authorization_header(self):
+        header = b"Bearer " + self.token.encode()
+
+        self.assertEqual(
+            JWTDecoder().decode(memoryview(header)[7:], self.public_key),
+            self.payload
+        )
+
+    def test_invalid_bytes_tokens(self):
+        header, payload, signature = self.token.encode().split(b'.')
+        tokens = {
+            b"not a token": "Invalid token format",
+            b".".join((header, payload, signature, b"x")):
+                "Invalid token format",
+            b".".join((header, payload, signature[::-1])):
+                "Invalid signature",
+        }
+        for token, message in tokens.items():
+            with self.subTest(message=message):
+                with self.assertRaisesRegex(ValueError, message):
+                    JWTDecoder().decode(token, self.public_key)
+
+    def test_precheck_and_cache_accept_bytes(self):
+        token_manager = TokenManager(
+            InMemoryKeyLoader(_PRIVATE_KEY), JWTEncoder(),
+            JWTDecoder(precheck=TokenPrecheck()),
+            token_cache=VerifiedTokenCache()
+        )
+
+        token_manager.validate_token(self.token.encode())
+
+        self.assertEqual(token_manager.validate_token(self.token),
+                         self.payload)
+        self.assertEqual(token_manager.token_cache.hits, 1)
+
+
+class TestValidationResults(unittest.TestCase):
+
+    def setUp(self):
+        self.public_key = _PRIVATE_KEY.public_key()
+        self.payload = {
+            "sub": "test_subject",
+            "exp": int((datetime.utcnow() + timedelta(hours=1)).timestamp()
+                       * 1000),
+            "token_type": "service"
+        }
+        self.token = self._encode(self.payload)
+        header, payload, signature = self.token.split('.')
+        self.tokens = {
+            Reason.MALFORMED: "a.b",
+            Reason.INVALID_HEADER: f"e30x.{payload}.{signature}",
+            Reason.INVALID_SIGNATURE: f"{header}.{payload}.{signature[::-1]}",
+            Reason.EXPIRED: self._encode(dict(self.payload, exp=1)),
+            Reason.MISSING_EXPIRATION: self._encode({"sub": "a"}),
+            Reason.ALGORITHM_MISMATCH: self._encode(
+                self.payload, ed25519.Ed25519PrivateKey.generate()
+            ),
+        }
+
+    @staticmethod
+    def _encode(payload, private_key=_PRIVATE_KEY):
+        return JWTEncoder().encode(payload, private_key,
+                                   token_type="service")
+
+    def test_check_gives_reason(self):
+        decoder = JWTDecoder()
+        for reason, token in self.tokens.items():
+            with self.subTest(reason=reason):
+                result = decoder.check(token, self.public_key)
+
+                self.assertFalse(result)
+                self.assertIs(result.reason, reason)
+                self.assertIs(result, ValidationResult.failure(reason))
+
+    def test_valid_token(self):
+        result = JWTDecoder().check(self.token, self.public_key)
+
+        self.assertTrue(result.valid)
+        self.assertIsNone(result.error)
+        self.assertEqual(result.payload, self.payload)
+
+    def test_decode_raises_typed_errors(self):
+        errors = {
+            Reason.MALFORMED: MalformedTokenError,
+            Reason.INVALID_SIGNATURE: InvalidSignatureError,
+            Reason.EXPIRED: ExpiredTokenError,
+            Reason.ALGORITHM_MISMATCH: RejectedTokenError,
+        }
+        for reason, error in errors.items():
+            with self.subTest(reason=reason):
+                with self.assertRaises(error) as context:
+                    JWTDecoder().decode(self.tokens[reason],
+                                        self.public_key)
+                self.assertIsInstance(context.exception, ValueError)
+                self.assertIs(context.exception.reason, reason)
+                self.assertEqual(str(context.exception),
+                                 f"Invalid token: {reason.message}")
+
+    def test_to_dict_matches_validate_token(self):
+        token_manager = TokenManager(InMemoryKeyLoader(_PRIVATE_KEY),
+                                     JWTEncoder(), JWTDecoder())
+        for token in [self.token, *self.tokens.values()]:
+            with self.subTest(token=token):
+                self.assertEqual(token_manager.check_token(token).to_dict(),
+                                 token_manager.validate_token(token))
+
+    def test_unexpected_errors_keep_their_message(self):
+        token = self._encode(dict(self.payload, exp="tomorrow"))
+
+        result = JWTDecoder().check(token, self.public_key)
+
+        self.assertIs(result.reason, Reason.MALFORMED)
+        self.assertIn("not supported between", result.error)
+        with self.assertRaises(TokenError):
+            result.unwrap()
+
+    def test_check_token_with_cache(self):
+        token_manager = TokenManager(
+            InMemoryKeyLoader(_PRIVATE_KEY), JWTEncoder(), JWTDecoder(),
+            token_cache=VerifiedTokenCache()
+        )
+
+        first = token_manager.check_token(self.token)
+        second = token_manager.check_token(self.token)
+
+        self.assertEqual(first.payload, second.payload)
+        self.assertEqual(token_manager.token_cache.hits, 1)
+
+
+class TestClaimsPolicy(unittest.TestCase):
+
+    NOW = 1_700_000_000_000
+
+    def setUp(self):
+        self.clock = ManualClock(self.NOW)
+        self.payload = {
+            "iss": "auth", "sub": "user_1", "aud": "api",
+            "exp": self.NOW + 60_000, "nbf": self.NOW, "iat": self.NOW,
+            "token_type": "user"
+        }
+
+    def _check(self, policy, **claims):
+        payload = {key: value
+                   for key, value in dict(self.payload, **claims).items()
+                   if value is not None}
+        return policy.compile(self.clock).check(payload)
+
+    def test_valid_claims(self):
+        policy = ClaimsPolicy(audiences={"api"}, issuers={"auth"})
+
+        self.assertIsNone(self._check(policy))
+        self.assertIsNone(self._check(policy, aud=["other", "api"]))
+
+    def test_rejections(self):
+        policy = ClaimsPolicy(required_claims=("exp", "sub"),
+                              audiences={"api"}, issuers={"auth"})
+        cases = [
+            ({"sub": None}, Reason.MISSING_CLAIM),
+            ({"aud": "other"}, Reason.INVALID_AUDIENCE),
+            ({"aud": ["other"]}, Reason.INVALID_AUDIENCE),
+            ({"aud": None}, Reason.INVALID_AUDIENCE),
+            ({"iss": "someone"}, Reason.INVALID_ISSUER),
+            ({"exp": self.NOW}, Reason.EXPIRED),
+            ({"nbf": self.NOW + 1}, Reason.NOT_YET_VALID),
+            ({"iat": self.NOW + 1}, Reason.ISSUED_IN_FUTURE),
+        ]
+        for claims, reason in cases:
+            with self.subTest(claims=claims):
+                self.assertIs(self._check(policy, **claims), reason)
+
+    def test_time_claims_must_be_numbers(self):
+        policy = ClaimsPolicy()
+        for claim in ("exp", "nbf", "iat"):
+            for value in ("bf", True, [1]):
+                with self.subTest(claim=claim, value=value):
+                    self.assertIs(self._check(policy, **{claim: value}),
+                                  Reason.INVALID_TIME_CLAIM)
+
+        self.assertIsNone(self._check(
+            ClaimsPolicy(verify_nbf=False, verify_iat=False),
+            nbf="bf", iat="bf"
+        ))
+
+    def test_leeway(self):
+        policy = ClaimsPolicy(leeway=5)
+
+        self.assertIsNone(self._check(policy, exp=self.NOW - 4_000,
+                                      nbf=self.NOW + 4_000))
+        self.assertIs(self._check(policy, exp=self.NOW - 5_000),
+                      Reason.EXPIRED)
+
+    def test_rules_by_token_type(self):
+        policy = ClaimsPolicy(token_types={
+            "user": TokenTypeRule(audiences={"api"}),
+            "service": TokenTypeRule(required_claims=("service_name",)),
+        })
+
+        self.assertIsNone(self._check(policy))
+        self.assertIs(self._check(policy, token_type="service"),
+                      Reason.MISSING_CLAIM)
+        self.assertIsNone(self._check(policy, token_type="service",
+                                      service_name="billing", aud="x"))
+        self.assertIs(self._check(policy, token_type="admin"),
+                      Reason.INVALID_TOKEN_TYPE)
+
+    def test_clock_is_read_per_check(self):
+        checker = ClaimsPolicy().compile(self.clock)
+
+        self.assertIsNone(checker.check(self.payload))
+        self.clock.advance(60_000)
+        self.assertIs(checker.check(self.payload), Reason.EXPIRED)
+
+    def test_token_manager_installs_the_policy(self):
+        token_manager = TokenManager(
+            InMemoryKeyLoader(_PRIVATE_KEY), JWTEncoder(),
+            JWTDecoder(clock=self.clock),
+            claims_policy=ClaimsPolicy(audiences={"api"})
+        )
+        token = token_manager.create_user_token(self.payload)
+        other = token_manager.create_user_token(dict(self.payload, aud="x"))
+
+        self.assertEqual(token_manager.validate_token(token), self.payload)
+        self.assertEqual(token_manager.validate_token(other),
+                         {'error': 'Invalid token: Invalid audience'})
+        self.clock.advance(60_000)
+        self.assertIs(token_manager.check_token(token).reason,
+                      Reason.EXPIRED)
+
+    def test_system_clock_follows_the_wall_clock(self):
+        wall = Mock(return_value=1000.0)
+        clock = SystemClock(resync_interval=3600, wall_clock=wall)
+
+        self.assertAlmostEqual(clock.now_ms(), 1_000_000, delta=1000)
+        wall.return_value = 5000.0
+        self.assertLess(clock.now_ms(), 2_000_000)
+        clock.resync_interval = 0
+        clock._next_sync = 0
+        self.assertAlmostEqual(clock.now_ms(), 5_000_000, delta=1000)
+
+
+class TestRevocationList(unittest.TestCase):
+
+    NOW = 1_700_000_000_000
+
+    def setUp(self):
+        self.clock = ManualClock(self.NOW)
+        self.revocations = RevocationList(capacity=4, clock=self.clock)
+
+    def test_revoked_until_exp(self):
+        self.revocations.revoke("leaked", self.NOW + 1000)
+
+        self.assertTrue(self.revocations.is_revoked("leaked"))
+        self.assertFalse(self.revocations.is_revoked("other"))
+        self.assertFalse(self.revocations.is_revoked(None))
+        self.clock.advance(1000)
+        self.assertFalse(self.revocations.is_revoked("leaked"))
+        self.revocations.purge()
+        self.assertEqual(len(self.revocations), 0)
+
+    def test_grows_past_capacity(self):
+        jtis = [f"jti-{i}" for i in range(100)]
+        self.revocations.update((jti, self.NOW + 1000) for jti in jtis)
+
+        self.assertEqual(len(self.revocations), 100)
+        self.assertTrue(all(jti in self.revocations for jti in jtis))
+
+    def test_replace(self):
+        self.revocations.revoke("old", self.NOW + 1000)
+        self.revocations.replace([("new", self.NOW + 1000),
+                                  ("expired", self.NOW)])
+
+        self.assertEqual(len(self.revocations), 1)
+        self.assertFalse(self.revocations.is_revoked("old"))
+        self.assertTrue(self.revocations.is_revoked("new"))
+
+    def test_bloom_filter_error_rate(self):
+        bloom = BloomFilter(1000)
+        digests = [int.from_bytes(os.urandom(8), "little")
+                   for _ in range(11000)]
+        for digest in digests[:1000]:
+            bloom.add(digest)
+
+        self.assertTrue(all(digest in bloom for digest in digests[:1000]))
+        false_positives = sum(digest in bloom for digest in digests[1000:])
+        self.assertLess(false_positives, 200)
+
+    def test_file_source_reads_appended_entries(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "revoked.jsonl")
+            source = FileRevocationSource(path)
+            revocations = RevocationList(source, clock=self.clock)
+
+            self.assertEqual(revocations.refresh(), 0)
+            source.append("first", self.NOW + 1000)
+            self.assertEqual(revocations.refresh(), 1)
+            source.append("second", self.NOW + 1000)
+            with open(path, "a") as file:
+                file.write('{"jti": "partial"')
+            self.assertEqual(revocations.refresh(), 1)
+            self.assertEqual(revocations.refresh(), 0)
+            with open(path, "a") as file:
+                file.write(', "exp": %d}\n' % (self.NOW + 1000))
+            self.assertEqual(revocations.refresh(), 1)
+            self.assertEqual(len(revocations), 3)
+
+            with open(path, "w") as file:
+                file.write('{"jti": "rewritten", "exp": %d}\n'
+                           % (self.NOW + 1000))
+            revocations.refresh()
+            self.assertEqual(len(revocations), 1)
+            self.assertTrue(revocations.is_revoked("rewritten"))
+
+    @unittest.skipIf(mock_aws is None, "moto is not installed")
+    def test_s3_source_reads_appended_entries(self):
+        with mock_aws():
+            client = boto3.client("s3", region_name="us-east-1")
+            client.create_bucket(Bucket="revocations")
+            client.get_object = Mock(wraps=client.get_object)
+            revocations = RevocationList(
+                S3RevocationSource(client, "revocations", "revoked.jsonl"),
+                clock=self.clock
+            )
+            line = '{"jti": "%s", "exp": %d}\n'
+            body = line % ("first", self.NOW + 1000)
+
+            self.assertEqual(revocations.refresh(), 0)
+            client.put_object(Bucket="revocations", Key="revoked.jsonl",
+                              Body=body)
+            self.assertEqual(revocations.refresh(), 1)
+            self.assertEqual(revocations.refresh(), 0)
+
+            body += line % ("second", self.NOW + 1000)
+            client.put_object(Bucket="revocations", Key="revoked.jsonl",
+                              Body=body)
+            self.assertEqual(revocations.refresh(), 1)
+            self.assertEqual(client.get_object.call_args.kwargs["Range"],
+                             f"bytes={len(body.split(chr(10))[0])}-")
+
+            client.put_object(Bucket="revocations", Key="revoked.jsonl",
+                              Body=line % ("third", self.NOW + 1000))
+            self.assertEqual(revocations.refresh(), 1)
+            self.assertEqual(len(revocations), 1)
+            self.assertTrue(revocations.is_revoked("third"))
+
+    def test_token_manager_rejects_revoked_tokens(self):
+        token_manager = TokenManager(
+            InMemoryKeyLoader(_PRIVATE_KEY), JWTEncoder(),
+            JWTDecoder(clock=self.clock),
+            token_cache=VerifiedTokenCache(),
+            revocations=RevocationList(clock=self.clock)
+        )
+        # exp in the future of the wall clock too, so the cache keeps it
+        payload = {"jti": "service-1", "token_type": "service",
+                   "exp": int(time.time() * 1000) + 60_000}
+        token = token_manager.create_service_token(payload)
+        self.assertEqual(token_manager.validate_token(token), payload)
+        self.assertEqual(len(token_manager.token_cache), 1)
+
+        token_manager.revocations.revoke("service-1", payload["exp"])
+
+        self.assertEqual(token_manager.validate_token(token),
+                         {'error': 'Invalid token: Token has been revoked'})
+        self.assertIs(token_manager.check_token(token).reason,
+                      Reason.REVOKED)
+        with self.assertRaises(RejectedTokenError):
+            token_manager.decoder.decode(token, token_manager.public_key)
+
+
+class TestServiceTokenProvider(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = ManualClock(int(time.time() * 1000))
+        self.token_manager = TokenManager(InMemoryKeyLoader(_PRIVATE_KEY),
+                                          JWTEncoder(), JWTDecoder())
+        self.create_service_token = Mock(
+            wraps=self.token_manager.create_service_token
+        )
+        self.token_manager.create_service_token = self.create_service_token
+        self.provider = ServiceTokenProvider(
+            self.token_manager, lifetime=100, refresh_fraction=0.5,
+            expiry_margin=10, claims={"iss": "billing"}, clock=self.clock
+        )
+        self.addCleanup(self.provider.close)
+
+    def test_reuses_tokens_per_identity(self):
+        token = self.provider.get_token("billing", audience="ledger",
+                                        scope="read")
+
+        self.assertEqual(self.provider.get_token("billing", "ledger", "read"),
+                         token)
+        self.assertNotEqual(self.provider.get_token("billing", "ledger"),
+                            token)
+        self.assertEqual(self.create_service_token.call_count, 2)
+        payload = self.token_manager.validate_token(token)
+        self.assertEqual(payload["service_name"], "billing")
+        self.assertEqual(payload["aud"], "ledger")
+        self.assertEqual(payload["scope"], "read")
+        self.assertEqual(payload["iss"], "billing")
+        self.assertEqual(payload["exp"] - payload["iat"], 100_000)
+        self.assertIn("jti", payload)
+
+    def test_refreshes_ahead_in_the_background(self):
+        token = self.provider.get_token("billing")
+        self.clock.advance(50_000)
+
+        self.assertEqual(self.provider.get_token("billing"), token)
+        self.provider.close()
+        self.assertEqual(self.create_service_token.call_count, 2)
+        refreshed = self.provider.get_token("billing")
+        self.assertNotEqual(refreshed, token)
+        self.assertEqual(self.provider.stats(), {'size': 1, 'signs': 2})
+
+    def test_mints_synchronously_near_expiry(self):
+        token = self.provider.get_token("billing")
+        self.clock.advance(90_000)
+
+        self.assertNotEqual(self.provider.get_token("billing"), token)
+        self.assertEqual(self.create_service_token.call_count, 2)
+
+    def test_concurrent_callers_share_one_signature(self):
+        def slow_sign(payload):
+            time.sleep(0.05)
+            return f"token-{payload['jti']}"
+
+        self.token_manager.create_service_token = Mock(side_effect=slow_sign)
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            tokens = set(executor.map(
+                lambda _: self.provider.get_token("billing"), range(64)
+            ))
+
+        self.assertEqual(len(tokens), 1)
+        self.assertEqual(self.token_manager.create_service_token.call_count,
+                         1)
+
+    def test_failed_mint_is_retried(self):
+        self.token_manager.create_service_token = Mock(
+            side_effect=[RuntimeError("no key"), "token"]
+        )
+
+        with self.assertRaises(RuntimeError):
+            self.provider.get_token("billing")
+        self.assertEqual(self.provider.get_token("billing"), "token")
+
+    def test_refused_refresh_does_not_block_callers(self):
+        executor = ThreadPoolExecutor(max_workers=1)
+        executor.shutdown()
+        provider = ServiceTokenProvider(
+            self.token_manager, lifetime=100, refresh_fraction=0.5,
+            expiry_margin=10, clock=self.clock, executor=executor
+        )
+        token = provider.get_token("billing")
+        self.clock.advance(50_000)
+
+        with self.assertLogs('nc_tokens.token_manager.service_tokens',
+                             'ERROR'):
+            self.assertEqual(provider.get_token("billing"), token)
+        self.clock.advance(40_000)
+
+        with ThreadPoolExecutor(max_workers=1) as caller:
+            refreshed = caller.submit(provider.get_token, "billing")
+            self.assertNotEqual(refreshed.result(timeout=5), token)
+
+    def test_invalidate(self):
+        token = self.provider.get_token("billing")
+        self.provider.invalidate("billing")
+
+        self.assertNotEqual(self.provider.get_token("billing"), token)
+
+
+class TestJWTDecoderPrecheck(unittest.TestCase):
+
+    def setUp(self):
+        self.encoder = JWTEncoder()
+        self.decoder = JWTDecoder(
+            precheck=TokenPrecheck(max_token_length=2048)
+        )
+        self.public_key = _PRIVATE_KEY.public_key()
+
+    def _token(self, exp_delta=timedelta(hours=1), header=None, size=0):
+        payload = {
+            "sub": "test_subject",
+            "exp": int((datetime.utcnow() + exp_delta).timestamp() * 1000),
+            "data": "x" * size,
+        }
+        if header is not None:
+            with patch.object(JWTEncoder, '_create_header',
+                              return_value=header):
+                return payload, self.encoder.encode(payload, _PRIVATE_KEY,
+                                                    token_type="user")
+        return payload, self.encoder.encode(payload, _PRIVATE_KEY,
+                                            token_type="user")
+
+    def _assert_rejected_before_signature(self, token, stage):
+        with patch.object(self.decoder, '_verify_signature') as verify:
+            with self.assertRaises(ValueError):
+                self.decoder.decode(token, self.public_key)
+        verify.assert_not_called()
+        self.assertEqual(self.decoder.precheck_rejections[stage], 1)
+
+    def test_valid_token_gives_same_payload(self):
+        payload, token = self._token()
+
+        self.assertEqual(self.decoder.decode(token, self.public_key),
+                         JWTDecoder().decode(token, self.public_key))
+        self.assertEqual(sum(self.decoder.precheck_rejections.values()), 0)
+
+    def test_expired_token(self):
+        _, token = self._token(exp_delta=timedelta(hours=-1))
+
+        self._assert_rejected_before_signature(token, 'expired')
+
+    def test_claims_rejection_is_counted_as_claims(self):
+        self.decoder = JWTDecoder(
+            precheck=TokenPrecheck(max_token_length=2048),
+            claims=ClaimsPolicy(audiences=("api",))
+        )
+        _, token = self._token()
+
+        self._assert_rejected_before_signature(token, 'claims')
+        self.assertEqual(self.decoder.precheck_rejections['expired'], 0)
+
+    def test_stages_that_raise_are_counted(self):
+        _, unhashable_alg = self._token(header={"alg": ["RS256"]})
+        string_exp = JWTEncoder().encode({"sub": "test_subject",
+                                          "exp": "soon"},
+                                         _PRIVATE_KEY, token_type="user")
+        cases = [(12345, 'length'), (unhashable_alg, 'algorithm'),
+                 (string_exp, 'claims')]
+        for token, stage in cases:
+            with self.subTest(stage=stage):
+                self.decoder.precheck_rejections[stage] = 0
+                self._assert_rejected_before_signature(token, stage)
+
+    def test_wrong_algorithm(self):
+        _, token = self._token(header={"alg": "HS256", "typ": "JWT"})
+
+        self._assert_rejected_before_signature(token, 'algorithm')
+
+    def test_too_long_token(self):
+        _, token = self._token(size=4096)
+
+        self._assert_rejected_before_signature(token, 'length')
+
+    def test_wrong_number_of_segments(self):
+        self._assert_rejected_before_signature("a.b.c.d", 'segments')
+
+    def test_malformed_header(self):
+        self._assert_rejected_before_signature("bm90IGpzb24.e30.c2ln",
+                                               'header')
+
+    def test_forged_signature_still_fails(self):
+        _, token = self._token()
+        header_b64, payload_b64, _ = token.split('.')
+
+        with self.assertRaises(ValueError):
+            self.decoder.decode(f"{header_b64}.{payload_b64}.c2ln",
+                                self.public_key)
+
+
+class TestSigningAlgorithms(unittest.TestCase):
+
+    def setUp(self):
+        self.keys = {
+            'RS256': _PRIVATE_KEY,
+            'ES256': ec.generate_private_key(ec.SECP256R1()),
+            'EdDSA': ed25519.Ed25519PrivateKey.generate(),
+        }
+        self.payload = {
+            "sub": "test_subject",
+            "exp": int((datetime.utcnow() + timedelta(hours=1)).timestamp()
+                       * 1000),
+            "token_type": "service"
+        }
+
+    def test_round_trip_for_every_algorithm(self):
+        for algorithm, private_key in self.keys.items():
+            with self.subTest(algorithm=algorithm):
+                token = JWTEncoder().encode(self.payload, private_key,
+                                            token_type="service")
+
+                self.assertEqual(_header(token)['alg'], algorithm)
+                self.assertEqual(
+                    JWTDecoder().decode(token, private_key.public_key()),
+                    self.payload
+                )
+
+    def test_algorithm_not_in_allowlist(self):
+        token = JWTEncoder().encode(self.payload, self.keys['EdDSA'],
+                                    token_type="service")
+        decoder = JWTDecoder(allowed_algorithms=['RS256', 'ES256'])
+
+        with self.assertRaisesRegex(ValueError, "Algorithm not allowed"):
+            decoder.decode(token, self.keys['EdDSA'].public_key())
+
+    def test_algorithm_must_match_key(self):
+        token = JWTEncoder().encode(self.payload, self.keys['ES256'],
+                                    token_type="service")
+
+        with self.assertRaisesRegex(ValueError,
+                                    "Algorithm does not match the key"):
+            JWTDecoder().decode(token, _PRIVATE_KEY.public_key())
+
+    def test_signer_and_verifier(self):
+        for algorithm, private_key in self.keys.items():
+            with self.subTest(algorithm=algorithm):
+                signer = Signer(private_key)
+                verifier = Verifier(private_key.public_key())
+                token = JWTEncoder().encode(self.payload, signer,
+                                            token_type="service")
+
+                self.assertEqual(_header(token), _header(
+                    JWTEncoder().encode(self.payload, private_key,
+                                        token_type="service")
+                ))
+                self.assertEqual(JWTDecoder().decode(token, verifier),
+                                 self.payload)
+                self.assertEqual(JWTDecoder().decode(token, {
+                    signer.kid: verifier
+                }), self.payload)
+
+        token = JWTEncoder().encode(self.payload, self.keys['ES256'],
+                                    token_type="service")
+        with self.assertRaisesRegex(ValueError,
+                                    "Algorithm does not match the key"):
+            JWTDecoder().decode(token, Verifier(_PRIVATE_KEY.public_key()))
+        with self.assertRaises(ValueError):
+            Signer(self.keys['EdDSA'], get_algorithm('RS256'))
+
+    def test_encoder_rejects_key_of_other_algorithm(self):
+        encoder = JWTEncoder(algorithm='ES256')
+
+        with self.assertRaises(ValueError):
+            encoder.encode(self.payload, self.keys['EdDSA'],
+                           token_type="service")
+
+    def test_unknown_algorithm(self):
+        with self.assertRaisesRegex(ValueError, "Unsupported algorithm"):
+            JWTDecoder(allowed_algorithms=['HS256'])
+
+    def test_jwk_round_trip(self):
+        for algorithm, private_key in self.keys.items():
+            with self.subTest(algorithm=algorithm):
+                jwk = public_key_to_jwk(private_key.public_key())
+                public_key = public_key_from_jwk(jwk)
+
+                self.assertEqual(jwk['alg'], algorithm)
+                self.assertEqual(key_id(public_key), jwk['kid'])
+
+    def test_process_pool_with_ed25519(self):
+        key_loader = InMemoryKeyLoader.generate(algorithm='EdDSA')
+        token_manager = TokenManager(key_loader, JWTEncoder(), JWTDecoder())
+        payloads = [dict(self.payload, sub=f"user_{index}")
+                    for index in range(4)]
+
+        tokens = token_manager.create_service_tokens(
+            payloads, max_workers=2, use_processes=True
+        )
+
+        self.assertEqual([token_manager.validate_token(token)
+                          for token in tokens], payloads)
+
+
+class TestParallelTokenIssuer(unittest.TestCase):
+
+    def setUp(self):
+        self.key_loader = InMemoryKeyLoader(_PRIVATE_KEY)
+        exp = int((datetime.utcnow() + timedelta(hours=1)).timestamp()
+                  * 1000)
+        self.payloads = [
+            {"sub": f"user_{index}", "exp": exp, "token_type": "user"}
+            for index in range(10)
+        ]
+
+    def test_tokens_match_single_process_encoding(self):
+        encoder = JWTEncoder()
+        with ParallelTokenIssuer(self.key_loader, max_workers=2,
+                                 chunk_size=3) as issuer:
+            tokens = issuer.create_user_tokens(self.payloads)
+            token = issuer.create_service_token(self.payloads[0])
+
+        self.assertEqual(tokens, [
+            encoder.encode(payload, _PRIVATE_KEY, token_type="user")
+            for payload in self.payloads
+        ])
+        self.assertEqual(JWTDecoder().decode(token,
+                                             _PRIVATE_KEY.public_key()),
+                         self.payloads[0])
+
+    def test_encoder_factory(self):
+        with ParallelTokenIssuer(
+                self.key_loader, max_workers=1,
+                encoder_factory=partial(JWTEncoder, include_kid=False)
+        ) as issuer:
+            token = issuer.create_user_token(self.payloads[0])
+
+        self.assertNotIn('kid', _header(token))
+
+
+class TestTokenObservers(unittest.TestCase):
+
+    def setUp(self):
+        self.observer = MetricsObserver()
+        self.decoder = JWTDecoder(observer=self.observer)
+        self.public_key = _PRIVATE_KEY.public_key()
+        self.payload = {
+            "sub": "test_subject",
+            "exp": int((datetime.utcnow() + timedelta(hours=1)).timestamp()
+                       * 1000),
+            "token_type": "service"
+        }
+        self.token = JWTEncoder().encode(self.payload, _PRIVATE_KEY,
+                                         token_type="service")
+
+    def _encode(self, payload, private_key=_PRIVATE_KEY):
+        return JWTEncoder().encode(payload, private_key,
+                                   token_type="service")
+
+    def test_outcomes(self):
+        other_key = ec.generate_private_key(ec.SECP256R1())
+        header, payload, signature = self.token.split('.')
+        tokens = [
+            self.token,
+            self._encode(dict(self.payload, exp=1)),
+            '.'.join((header, payload, signature[::-1])),
+            "not a token",
+            self._encode(self.payload, other_key),
+        ]
+
+        for token in tokens:
+            try:
+                self.decoder.decode(token, self.public_key)
+            except ValueError:
+                pass
+
+        self.assertEqual(self.observer.snapshot()['outcomes'], {
+            'ok': 1, 'expired': 1, 'bad_signature': 1, 'malformed': 1,
+            'rejected': 1
+        })
+
+    def test_stage_timings(self):
+        self.assertEqual(self.decoder.decode(self.token, self.public_key),
+                         self.payload)
+
+        snapshot = self.observer.snapshot()
+        self.assertEqual(snapshot['stage_counts'], {
+            'precheck': 0, 'base64': 3, 'json': 2, 'signature': 1,
+            'expiry': 1, 'key_fetch': 0
+        })
+        self.assertGreater(snapshot['stage_seconds']['signature'], 0)
+
+    def test_precheck_is_timed_as_one_stage(self):
+        self.decoder.precheck = TokenPrecheck()
+
+        self.decoder.decode(self.token, self.public_key)
+
+        stage_counts = self.observer.snapshot()['stage_counts']
+        self.assertEqual(stage_counts['precheck'], 1)
+        self.assertEqual(stage_counts['json'], 0)
+
+    def test_cache_hits_are_observed(self):
+        token_manager = TokenManager(
+            InMemoryKeyLoader(_PRIVATE_KEY), JWTEncoder(), self.decoder,
+            token_cache=VerifiedTokenCache()
+        )
+
+        token_manager.validate_token(self.token)
+        token_manager.validate_token(self.token)
+
+        self.assertEqual(self.observer.snapshot()['outcomes']['ok'], 2)
+
+    @unittest.skipIf(prometheus_client is None,
+                     "prometheus_client is not installed")
+    def test_prometheus_observer(self):
+        registry = prometheus_client.CollectorRegistry()
+        decoder = JWTDecoder(observer=PrometheusObserver(registry=registry))
+
+        decoder.decode(self.token, self.public_key)
+
+        self.assertEqual(registry.get_sample_value(
+            'nc_tokens_validations_total', {'outcome': 'ok'}
+        ), 1)
+        self.assertEqual(registry.get_sample_value(
+            'nc_tokens_stage_seconds_count', {'stage': 'signature'}
+        ), 1)
+
+    @unittest.skipIf(MeterProvider is None,
+                     "opentelemetry-sdk is not installed")
+    def test_opentelemetry_observer(self):
+        reader = InMemoryMetricReader()
+        meter = MeterProvider(metric_readers=[reader]).get_meter("test")
+        decoder = JWTDecoder(observer=OpenTelemetryObserver(meter))
+
+        decoder.decode(self.token, self.public_key)
+
+        metrics = {
+            metric.name: metric
+            for resource in reader.get_metrics_data().resource_metrics
+            for scope in resource.scope_metrics
+            for metric in scope.metrics
+        }
+        validations = metrics['nc_tokens.validations'].data.data_points
+        self.assertEqual([(point.attributes['outcome'], point.value)
+                          for point in validations], [('ok', 1)])
+        self.assertIn('nc_tokens.stage.duration', metrics)
+
+
+class TestStreamingValidation(unittest.TestCase):
+
+    def setUp(self):
+        self.validator = TokenValidator(_PRIVATE_KEY.public_key())
+        self.payload = {
+            "sub": "test_subject",
+            "exp": int((datetime.utcnow() + timedelta(hours=1)).timestamp()
+                       * 1000),
+            "token_type": "service"
+        }
+        self.token = JWTEncoder().encode(self.payload, _PRIVATE_KEY,
+                                         token_type="service")
+
+    def test_read_tokens_skips_blank_lines(self):
+        lines = io.StringIO(f"{self.token}\n\n  bad  \n")
+
+        self.assertEqual(list(read_tokens(lines)),
+                         [(1, self.token), (3, "bad")])
+
+    def test_read_tokens_extracts_from_log_lines(self):
+        lines = [f'GET /api "Authorization: Bearer {self.token}" 200\n',
+                 'GET /health 200\n']
+
+        self.assertEqual(list(read_tokens(lines, extract=True)),
+                         [(1, self.token)])
+
+    def test_results_are_in_input_order(self):
+        tokens = [(index, self.token if index % 3 else "bad")
+                  for index in range(1, 50)]
+
+        results = list(validate_stream(tokens, self.validator, max_workers=4,
+                                       chunk_size=5))
+
+        self.assertEqual([result['line'] for result in results],
+                         list(range(1, 50)))
+        self.assertEqual([result['valid'] for result in results],
+                         [bool(index % 3) for index in range(1, 50)])
+
+    def test_input_is_consumed_lazily(self):
+        tokens = zip(itertools.count(1), itertools.repeat(self.token))
+
+        results = list(itertools.islice(
+            validate_stream(tokens, self.validator, max_workers=2,
+                            chunk_size=4),
+            10
+        ))
+
+        self.assertEqual(len(results), 10)
+        self.assertEqual(results[-1]['payload'], self.payload)
+
+    def test_command_line(self):
+        with tempfile.TemporaryDirectory() as directory:
+            key_path = os.path.join(directory, "public_key.pem")
+            input_path = os.path.join(directory, "tokens.txt")
+            output_path = os.path.join(directory, "results.jsonl")
+            with open(key_path, 'wb') as file:
+                file.write(_PRIVATE_KEY.public_key().public_bytes(
+                    encoding=serialization.Encoding.PEM,
+                    format=serialization.PublicFormat.SubjectPublicKeyInfo
+                ))
+            with open(input_path, 'w') as file:
+                file.write(f"{self.token}\nbad\n")
+
+            with patch('sys.stderr', io.StringIO()):
+                status = streaming.main([input_path, '--public-key',
+                                         key_path, '--output', output_path])
+
+            with open(output_path) as file:
+                results = [json.loads(line) for line in file]
+        self.assertEqual(status, 0)
+        self.assertEqual(results, [
+            {'line': 1, 'valid': True, 'payload': self.payload},
+            {'line': 2, 'valid': False,
+             'error': 'Invalid token: Invalid token format'},
+        ])
+
+
+class _JwksHandler(http.server.BaseHTTPRequestHandler):
+    """Serves server.jwks with an ETag, counting the requests."""
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        time.sleep(server.delay)
+        body = json.dumps(server.jwks).encode()
+        etag = '"%d"' % server.version
+        if self.headers.get('If-None-Match') == etag:
+            server.not_modified += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        if server.cache_control:
+            self.send_header('Cache-Control', server.cache_control)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestJwks(unittest.TestCase):
+
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                      _JwksHandler)
+        self.server.requests = self.server.not_modified = 0
+        self.server.delay = 0
+        self.server.version = 1
+        self.server.cache_control = 'max-age=60'
+        self.server.jwks = public_keys_to_jwks(
+            {None: _PRIVATE_KEY.public_key()}
+        )
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = 'http://127.0.0.1:%d/jwks.json' % self.server.server_port
+        self.now = [1000.0]
+        self.encoder = JWTEncoder()
+        self.payload = {
+            "sub": "test_subject",
+            "exp": int((datetime.utcnow() + timedelta(hours=1)).timestamp()
+                       * 1000),
+            "token_type": "service"
+        }
+        self.token = self.encoder.encode(self.payload, _PRIVATE_KEY,
+                                         token_type="service")
+
+    def _loader(self, **kwargs):
+        return JwksKeyLoader(self.url, clock=lambda: self.now[0], **kwargs)
+
+    def _publish(self, *private_keys):
+        self.server.jwks = public_keys_to_jwks(
+            {key_id(key.public_key()): key.public_key()
+             for key in private_keys}
+        )
+        self.server.version += 1
+
+    def test_export_jwks_lists_current_and_previous_keys(self):
+        new_key = ec.generate_private_key(ec.SECP256R1())
+        key_loader = Mock(spec=KeyLoader)
+        key_loader.load_keys.return_value = (_PRIVATE_KEY,
+                                             _PRIVATE_KEY.public_key())
+        token_manager = TokenManager(key_loader, JWTEncoder(), JWTDecoder())
+        key_loader.load_keys.return_value = (new_key, new_key.public_key())
+        token_manager._load_keys()
+
+        jwks = token_manager.export_jwks()
+
+        self.assertEqual([jwk["kid"] for jwk in jwks["keys"]],
+                         [key_id(new_key.public_key()),
+                          key_id(_PRIVATE_KEY.public_key())])
+        validator = TokenValidator.from_jwks(json.dumps(jwks))
+        self.assertEqual(validator.validate_token(self.token), self.payload)
+
+    def test_validator_fetches_once_while_fresh(self):
+        validator = TokenValidator.from_key_loader(self._loader())
+
+        for _ in range(3):
+            self.assertEqual(validator.validate_token(self.token),
+                             self.payload)
+
+        self.assertEqual(self.server.requests, 1)
+
+    def test_stale_keys_are_revalidated_with_etag(self):
+        loader = self._loader()
+        validator = TokenValidator.from_key_loader(loader)
+        self.now[0] += 61
+
+        self.assertEqual(validator.validate_token(self.token), self.payload)
+
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(self.server.not_modified, 1)
+
+    def test_no_cache_is_bounded_by_min_refetch_interval(self):
+        self.server.cache_control = 'no-cache'
+        validator = TokenValidator.from_key_loader(
+            self._loader(min_refetch_interval=10)
+        )
+        validator.validate_token(self.token)
+        self.now[0] += 5
+        validator.validate_token(self.token)
+
+        self.assertEqual(self.server.requests, 1)
+
+        self.now[0] += 5
+        validator.validate_token(self.token)
+
+        self.assertEqual(self.server.requests, 2)
+
+    def test_unknown_kid_refetches_with_rate_limit(self):
+        new_key = rsa.generate_private_key(public_exponent=65537,
+                                           key_size=2048)
+        validator = TokenValidator.from_key_loader(
+            self._loader(min_refetch_interval=30)
+        )
+        new_token = self.encoder.encode(self.payload, new_key,
+                                        token_type="service")
+
+        self.assertEqual(validator.check_token(new_token).reason,
+                         Reason.UNKNOWN_KEY_ID)
+        self.assertEqual(self.server.requests, 1)
+
+        self._publish(_PRIVATE_KEY, new_key)
+        self.now[0] += 10
+        self.assertEqual(validator.check_token(new_token).reason,
+                         Reason.UNKNOWN_KEY_ID)
+        self.assertEqual(self.server.requests, 1)
+
+        self.now[0] += 20
+        self.assertEqual(validator.validate_token(new_token), self.payload)
+        self.assertEqual(validator.validate_token(self.token), self.payload)
+        self.assertEqual(self.server.requests, 2)
+
+    def test_concurrent_unknown_kids_fetch_once(self):
+        new_key = rsa.generate_private_key(public_exponent=65537,
+                                           key_size=2048)
+        loader = self._loader(min_refetch_interval=30)
+        loader.keys()
+        self._publish(_PRIVATE_KEY, new_key)
+        self.now[0] += 30
+        self.server.delay = 0.2
+        barrier = threading.Barrier(10)
+
+        def get_key(_):
+            barrier.wait()
+            return loader.get_key(key_id(new_key.public_key()))
+
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            public_keys = list(executor.map(get_key, range(10)))
+
+        self.assertEqual(public_keys, [new_key.public_key()] * 10)
+        self.assertEqual(self.server.requests, 2)
+
+    def test_failed_refresh_keeps_the_keys(self):
+        loader = self._loader()
+        validator = TokenValidator.from_key_loader(loader)
+        self.server.jwks = {"keys": []}
+        self.server.version += 1
+        self.now[0] += 61
+
+        with self.assertLogs('nc_tokens.rsa_token_lib.jwks_loader',
+                             'WARNING'):
+            self.assertEqual(validator.validate_token(self.token),
+                             self.payload)
+
+    def test_file_is_read_again_when_modified(self):
+        new_key = rsa.generate_private_key(public_exponent=65537,
+                                           key_size=2048)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'jwks.json')
+            with open(path, 'w') as file:
+                json.dump(self.server.jwks, file)
+            loader = JwksKeyLoader(path, min_refetch_interval=0)
+            validator = TokenValidator.from_key_loader(loader)
+            new_token = self.encoder.encode(self.payload, new_key,
+                                            token_type="service")
+
+            self.assertEqual(validator.check_token(new_token).reason,
+                             Reason.UNKNOWN_KEY_ID)
+            with open(path, 'w') as file:
+                json.dump(public_keys_to_jwks({
+                    None: new_key.public_key()
+                }), file)
+            os.utime(path, ns=(0, 10 ** 9))
+
+            self.assertEqual(validator.validate_token(new_token),
+                             self.payload)
+
+    def test_cached_tokens_of_a_removed_kid_are_rejected(self):
+        new_key = rsa.generate_private_key(public_exponent=65537,
+                                           key_size=2048)
+        self._publish(_PRIVATE_KEY, new_key)
+        token_manager = TokenManager(self._loader(), JWTEncoder(),
+                                     JWTDecoder(), lazy=True,
+                                     token_cache=VerifiedTokenCache())
+        new_token = self.encoder.encode(self.payload, new_key,
+                                        token_type="service")
+        self.assertEqual(token_manager.validate_token(new_token),
+                         self.payload)
+        self.assertEqual(token_manager.check_token(new_token).payload,
+                         self.payload)
+
+        self._publish(_PRIVATE_KEY)
+        self.now[0] += 61
+
+        self.assertEqual(token_manager.validate_token(new_token),
+                         {'error': 'Invalid token: Unknown key id'})
+        self.assertEqual(token_manager.check_token(new_token).reason,
+                         Reason.UNKNOWN_KEY_ID)
+        self.assertEqual(token_manager.validate_token(self.token),
+                         self.payload)
+
+    def test_lazy_token_manager_validates_with_jwks(self):
+        token_manager = TokenManager(self._loader(), JWTEncoder(),
+                                     JWTDecoder(), lazy=True)
+
+        self.assertEqual(token_manager.validate_token(self.token),
+                         self.payload)
+        with self.assertRaises(ValueError):
+            token_manager.create_service_token(self.payload)
+        self.assertEqual(token_manager.export_jwks(), self.server.jwks)
+
+
+def _run_in_child(function, timeout=30.0):
+    """
+    Run function in a forked child.
+    :return: exit status, 0 when function returned True
+    """
+    pid = os.fork()
+    if pid == 0:
+        try:
+            status = 0 if function() else 1
+        except BaseException:
+            status = 2
+        os._exit(status)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        finished, status = os.waitpid(pid, os.WNOHANG)
+        if finished:
+            return os.waitstatus_to_exitcode(status)
+        time.sleep(0.01)
+    os.kill(pid, 9)
+    os.waitpid(pid, 0)
+    return 'timeout'
+
+
+@unittest.skipUnless(hasattr(os, 'register_at_fork'), "requires os.fork")
+class TestForkSafety(unittest.TestCase):
+
+    def setUp(self):
+        self.revocations = RevocationList()
+        self.revocations.revoke("revoked", 2 ** 50)
+        self.token_manager = TokenManager(
+            InMemoryKeyLoader(_PRIVATE_KEY), JWTEncoder(), JWTDecoder(),
+            token_cache=VerifiedTokenCache(max_size=64),
+            key_refresh_interval=60,
+            revocations=self.revocations
+        )
+        self.addCleanup(self.token_manager.close)
+        exp = int((datetime.utcnow() + timedelta(hours=1)).timestamp()
+                  * 1000)
+        self.tokens = [
+            self.token_manager.create_service_token({
+                "service_name": f"service-{index}", "exp": exp,
+                "token_type": "service", "jti": f"jti-{index}"
+            })
+            for index in range(32)
+        ]
+        self.revoked = self.token_manager.create_service_token({
+            "service_name": "service", "exp": exp, "token_type": "service",
+            "jti": "revoked"
+        })
+
+    def _validate_from_threads(self, threads=8, rounds=20):
+        def validate(_):
+            for _ in range(rounds):
+                for token in self.tokens:
+                    if 'error' in self.token_manager.validate_token(token):
+                        return False
+                if self.token_manager.check_token(self.revoked).valid:
+                    return False
+            return True
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            return all(executor.map(validate, range(threads)))
+
+    def test_validation_from_threads_and_forked_children(self):
+        def child():
+            refresher = self.token_manager.key_refresher
+            return (self._validate_from_threads()
+                    and refresher._thread is not None
+                    and refresher._thread.is_alive())
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            parent = executor.submit(self._validate_from_threads)
+            statuses = [_run_in_child(child) for _ in range(4)]
+            self.assertTrue(parent.result())
+
+        self.assertEqual(statuses, [0, 0, 0, 0])
+
+    def test_locks_held_by_parent_threads_are_replaced(self):
+        locks = [self.token_manager.keyring._lock,
+                 self.token_manager._keys_lock, self.revocations._lock,
+                 self.token_manager.token_cache._lock]
+        for lock in locks:
+            lock.acquire()
+        try:
+            status = _run_in_child(lambda: (
+                self.token_manager.keyring.rotate(
+                    _PRIVATE_KEY, _PRIVATE_KEY.public_key()
+                ) is False
+                and self.revocations.revoke("other", 2 ** 50) is None
+                and self._validate_from_threads(threads=2, rounds=1)
+            ), timeout=10)
+        finally:
+            for lock in locks:
+                lock.release()
+
+        self.assertEqual(status, 0)
+
+    def test_service_tokens_are_minted_again_in_child(self):
+        provider = ServiceTokenProvider(self.token_manager)
+        self.addCleanup(provider.close)
+        token = provider.get_token("billing")
+        provider._pending_mint(("orders", None, None))
+
+        status = _run_in_child(lambda: (
+            provider.get_token("billing") == token
+            and 'error' not in self.token_manager.validate_token(
+                provider.get_token("orders")
+            )
+        ), timeout=10)
+
+        self.assertEqual(status, 0)
+
+    def test_spaces_client_is_created_again_in_child(self):
+        loader = SpacesKeyLoader(
+            SpacesConfig("bucket", "region", "key", "secret"), lazy=True
+        )
+        loader._client = parent_client = Mock()
+        source = S3RevocationSource.from_key_loader(loader)
+
+        def child():
+            with patch.object(SpacesKeyLoader, '_create_client') as create:
+                client = source.client
+                return (client is create.return_value
+                        and client is not parent_client)
+
+        self.assertEqual(_run_in_child(child), 0)
+        self.assertIs(source.client, parent_client)
+
+
+class TestAsyncTokenManager(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.key_loader = Mock(spec=KeyLoader)
+        self.key_loader.load_keys.return_value = (
+            _PRIVATE_KEY, _PRIVATE_KEY.public_key()
+        )
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.token_manager = await AsyncTokenManager.create(
+            self.key_loader, JWTEncoder(), JWTDecoder(),
+            executor=self.executor
+        )
+
+    async def asyncTearDown(self):
+        self.executor.shutdown()
+
+    async def test_create_and_validate_token(self):
+        payload = {
+            "sub": "test_subject",
+            "exp": int((datetime.utcnow() + timedelta(hours=1)).timestamp()
+                       * 1000),
+            "token_type": "user"
+        }
+
+        token = await self.token_manager.create_user_token(payload)
+        result = await self.token_manager.validate_token(token)
+
+        self.assertEqual(result, payload)
+
+    async def test_invalid_token_returns_error(self):
+        result = await self.token_manager.validate_token("invalid")
+
+        self.assertIn('error', result)
+
+    async def test_load_keys_runs_key_loader_again(self):
+        await self.token_manager.load_keys()
+
+        self.assertEqual(self.key_loader.load_keys.call_count, 2)
+
+    @patch('nc_tokens.token_manager.async_token_management.SpacesKeyLoader')
+    async def test_from_spaces_config(self, mock_loader):
+        mock_loader.return_value.load_keys.return_value = (
+            _PRIVATE_KEY, _PRIVATE_KEY.public_key()
+        )
+        config = Mock()
+
+        manager = await AsyncTokenManager.from_spaces_config(
+            config, executor=self.executor
+        )
+
+        mock_loader.assert_called_once_with(config)
+        self.assertIs(manager.token_manager.private_key, _PRIVATE_KEY)
+
 
 if __name__ == '__main__':
     unittest.main()